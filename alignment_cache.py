@@ -0,0 +1,149 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+class AlignmentCache:
+    """Keeps the last good homography per board and checks whether it still holds."""
+
+    def __init__(self,
+                 patch_radius: int = 12,
+                 search_radius: int = 4,
+                 max_offset: float = 1.0,
+                 min_score: float = 0.8,
+                 min_pass_fraction: float = 0.8,
+                 max_boards: int = 32):
+        self.patch_radius = patch_radius
+        self.search_radius = search_radius
+        self.max_offset = max_offset
+        self.min_score = min_score
+        self.min_pass_fraction = min_pass_fraction
+        self.max_boards = max_boards
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        # board_key -> {"H": homography, "anchors": Nx2 reference points, "shape": reference shape}
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejections = 0
+
+    def lookup(self, board_key: str, ref_gray: np.ndarray, test_gray: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Return the cached homography for a board if it still aligns the test image.
+
+        Args:
+            board_key: Key identifying the reference board
+            ref_gray: Grayscale reference image
+            test_gray: Grayscale test image
+
+        Returns:
+            Verified test->reference homography, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(board_key)
+
+        if entry is None or entry["shape"] != ref_gray.shape[:2]:
+            self._count(hit=False)
+            return None
+
+        if self._verify(ref_gray, test_gray, entry["H"], entry["anchors"]):
+            with self._lock:
+                if board_key in self._entries:
+                    self._entries.move_to_end(board_key)
+            self._count(hit=True)
+            return entry["H"]
+
+        self._count(hit=False, rejected=True)
+        return None
+
+    def store(self, board_key: str, ref_gray: np.ndarray, H: np.ndarray):
+        """Remember a good homography for a board along with its verification patches."""
+        anchors = self._select_anchors(ref_gray)
+        with self._lock:
+            self._entries[board_key] = {"H": np.asarray(H, dtype=np.float64),
+                                        "anchors": anchors,
+                                        "shape": ref_gray.shape[:2]}
+            self._entries.move_to_end(board_key)
+            while len(self._entries) > self.max_boards:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, board_key: Optional[str] = None):
+        """Forget one board's homography, or all of them."""
+        with self._lock:
+            if board_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(board_key, None)
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejections": self.rejections,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "boards": len(self._entries)
+            }
+
+    def reset_stats(self):
+        """Reset the hit/miss counters."""
+        with self._lock:
+            self.hits = self.misses = self.rejections = 0
+
+    def _count(self, hit: bool, rejected: bool = False):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if rejected:
+                    self.rejections += 1
+
+    def _select_anchors(self, ref_gray: np.ndarray, count: int = 8) -> np.ndarray:
+        """Pick well-spread, textured reference points to verify against."""
+        h, w = ref_gray.shape[:2]
+        r = self.patch_radius + self.search_radius
+        mask = np.zeros((h, w), np.uint8)
+        mask[r:h - r, r:w - r] = 255
+        corners = cv2.goodFeaturesToTrack(ref_gray, maxCorners=count, qualityLevel=0.05,
+                                          minDistance=max(h, w) / 6, mask=mask)
+        if corners is None:
+            return np.empty((0, 2), np.float32)
+        return corners.reshape(-1, 2)
+
+    def _verify(self, ref_gray: np.ndarray, test_gray: np.ndarray,
+                H: np.ndarray, anchors: np.ndarray) -> bool:
+        """Check that reference patches are found where the homography predicts them."""
+        if len(anchors) == 0:
+            return False
+
+        predicted = cv2.perspectiveTransform(anchors.reshape(-1, 1, 2).astype(np.float64),
+                                             np.linalg.inv(H)).reshape(-1, 2)
+        th, tw = test_gray.shape[:2]
+        r, s = self.patch_radius, self.search_radius
+
+        passed = 0
+        for (ax, ay), (px, py) in zip(anchors, predicted):
+            ax, ay = int(round(ax)), int(round(ay))
+            ix, iy = int(round(px)), int(round(py))
+            if not (r + s <= ix < tw - r - s and r + s <= iy < th - r - s):
+                continue
+
+            template = ref_gray[ay - r:ay + r + 1, ax - r:ax + r + 1]
+            window = test_gray[iy - r - s:iy + r + s + 1, ix - r - s:ix + r + s + 1]
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (mx, my) = cv2.minMaxLoc(scores)
+
+            # Offset of the best match from the predicted (sub-pixel) position
+            offset = np.hypot(ix - s + mx - px, iy - s + my - py)
+            if score >= self.min_score and offset <= self.max_offset:
+                passed += 1
+
+        return passed >= self.min_pass_fraction * len(anchors)
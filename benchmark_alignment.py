@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Alignment Benchmark
+===================
+
+This script measures latency and registration accuracy of each feature
+backend, alignment mode and matcher of PCBInspector.align_images over the
+stored QA sample images. Each reference is warped with a set of synthetic
+rotations and shifts, and the recovered homography is compared against the
+known ground truth.
+
+Usage:
+    python benchmark_alignment.py [--samples-dir qa_samples] [--repeats 3]
+    python benchmark_alignment.py --backends orb akaze --alignment-modes pyramid
+    python benchmark_alignment.py --select --accuracy-target 1.0
+
+Reported per configuration:
+- Match latency (ms per alignment, matching step only)
+- Total alignment time (ms per alignment)
+- Registration error (mean and worst corner reprojection error in pixels)
+
+With --select, the backend auto-selection is run for every reference image
+and the chosen backend is printed.
+"""
+
+import argparse
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+
+from feature_backends import FEATURE_BACKENDS, SYNTHETIC_TRANSFORMS, evaluate_alignment, summarize_alignment
+from feature_store import FeatureStore
+from inspector import PCBInspector
+
+
+def find_reference_images(samples_dir: Path) -> List[Path]:
+    """Collect the front/back images of every stored QA sample."""
+    images = []
+    for sample_dir in sorted(samples_dir.iterdir()):
+        if sample_dir.is_dir():
+            for side in ("front.jpg", "back.jpg"):
+                image_path = sample_dir / side
+                if image_path.exists():
+                    images.append(image_path)
+    return images
+
+
+def copy_references(reference_paths: List[Path], work_dir: Path) -> List[Path]:
+    """Copy references so feature files are not written into the sample library."""
+    copies = []
+    for i, path in enumerate(reference_paths):
+        dest = work_dir / f"{i}_{path.parent.name}" / path.name
+        dest.parent.mkdir(parents=True)
+        shutil.copy2(path, dest)
+        copies.append(dest)
+    return copies
+
+
+def run_configuration(inspector: PCBInspector,
+                      reference_paths: List[Path],
+                      repeats: int) -> Dict[str, float]:
+    """Align every synthetic test image and aggregate timing and accuracy."""
+    samples = {"align_ms": [], "match_ms": [], "error_px": [], "failures": 0}
+
+    for reference_path in reference_paths:
+        reference_img = cv2.imread(str(reference_path))
+        if reference_img is None:
+            continue
+
+        # Untimed pass populates the feature store and resident indices
+        inspector.align_images(reference_img, reference_img, reference_path=str(reference_path))
+
+        result = evaluate_alignment(inspector, reference_img, reference_path=str(reference_path),
+                                    repeats=repeats)
+        for key in ("align_ms", "match_ms", "error_px"):
+            samples[key].extend(result[key])
+        samples["failures"] += result["failures"]
+
+    return summarize_alignment(samples)
+
+
+def print_results(results: Dict[str, Dict[str, float]]):
+    """Print a results table."""
+    print(f"{'configuration':<28}{'match ms':>10}{'align ms':>10}{'err px':>10}{'max err':>10}{'fails':>7}")
+    print("-" * 75)
+    for name, r in results.items():
+        print(f"{name:<28}{r['match_ms']:>10.1f}{r['align_ms']:>10.1f}"
+              f"{r['error_px']:>10.2f}{r['max_error_px']:>10.2f}{r['failures']:>7}")
+
+
+def benchmark_alignment(reference_paths: List[Path],
+                        backends: List[str],
+                        alignment_modes: List[str],
+                        matching_modes: List[str],
+                        repeats: int):
+    """Compare backends, alignment modes and matchers."""
+    results = {}
+    for backend in backends:
+        for alignment_mode in alignment_modes:
+            for matching_mode in matching_modes:
+                inspector = PCBInspector(feature_store=FeatureStore(backend_name=backend),
+                                         matching_mode=matching_mode,
+                                         alignment_mode=alignment_mode,
+                                         feature_backend=backend)
+                name = f"{backend}/{alignment_mode}/{matching_mode}"
+                results[name] = run_configuration(inspector, reference_paths, repeats)
+                print(f"  finished {name}")
+
+    print()
+    print_results(results)
+
+
+def benchmark_selection(reference_paths: List[Path],
+                        alignment_mode: str,
+                        matching_mode: str,
+                        accuracy_target: float):
+    """Run backend auto-selection for every reference image."""
+    inspector = PCBInspector(matching_mode=matching_mode, alignment_mode=alignment_mode)
+
+    for reference_path in reference_paths:
+        reference_img = cv2.imread(str(reference_path))
+        if reference_img is None:
+            continue
+
+        selection = inspector.select_feature_backend(reference_img,
+                                                     reference_path=str(reference_path),
+                                                     accuracy_target_px=accuracy_target)
+        print(f"\n{reference_path.parent.name}/{reference_path.name}: "
+              f"selected {selection['selected'] or 'none'} (target {accuracy_target}px)")
+        print_results(selection["results"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PCB image alignment")
+    parser.add_argument("--samples-dir", default="qa_samples", help="QA samples directory")
+    parser.add_argument("--repeats", type=int, default=3, help="Alignments per synthetic transform")
+    parser.add_argument("--backends", nargs="+", default=list(FEATURE_BACKENDS),
+                        choices=list(FEATURE_BACKENDS), help="Feature backends to benchmark")
+    parser.add_argument("--alignment-modes", nargs="+", default=list(PCBInspector.ALIGNMENT_MODES),
+                        choices=list(PCBInspector.ALIGNMENT_MODES), help="Alignment modes to benchmark")
+    parser.add_argument("--matching-modes", nargs="+", default=list(PCBInspector.MATCHING_MODES),
+                        choices=list(PCBInspector.MATCHING_MODES), help="Matchers to benchmark")
+    parser.add_argument("--select", action="store_true",
+                        help="Run backend auto-selection per reference image")
+    parser.add_argument("--accuracy-target", type=float, default=1.0,
+                        help="Registration error target in pixels for --select")
+    args = parser.parse_args()
+
+    reference_paths = find_reference_images(Path(args.samples_dir))
+    if not reference_paths:
+        print(f"No QA sample images found in {args.samples_dir}")
+        return
+
+    print(f"Benchmarking {len(reference_paths)} reference images x "
+          f"{len(SYNTHETIC_TRANSFORMS)} transforms x {args.repeats} repeats")
+
+    work_dir = Path(tempfile.mkdtemp(prefix="pcb_bench_"))
+    try:
+        copies = copy_references(reference_paths, work_dir)
+        if args.select:
+            benchmark_selection(copies, args.alignment_modes[0], args.matching_modes[0], args.accuracy_target)
+        else:
+            benchmark_alignment(copies, args.backends, args.alignment_modes, args.matching_modes, args.repeats)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
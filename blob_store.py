@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+
+class BlobStore:
+    """
+    Content-addressed image storage shared by QA samples.
+
+    Each distinct file is kept once as <root>/<hash[:2]>/<hash><ext> and hardlinked
+    (or copied, where hardlinks are unsupported) into the sample directories that use
+    it. Reference counts live in a SQLite table; a blob is deleted when its last
+    reference is released. Sample images must therefore be replaced, never edited
+    in place.
+    """
+
+    def __init__(self, root: Union[str, Path], db_path: Union[str, Path]):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path = Path(db_path)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    ext TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    refcount INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection for one operation, committed on success and always closed."""
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def hash_file(path: Union[str, Path]) -> str:
+        """Return the SHA-256 hex digest of a file's contents."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def blob_path(self, content_hash: str, ext: Optional[str] = None) -> Path:
+        """Location of a blob in the store."""
+        if ext is None:
+            with self._connect() as conn:
+                row = conn.execute("SELECT ext FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+            ext = row[0] if row else ""
+        return self.root / content_hash[:2] / f"{content_hash}{ext}"
+
+    def add(self, source_path: Union[str, Path]) -> str:
+        """
+        Store a file (if its content is new) and take a reference to it.
+
+        Args:
+            source_path: File to store
+
+        Returns:
+            Content hash identifying the blob
+        """
+        source_path = Path(source_path)
+        content_hash = self.hash_file(source_path)
+        ext = source_path.suffix.lower()
+
+        with self._lock:
+            with self._connect() as conn:
+                row = conn.execute("SELECT ext FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+                if row is not None:
+                    ext = row[0]
+            path = self.blob_path(content_hash, ext)
+
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                tmp_path = path.with_name(path.name + ".tmp")
+                shutil.copyfile(source_path, tmp_path)
+                tmp_path.replace(path)
+
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO blobs (hash, ext, size, refcount) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1",
+                    (content_hash, ext, path.stat().st_size)
+                )
+        return content_hash
+
+    def link(self, content_hash: str, dest_path: Union[str, Path]) -> bool:
+        """
+        Make a blob appear at dest_path.
+
+        Args:
+            content_hash: Blob to expose
+            dest_path: Destination file path (replaced if it exists)
+
+        Returns:
+            True if a hardlink was made, False if the blob had to be copied
+        """
+        source = self.blob_path(content_hash)
+        dest_path = Path(dest_path)
+        if dest_path.exists():
+            dest_path.unlink()
+        try:
+            os.link(source, dest_path)
+            return True
+        except OSError:
+            # Different filesystem, or one without hardlinks
+            shutil.copy2(source, dest_path)
+            return False
+
+    def release(self, content_hash: str) -> int:
+        """
+        Drop one reference to a blob, deleting it when none remain.
+
+        Args:
+            content_hash: Blob to release
+
+        Returns:
+            Remaining reference count
+        """
+        with self._lock:
+            with self._connect() as conn:
+                row = conn.execute("SELECT ext, refcount FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+                if row is None:
+                    return 0
+                ext, refcount = row[0], row[1] - 1
+                if refcount > 0:
+                    conn.execute("UPDATE blobs SET refcount = ? WHERE hash = ?", (refcount, content_hash))
+                else:
+                    conn.execute("DELETE FROM blobs WHERE hash = ?", (content_hash,))
+
+            if refcount <= 0:
+                self.blob_path(content_hash, ext).unlink(missing_ok=True)
+                self.logger.info(f"Deleted unreferenced blob {content_hash}")
+            return max(refcount, 0)
+
+    def reset_refcounts(self, references: Dict[str, int]):
+        """
+        Replace all reference counts, e.g. after re-reading every sample's metadata.
+
+        Blobs that are no longer referenced are deleted.
+
+        Args:
+            references: Map of content hash to number of references
+        """
+        with self._lock:
+            with self._connect() as conn:
+                known = dict(conn.execute("SELECT hash, ext FROM blobs").fetchall())
+                conn.execute("DELETE FROM blobs")
+                for content_hash, count in references.items():
+                    ext = known.get(content_hash)
+                    if ext is None:
+                        matches = list((self.root / content_hash[:2]).glob(f"{content_hash}*"))
+                        if not matches:
+                            continue
+                        ext = matches[0].suffix
+                    path = self.blob_path(content_hash, ext)
+                    conn.execute("INSERT INTO blobs (hash, ext, size, refcount) VALUES (?, ?, ?, ?)",
+                                 (content_hash, ext, path.stat().st_size, count))
+
+            for content_hash, ext in known.items():
+                if content_hash not in references:
+                    self.blob_path(content_hash, ext).unlink(missing_ok=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Number of stored blobs, their total size, and the references to them."""
+        with self._connect() as conn:
+            blobs, size, references = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount), 0) FROM blobs"
+            ).fetchone()
+        return {"blobs": blobs, "bytes": size, "references": references}
@@ -0,0 +1,265 @@
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+# Bump whenever signatures are computed differently, so a stored index is rebuilt
+SIGNATURE_VERSION = 2
+
+HASH_BITS = 64
+HSV_BINS = (8, 4, 4)
+EDGE_GRID = 4
+EDGE_ORIENTATIONS = 8
+# Side of the square the board is rectified to when its corners are known
+RECTIFIED_SIZE = 256
+
+
+def board_view(image: np.ndarray,
+               bbox: Optional[Sequence[int]] = None,
+               quad: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Cut the board out of an image, in a canonical orientation where possible.
+
+    With the four board corners the board is rectified so its long edge runs
+    horizontally, which leaves only a 180 degree ambiguity. Otherwise the bounding
+    box (or the whole image) is used as it lies.
+
+    Args:
+        image: BGR (or grayscale) image
+        bbox: Optional board bounding box (x, y, w, h)
+        quad: Optional 4x2 board corners (e.g. CameraManager.get_board_quad)
+
+    Returns:
+        Image of the board
+    """
+    if quad is not None:
+        corners = np.asarray(quad, np.float32).reshape(4, 2)
+        centre = corners.mean(axis=0)
+        corners = corners[np.argsort(np.arctan2(corners[:, 1] - centre[1], corners[:, 0] - centre[0]))]
+        if np.linalg.norm(corners[1] - corners[0]) < np.linalg.norm(corners[2] - corners[1]):
+            corners = np.roll(corners, -1, axis=0)
+        if cv2.contourArea(corners) >= 1.0:
+            size = RECTIFIED_SIZE
+            target = np.float32([[0, 0], [size - 1, 0], [size - 1, size - 1], [0, size - 1]])
+            return cv2.warpPerspective(image, cv2.getPerspectiveTransform(corners, target), (size, size))
+
+    if bbox is not None:
+        x, y, w, h = (int(v) for v in bbox)
+        cropped = image[max(y, 0):y + h, max(x, 0):x + w]
+        if cropped.size:
+            return cropped
+    return image
+
+
+def compute_signature(image: np.ndarray,
+                      bbox: Optional[Sequence[int]] = None,
+                      quad: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Compute the compact global signature of a board image.
+
+    The signature has three parts: a 64-bit difference hash of the layout, an HSV
+    colour histogram and a spatial grid of gradient-orientation histograms. The
+    hash and edge grid depend on orientation, so the board is cut out with
+    board_view first.
+
+    Args:
+        image: BGR (or grayscale) image
+        bbox: Optional board bounding box (x, y, w, h) to describe instead of the whole image
+        quad: Optional 4x2 board corners, to describe the rectified board
+
+    Returns:
+        Dictionary with "hash" (64 bools), "color" (L1-normalised histogram) and
+        "edges" (L2-normalised orientation histograms)
+    """
+    image = board_view(image, bbox, quad)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    # Everything is derived from a small thumbnail, so the cost is independent of resolution
+    thumb = cv2.resize(image, (128, 128), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    dhash = (small[:, 1:] > small[:, :-1]).ravel()
+
+    hsv = cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)
+    color = cv2.calcHist([hsv], [0, 1, 2], None, list(HSV_BINS), [0, 180, 0, 256, 0, 256]).ravel()
+    color /= max(float(color.sum()), 1e-6)
+
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1)
+    magnitude, angle = cv2.cartToPolar(gx, gy)
+    # Orientation modulo 180 degrees: a dark-to-light edge matches a light-to-dark one
+    bins = (np.mod(angle, np.pi) * (EDGE_ORIENTATIONS / np.pi)).astype(np.int32) % EDGE_ORIENTATIONS
+    cell = gray.shape[0] // EDGE_GRID
+    rows = np.arange(gray.shape[0])[:, None] // cell
+    cols = np.arange(gray.shape[1])[None, :] // cell
+    index = (rows * EDGE_GRID + cols) * EDGE_ORIENTATIONS + bins
+    edges = np.bincount(index.ravel(), weights=magnitude.ravel(),
+                        minlength=EDGE_GRID * EDGE_GRID * EDGE_ORIENTATIONS).astype(np.float32)
+    edges /= max(float(np.linalg.norm(edges)), 1e-6)
+
+    return {"hash": dhash, "color": color.astype(np.float32), "edges": edges}
+
+
+class BoardIndex:
+    """
+    Board identification index of compact global signatures.
+
+    Holds one signature per reference sample in stacked arrays, so ranking every
+    board against a query is a few vectorised operations instead of an alignment
+    per sample. The index is persisted as an uncompressed npz and rebuilt when
+    SIGNATURE_VERSION changes.
+
+    Boards may be presented in any orientation. Entries and queries given their
+    board corners are rectified, and a query is scored in both remaining
+    orientations (0 and 180 degrees); without corners, in all four 90 degree
+    rotations.
+    """
+
+    # Weights of the hash, colour and edge similarities in the combined score
+    WEIGHTS = (0.3, 0.3, 0.4)
+
+    def __init__(self, index_path: Union[str, Path]):
+        self.index_path = Path(index_path)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._clear()
+        self._load()
+
+    def _clear(self):
+        self._sample_ids: List[str] = []
+        self._board_names: List[str] = []
+        self._source_keys: List[str] = []
+        self._hashes = np.empty((0, HASH_BITS), bool)
+        self._colors = np.empty((0, int(np.prod(HSV_BINS))), np.float32)
+        self._edges = np.empty((0, EDGE_GRID * EDGE_GRID * EDGE_ORIENTATIONS), np.float32)
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with np.load(self.index_path) as data:
+                if int(data["version"]) != SIGNATURE_VERSION:
+                    self.logger.info("Board index signature version changed; it will be rebuilt")
+                    return
+                self._sample_ids = data["sample_ids"].tolist()
+                self._board_names = data["board_names"].tolist()
+                self._source_keys = data["source_keys"].tolist()
+                self._hashes = data["hashes"]
+                self._colors = data["colors"]
+                self._edges = data["edges"]
+        except Exception as e:
+            self.logger.error(f"Failed to load board index {self.index_path}: {e}")
+            self._clear()
+
+    def save(self):
+        """Write the index to disk."""
+        with self._lock:
+            tmp_path = self.index_path.with_name(self.index_path.stem + ".tmp.npz")
+            np.savez(tmp_path,
+                     version=SIGNATURE_VERSION,
+                     sample_ids=np.array(self._sample_ids, dtype=str),
+                     board_names=np.array(self._board_names, dtype=str),
+                     source_keys=np.array(self._source_keys, dtype=str),
+                     hashes=self._hashes,
+                     colors=self._colors,
+                     edges=self._edges)
+            tmp_path.replace(self.index_path)
+
+    def __len__(self) -> int:
+        return len(self._sample_ids)
+
+    def entries(self) -> Dict[str, str]:
+        """Map of indexed sample_id to the source key it was computed from."""
+        with self._lock:
+            return dict(zip(self._sample_ids, self._source_keys))
+
+    def add(self,
+            sample_id: str,
+            board_name: str,
+            image: np.ndarray,
+            source_key: str = "",
+            bbox: Optional[Sequence[int]] = None,
+            quad: Optional[np.ndarray] = None):
+        """
+        Index a sample (replacing its previous entry).
+
+        Args:
+            sample_id: ID of the QA sample
+            board_name: Board the sample belongs to
+            image: Reference image of the sample
+            source_key: Identifies the image content (e.g. its blob hash), used to detect stale entries
+            bbox: Optional board bounding box (x, y, w, h) within the image
+            quad: Optional 4x2 board corners within the image (used instead of bbox)
+        """
+        signature = compute_signature(image, bbox, quad)
+        with self._lock:
+            self._remove(sample_id)
+            self._sample_ids.append(sample_id)
+            self._board_names.append(board_name)
+            self._source_keys.append(source_key)
+            self._hashes = np.vstack([self._hashes, signature["hash"][None]])
+            self._colors = np.vstack([self._colors, signature["color"][None]])
+            self._edges = np.vstack([self._edges, signature["edges"][None]])
+
+    def remove(self, sample_id: str) -> bool:
+        """Drop a sample from the index. Returns True if it was indexed."""
+        with self._lock:
+            return self._remove(sample_id)
+
+    def _remove(self, sample_id: str) -> bool:
+        if sample_id not in self._sample_ids:
+            return False
+        row = self._sample_ids.index(sample_id)
+        for values in (self._sample_ids, self._board_names, self._source_keys):
+            del values[row]
+        self._hashes = np.delete(self._hashes, row, axis=0)
+        self._colors = np.delete(self._colors, row, axis=0)
+        self._edges = np.delete(self._edges, row, axis=0)
+        return True
+
+    def _scores(self, signature: Dict[str, np.ndarray]) -> np.ndarray:
+        """Combined similarity of every indexed sample to one signature."""
+        hash_sim = 1.0 - np.count_nonzero(self._hashes != signature["hash"], axis=1) / HASH_BITS
+        color_sim = np.minimum(self._colors, signature["color"]).sum(axis=1)
+        edge_sim = self._edges @ signature["edges"]
+        w_hash, w_color, w_edge = self.WEIGHTS
+        return w_hash * hash_sim + w_color * color_sim + w_edge * edge_sim
+
+    def query(self,
+              image: np.ndarray,
+              k: int = 5,
+              bbox: Optional[Sequence[int]] = None,
+              quad: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        Rank indexed samples by global similarity to an image.
+
+        Args:
+            image: Query image (e.g. the captured board)
+            k: Number of candidates to return
+            bbox: Optional board bounding box (x, y, w, h) within the image
+            quad: Optional 4x2 board corners within the image (used instead of bbox)
+
+        Returns:
+            Up to k {"sample_id", "board_name", "score"} dictionaries, best first.
+            Scores lie in [0, 1] and are only meaningful for ranking.
+        """
+        view = board_view(image, bbox, quad)
+        rotations = (0, 2) if quad is not None else (0, 1, 2, 3)
+        signatures = [compute_signature(np.ascontiguousarray(np.rot90(view, turns))) for turns in rotations]
+        with self._lock:
+            if not self._sample_ids:
+                return []
+            # Each board is scored in the orientation it matches best
+            scores = np.max([self._scores(signature) for signature in signatures], axis=0)
+
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [{"sample_id": self._sample_ids[i],
+                     "board_name": self._board_names[i],
+                     "score": float(scores[i])} for i in top]
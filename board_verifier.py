@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class BoardVerifier:
+    """
+    Verifies board-identification candidates by alignment and SSIM on a worker pool.
+
+    Candidates are started in rank order and evaluated concurrently. As soon as one
+    reaches min_similarity + confidence_margin it is accepted: candidates that have
+    not started are skipped, and the results of those still running are discarded.
+    Otherwise the best candidate above min_similarity wins.
+
+    PCBInspector keeps per-instance OpenCV detectors and matchers, so every worker
+    thread builds its own inspector with inspector_factory. Pass the caches of a
+    shared inspector to the factory to keep reusing them.
+    """
+
+    def __init__(self,
+                 inspector_factory: Callable,
+                 max_workers: Optional[int] = None,
+                 min_similarity: float = 0.85,
+                 confidence_margin: float = 0.1,
+                 image_loader: Optional[Callable[[str], Optional[np.ndarray]]] = None):
+        """
+        Args:
+            inspector_factory: Zero-argument callable returning a PCBInspector
+            max_workers: Worker threads (defaults to the CPU count, at most 4)
+            min_similarity: Similarity a candidate needs to be accepted at all
+            confidence_margin: Margin above min_similarity that ends verification early
+            image_loader: Reads a reference image by path (defaults to the shared image cache)
+        """
+        self.inspector_factory = inspector_factory
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.min_similarity = min_similarity
+        self.confidence_margin = confidence_margin
+        self.logger = logging.getLogger(__name__)
+
+        if image_loader is None:
+            from image_cache import shared_image_cache
+            image_loader = shared_image_cache.get
+        self.image_loader = image_loader
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="verify")
+        self._local = threading.local()
+
+    @property
+    def accept_similarity(self) -> float:
+        """Similarity at which a candidate is accepted without waiting for the others."""
+        return self.min_similarity + self.confidence_margin
+
+    def _inspector(self):
+        inspector = getattr(self._local, "inspector", None)
+        if inspector is None:
+            inspector = self._local.inspector = self.inspector_factory()
+        return inspector
+
+    def verify(self,
+               test_img: np.ndarray,
+               candidates: List[Dict],
+               cancel_event: Optional[threading.Event] = None) -> Dict:
+        """
+        Find which candidate board is shown in an image.
+
+        Args:
+            test_img: Captured board image (BGR)
+            candidates: Ranked candidates, best first, each with "sample_id", "board_name"
+                and "reference_path" (e.g. from QAManager.identify_board_candidates), and
+                optionally a "test_image" to use instead of test_img (e.g. the board
+                rectified to that sample's canonical size) and the sample's recorded
+                "feature_backend"
+            cancel_event: Set by the caller to abandon verification
+
+        Returns:
+            Dictionary with "board_name" and "sample_id" of the match (None if no candidate
+            passed), its "similarity", "early_exit", and per-candidate "results"
+        """
+        stop = threading.Event()
+        futures = {self._executor.submit(self._verify_candidate, test_img, candidate, stop, cancel_event): candidate
+                   for candidate in candidates}
+
+        results = []
+        best = None
+        early_exit = False
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                for future in done:
+                    result = future.result()
+                    if result is None:
+                        continue
+                    results.append(result)
+                    similarity = result["similarity"]
+                    if similarity >= self.min_similarity and (best is None or similarity > best["similarity"]):
+                        best = result
+                if best is not None and best["similarity"] >= self.accept_similarity:
+                    early_exit = True
+                    break
+        finally:
+            stop.set()
+            for future in pending:
+                future.cancel()
+
+        if early_exit:
+            self.logger.info(f"Identified board {best['board_name']} after verifying "
+                             f"{len(results)}/{len(candidates)} candidates")
+        return {
+            "board_name": best["board_name"] if best else None,
+            "sample_id": best["sample_id"] if best else None,
+            "similarity": best["similarity"] if best else 0.0,
+            "early_exit": early_exit,
+            "verified": len(results),
+            "results": results
+        }
+
+    def _verify_candidate(self,
+                          test_img: np.ndarray,
+                          candidate: Dict,
+                          stop: threading.Event,
+                          cancel_event: Optional[threading.Event]) -> Optional[Dict]:
+        """Align and compare one candidate; None if it was skipped or could not be evaluated."""
+        if stop.is_set() or (cancel_event is not None and cancel_event.is_set()):
+            return None
+
+        try:
+            ref_path = candidate["reference_path"]
+            ref_img = self.image_loader(ref_path)
+            if ref_img is None:
+                return None
+
+            inspector = self._inspector()
+            if candidate.get("feature_backend"):
+                inspector.set_board_backend(ref_path, candidate["feature_backend"])
+            test_img = candidate.get("test_image", test_img)
+            aligned_img, alignment_info = inspector.align_images(ref_img, test_img, reference_path=ref_path)
+            similarity = 0.0
+            if alignment_info.get("success", False):
+                comparison = inspector.compare_images(ref_img, aligned_img)
+                similarity = comparison.get("similarity_score", 0.0)
+
+            return {
+                "sample_id": candidate["sample_id"],
+                "board_name": candidate["board_name"],
+                "similarity": similarity,
+                "aligned": alignment_info.get("success", False)
+            }
+
+        except Exception as e:
+            self.logger.error(f"Failed to verify candidate {candidate.get('sample_id')}: {e}")
+            return None
+
+    def shutdown(self):
+        """Stop the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
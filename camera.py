@@ -2,16 +2,42 @@ import cv2
 import numpy as np
 from typing import Optional, Tuple, Dict, List
 import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 
 class CameraManager:
     """Manages webcam capture and image processing for PCB inspection with zoom and focus controls."""
     
-    def __init__(self, camera_index: int = 0):
+    def __init__(self, camera_index: int = 0, buffer_size: int = 4):
         self.camera_index = camera_index
         self.cap = None
         self.is_connected = False
         self.logger = logging.getLogger(__name__)
         
+        # Background capture: ring buffer of (sequence, timestamp, frame), newest last
+        self._frames = deque(maxlen=buffer_size)
+        self._frame_condition = threading.Condition()
+        self._capture_thread = None
+        self._capture_stop = threading.Event()
+        self._sequence = 0
+        self._delivered_sequence = 0
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+        self.capture_fps = 0.0
+        
+        # VideoCapture is not thread-safe: every use of self.cap holds _cap_lock. Callers
+        # announce themselves in _cap_requests so the capture loop yields between frames.
+        self._cap_lock = threading.RLock()
+        self._cap_requests = 0
+        self._cap_requests_lock = threading.Lock()
+        # Hand-off of cap.release() to a capture thread still blocked in read()
+        self._release_lock = threading.Lock()
+        self._release_on_exit = False
+        self._capture_exited = True
+        
         # Zoom and focus settings
         self.zoom_level = 1.0  # 1.0 = no zoom, 2.0 = 2x zoom, etc.
         self.max_zoom = 4.0
@@ -23,30 +49,45 @@ class CameraManager:
         
         # Board detection settings
         self.board_detection_enabled = True
+        # Pixel sizes are for a full camera frame; detect_board scales them to smaller zoom views
         self.min_board_area = 10000  # Minimum area for board detection
         self.board_confidence_threshold = 0.7
+        self._sensor_size: Optional[Tuple[int, int]] = None  # (height, width) of the last raw frame
         
         # Camera properties cache
         self.camera_properties = {}
         
+    @contextmanager
+    def _camera_access(self):
+        """Exclusive use of self.cap; the capture thread steps aside after its current read."""
+        with self._cap_requests_lock:
+            self._cap_requests += 1
+        try:
+            with self._cap_lock:
+                yield self.cap
+        finally:
+            with self._cap_requests_lock:
+                self._cap_requests -= 1
+    
     def connect(self) -> bool:
         """Initialize and connect to the webcam."""
         try:
-            self.cap = cv2.VideoCapture(self.camera_index)
-            if not self.cap.isOpened():
-                self.logger.error(f"Failed to open camera at index {self.camera_index}")
-                return False
+            with self._camera_access():
+                self.cap = cv2.VideoCapture(self.camera_index)
+                if not self.cap.isOpened():
+                    self.logger.error(f"Failed to open camera at index {self.camera_index}")
+                    return False
+                    
+                # Set camera properties for better quality
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
+                self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 1 if self.auto_focus else 0)
+                self.cap.set(cv2.CAP_PROP_BRIGHTNESS, 0.5)
+                self.cap.set(cv2.CAP_PROP_CONTRAST, 0.5)
+                self.cap.set(cv2.CAP_PROP_SATURATION, 0.5)
                 
-            # Set camera properties for better quality
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-            self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 1 if self.auto_focus else 0)
-            self.cap.set(cv2.CAP_PROP_BRIGHTNESS, 0.5)
-            self.cap.set(cv2.CAP_PROP_CONTRAST, 0.5)
-            self.cap.set(cv2.CAP_PROP_SATURATION, 0.5)
-            
-            # Cache camera properties
-            self._cache_camera_properties()
+                # Cache camera properties
+                self._cache_camera_properties()
             
             self.is_connected = True
             self.logger.info(f"Successfully connected to camera {self.camera_index}")
@@ -61,64 +102,285 @@ class CameraManager:
         if not self.cap:
             return
             
-        self.camera_properties = {
-            "width": int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-            "height": int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-            "fps": self.cap.get(cv2.CAP_PROP_FPS),
-            "brightness": self.cap.get(cv2.CAP_PROP_BRIGHTNESS),
-            "contrast": self.cap.get(cv2.CAP_PROP_CONTRAST),
-            "saturation": self.cap.get(cv2.CAP_PROP_SATURATION),
-            "autofocus": self.cap.get(cv2.CAP_PROP_AUTOFOCUS),
-            "focus": self.cap.get(cv2.CAP_PROP_FOCUS),
-            "zoom": self.cap.get(cv2.CAP_PROP_ZOOM),
-            "camera_index": self.camera_index
-        }
+        with self._camera_access() as cap:
+            self.camera_properties = {
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "fps": cap.get(cv2.CAP_PROP_FPS),
+                "brightness": cap.get(cv2.CAP_PROP_BRIGHTNESS),
+                "contrast": cap.get(cv2.CAP_PROP_CONTRAST),
+                "saturation": cap.get(cv2.CAP_PROP_SATURATION),
+                "autofocus": cap.get(cv2.CAP_PROP_AUTOFOCUS),
+                "focus": cap.get(cv2.CAP_PROP_FOCUS),
+                "zoom": cap.get(cv2.CAP_PROP_ZOOM),
+                "camera_index": self.camera_index
+            }
     
     def disconnect(self):
         """Release camera resources."""
-        if self.cap:
-            self.cap.release()
+        stopped = self.stop_capture()
+        with self._release_lock:
+            if stopped or self._capture_exited:
+                if self.cap:
+                    with self._camera_access() as cap:
+                        cap.release()
+            else:
+                # The capture thread is still inside read(); it releases the camera on exit
+                self._release_on_exit = True
         self.is_connected = False
         self.logger.info("Camera disconnected")
     
-    def get_frame(self) -> Optional[np.ndarray]:
-        """Capture a single frame from the webcam."""
+    def start_capture(self) -> bool:
+        """
+        Start reading frames on a background thread into the ring buffer.
+        
+        While it runs, get_frame returns the newest buffered frame instead of
+        blocking on the camera.
+        
+        Returns:
+            True if the capture thread is running
+        """
         if not self.is_connected or not self.cap:
-            return None
+            return False
+        if self.is_capturing:
+            return True
+        
+        self._capture_stop.clear()
+        self._capture_exited = False
+        self._capture_thread = threading.Thread(target=self._capture_loop, name="camera-capture", daemon=True)
+        self._capture_thread.start()
+        self.logger.info("Started background capture")
+        return True
+    
+    def stop_capture(self, timeout: float = 2.0) -> bool:
+        """
+        Stop the background capture thread and clear the ring buffer.
+        
+        Returns:
+            True if no capture thread is left running (a read() that does not return
+            within timeout keeps the thread alive)
+        """
+        if self._capture_thread is None:
+            return True
+        self._capture_stop.set()
+        self._capture_thread.join(timeout=timeout)
+        if self._capture_thread.is_alive():
+            self.logger.warning("Capture thread did not stop within its timeout")
+            return False
+        self._capture_thread = None
+        with self._frame_condition:
+            self._frames.clear()
+            self._frame_condition.notify_all()
+        self.logger.info("Stopped background capture")
+        return True
+    
+    @property
+    def is_capturing(self) -> bool:
+        """Whether the background capture thread is running."""
+        return self._capture_thread is not None and self._capture_thread.is_alive()
+    
+    @property
+    def frame_sequence(self) -> int:
+        """Sequence number of the newest buffered frame (0 before the first one)."""
+        with self._frame_condition:
+            return self._frames[-1][0] if self._frames else 0
+    
+    def _capture_loop(self):
+        """Read frames until stopped; the newest frame is always at the end of the buffer."""
+        try:
+            self._run_capture()
+        finally:
+            with self._release_lock:
+                self._capture_exited = True
+                if self._release_on_exit:
+                    self._release_on_exit = False
+                    with self._cap_lock:
+                        self.cap.release()
+    
+    def _run_capture(self):
+        last_time = None
+        while not self._capture_stop.is_set():
+            with self._cap_lock:
+                ret, frame = self.cap.read()
+            # Let property changes/queries from other threads in before the next read
+            while self._cap_requests and not self._capture_stop.is_set():
+                time.sleep(0.001)
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            
+            now = time.monotonic()
+            if last_time is not None and now > last_time:
+                # Exponential moving average of the instantaneous rate
+                rate = 1.0 / (now - last_time)
+                self.capture_fps = rate if self.capture_fps == 0.0 else 0.9 * self.capture_fps + 0.1 * rate
+            last_time = now
+            
+            # Buffered frames are shared between consumers, so nobody may draw on them
+            frame.flags.writeable = False
+            # Every reader of the buffer (the live preview included) scales detection to it
+            self._sensor_size = frame.shape[:2]
+            with self._frame_condition:
+                if self._frames and self._frames[-1][0] > self._delivered_sequence:
+                    # The previous newest frame was replaced before anyone read it
+                    self.frames_dropped += 1
+                self._sequence += 1
+                self.frames_captured += 1
+                self._frames.append((self._sequence, now, frame))
+                self._frame_condition.notify_all()
+    
+    def get_latest_frame(self) -> Optional[Tuple[np.ndarray, float, int]]:
+        """
+        Get the newest buffered frame without waiting.
+        
+        Returns:
+            Tuple of (read-only raw frame, capture time from time.monotonic(), sequence number),
+            or None if nothing has been captured yet
+        """
+        with self._frame_condition:
+            if not self._frames:
+                return None
+            sequence, timestamp, frame = self._frames[-1]
+            self._delivered_sequence = max(self._delivered_sequence, sequence)
+        return frame, timestamp, sequence
+    
+    def wait_for_frame(self,
+                       after_sequence: Optional[int] = None,
+                       timeout: float = 1.0) -> Optional[Tuple[np.ndarray, float, int]]:
+        """
+        Wait for a frame newer than a given one.
+        
+        Args:
+            after_sequence: Sequence number the frame must follow (defaults to the
+                newest frame at the time of the call, i.e. wait for the next one)
+            timeout: Maximum wait in seconds
             
-        ret, frame = self.cap.read()
+        Returns:
+            Same as get_latest_frame, or None on timeout or if capture is not running
+        """
+        with self._frame_condition:
+            if after_sequence is None:
+                after_sequence = self._frames[-1][0] if self._frames else 0
+            ready = self._frame_condition.wait_for(
+                lambda: (self._frames and self._frames[-1][0] > after_sequence) or not self.is_capturing,
+                timeout=timeout
+            )
+            if not ready or not self._frames or self._frames[-1][0] <= after_sequence:
+                return None
+        return self.get_latest_frame()
+    
+    def get_capture_stats(self) -> Dict:
+        """Counters of the background capture thread."""
+        with self._frame_condition:
+            latest_time = self._frames[-1][1] if self._frames else None
+            return {
+                "capturing": self.is_capturing,
+                "frames_captured": self.frames_captured,
+                "frames_dropped": self.frames_dropped,
+                "read_failures": self.read_failures,
+                "capture_fps": self.capture_fps,
+                "buffered_frames": len(self._frames),
+                "latest_frame_age_ms": (time.monotonic() - latest_time) * 1000 if latest_time else None
+            }
+    
+    def get_frame(self, fresh: bool = False) -> Optional[np.ndarray]:
+        """
+        Capture a single frame from the webcam.
+        
+        The frame is the zoomed region at camera resolution (see get_zoom_view), so
+        it is smaller than the sensor frame when zoomed in.
+        
+        Args:
+            fresh: With background capture running, wait for a frame captured after
+                this call instead of returning the newest buffered one
+        """
+        frame = self._read_raw_frame(fresh)
+        if frame is None:
+            return None
+        
+        view, _ = self.get_zoom_view(frame)
+        # Callers own the returned frame, unlike the shared buffered one
+        return view if view.flags.writeable else view.copy()
+    
+    def _read_raw_frame(self, fresh: bool = False) -> Optional[np.ndarray]:
+        """Newest unzoomed frame: from the capture buffer (read-only) when capturing, else read now."""
+        if not self.is_connected or not self.cap:
+            return None
+        
+        if self.is_capturing:
+            latest = self.wait_for_frame() if fresh else self.get_latest_frame()
+            if latest is None and not fresh:
+                # Capture only just started
+                latest = self.wait_for_frame(after_sequence=0)
+            if latest is None:
+                self.logger.warning("No frame available from background capture")
+                return None
+            return latest[0]
+        
+        with self._camera_access() as cap:
+            ret, frame = cap.read()
         if not ret:
             self.logger.warning("Failed to capture frame")
             return None
-            
-        # Apply zoom if needed
-        if self.zoom_level != 1.0:
-            frame = self._apply_zoom(frame)
-            
+        self._sensor_size = frame.shape[:2]
         return frame
     
-    def _apply_zoom(self, frame: np.ndarray) -> np.ndarray:
-        """Apply zoom to the frame using cropping and resizing."""
-        if self.zoom_level == 1.0:
-            return frame
+    def get_zoom_view(self, frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get the region of a frame shown at the current zoom level, without resampling.
+        
+        Args:
+            frame: Unzoomed camera frame
             
+        Returns:
+            Tuple of (view, transform): view is a slice of frame (no copy) and transform
+            is the 3x3 matrix mapping view coordinates to frame coordinates
+        """
         h, w = frame.shape[:2]
         
-        # Calculate crop dimensions
-        crop_w = int(w / self.zoom_level)
-        crop_h = int(h / self.zoom_level)
+        # Digital zoom cannot show more than the sensor, so zoom levels below 1.0 show the whole frame
+        zoom = max(self.zoom_level, 1.0)
+        crop_w = int(w / zoom)
+        crop_h = int(h / zoom)
         
-        # Calculate crop position (center the crop)
+        # Center the crop
         x1 = (w - crop_w) // 2
         y1 = (h - crop_h) // 2
-        x2 = x1 + crop_w
-        y2 = y1 + crop_h
         
-        # Crop and resize back to original size
-        cropped = frame[y1:y2, x1:x2]
-        zoomed = cv2.resize(cropped, (w, h), interpolation=cv2.INTER_LANCZOS4)
+        view = frame[y1:y1 + crop_h, x1:x1 + crop_w]
+        transform = np.array([[1.0, 0.0, x1], [0.0, 1.0, y1], [0.0, 0.0, 1.0]])
+        return view, transform
+    
+    @staticmethod
+    def render_preview(image: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+        """
+        Resample an image straight to the preview size, keeping its aspect ratio.
+        
+        Uses INTER_AREA when shrinking and INTER_LINEAR when enlarging, which are
+        cheap enough to run at preview rate.
         
-        return zoomed
+        Args:
+            image: Image to show (e.g. a zoom view)
+            size: (width, height) of the preview area
+            
+        Returns:
+            Resized image that fits within size
+        """
+        h, w = image.shape[:2]
+        scale = min(size[0] / w, size[1] / h)
+        out_size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        return cv2.resize(image, out_size, interpolation=interpolation)
+    
+    def _apply_zoom(self, frame: np.ndarray) -> np.ndarray:
+        """Resample the zoomed region back to full resolution (for snapshots only - it is expensive)."""
+        view, _ = self.get_zoom_view(frame)
+        if view.shape == frame.shape:
+            return frame
+            
+        h, w = frame.shape[:2]
+        return cv2.resize(view, (w, h), interpolation=cv2.INTER_LANCZOS4)
     
     def set_zoom(self, zoom_level: float) -> bool:
         """Set zoom level (0.5 to 4.0)."""
@@ -130,7 +392,8 @@ class CameraManager:
         
         # Try to set hardware zoom if available
         try:
-            self.cap.set(cv2.CAP_PROP_ZOOM, self.zoom_level)
+            with self._camera_access() as cap:
+                cap.set(cv2.CAP_PROP_ZOOM, self.zoom_level)
         except Exception as e:
             self.logger.debug(f"Hardware zoom not available, using software zoom: {e}")
         
@@ -161,17 +424,18 @@ class CameraManager:
         self.focus_distance = max(0.0, min(1.0, focus_distance))
         
         try:
-            # Check if camera supports focus control
-            current_focus = self.cap.get(cv2.CAP_PROP_FOCUS)
-            if current_focus == -1:
-                # Camera doesn't support focus control
-                self.logger.info("Camera doesn't support manual focus control")
-                return False
-            
-            # Disable autofocus first
-            self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-            # Set manual focus
-            self.cap.set(cv2.CAP_PROP_FOCUS, self.focus_distance)
+            with self._camera_access() as cap:
+                # Check if camera supports focus control
+                current_focus = cap.get(cv2.CAP_PROP_FOCUS)
+                if current_focus == -1:
+                    # Camera doesn't support focus control
+                    self.logger.info("Camera doesn't support manual focus control")
+                    return False
+                
+                # Disable autofocus first
+                cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
+                # Set manual focus
+                cap.set(cv2.CAP_PROP_FOCUS, self.focus_distance)
             self.auto_focus = False
             self.logger.info(f"Focus distance set to {self.focus_distance}")
             return True
@@ -188,14 +452,15 @@ class CameraManager:
         self.auto_focus = enabled
         
         try:
-            # Check if camera supports autofocus
-            current_autofocus = self.cap.get(cv2.CAP_PROP_AUTOFOCUS)
-            if current_autofocus == -1:
-                # Camera doesn't support autofocus control
-                self.logger.info("Camera doesn't support autofocus control")
-                return False
-            
-            self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 1 if enabled else 0)
+            with self._camera_access() as cap:
+                # Check if camera supports autofocus
+                current_autofocus = cap.get(cv2.CAP_PROP_AUTOFOCUS)
+                if current_autofocus == -1:
+                    # Camera doesn't support autofocus control
+                    self.logger.info("Camera doesn't support autofocus control")
+                    return False
+                
+                cap.set(cv2.CAP_PROP_AUTOFOCUS, 1 if enabled else 0)
             self.logger.info(f"Autofocus {'enabled' if enabled else 'disabled'}")
             return True
             
@@ -216,8 +481,9 @@ class CameraManager:
         if self.cap:
             try:
                 # Check if focus is supported
-                focus_value = self.cap.get(cv2.CAP_PROP_FOCUS)
-                autofocus_value = self.cap.get(cv2.CAP_PROP_AUTOFOCUS)
+                with self._camera_access() as cap:
+                    focus_value = cap.get(cv2.CAP_PROP_FOCUS)
+                    autofocus_value = cap.get(cv2.CAP_PROP_AUTOFOCUS)
                 
                 focus_info["hardware_focus"] = focus_value
                 focus_info["focus_supported"] = focus_value != -1
@@ -257,17 +523,33 @@ class CameraManager:
                 "center": [0, 0]
             }
     
-    def detect_board(self, frame: np.ndarray) -> Optional[Dict]:
+    def detect_board(self, frame: np.ndarray, scale: Optional[float] = None) -> Optional[Dict]:
         """
         Detect PCB board in the frame using contour detection and shape analysis.
         
+        The size thresholds are meant for a full camera frame. A zoom view from
+        get_frame shows the board at the same pixel size but covers less of the
+        scene, so the thresholds are scaled down with the view's area.
+        
+        Args:
+            frame: Camera frame or zoom view
+            scale: Linear size of frame relative to a full camera frame (defaults to
+                the ratio to the last frame read from the camera, or 1.0)
+        
         Returns:
-            Dictionary with board detection results or None if no board found
+            Dictionary with board detection results (in frame coordinates) or None if no board found
         """
         if not self.board_detection_enabled:
             return None
             
         try:
+            if scale is None:
+                scale = self._detection_scale(frame)
+            min_area = self.min_board_area * scale * scale
+            expected_area = 50000 * scale * scale
+            block_size = max(3, int(round(11 * scale)) | 1)
+            
+
             # Convert to grayscale
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
@@ -275,7 +557,7 @@ class CameraManager:
             blurred = cv2.GaussianBlur(gray, (5, 5), 0)
             
             # Apply adaptive thresholding for better edge detection
-            thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+            thresh = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, 2)
             
             # Apply morphological operations to clean up the image
             kernel = np.ones((3, 3), np.uint8)
@@ -292,7 +574,7 @@ class CameraManager:
             board_candidates = []
             for contour in contours:
                 area = cv2.contourArea(contour)
-                if area < self.min_board_area:
+                if area < min_area:
                     continue
                 
                 # Approximate contour to polygon
@@ -309,7 +591,7 @@ class CameraManager:
                     if 0.5 <= aspect_ratio <= 2.0:
                         # Calculate confidence based on multiple factors
                         # 1. Area factor (normalized by expected area)
-                        area_factor = min(1.0, area / 50000)
+                        area_factor = min(1.0, area / expected_area)
                         
                         # 2. Shape regularity factor (how close to perfect rectangle)
                         rect_area = w * h
@@ -317,7 +599,7 @@ class CameraManager:
                         
                         # 3. Edge density factor (PCBs have many edges)
                         edge_density = cv2.contourArea(contour) / cv2.arcLength(contour, True) if cv2.arcLength(contour, True) > 0 else 0
-                        edge_factor = min(1.0, edge_density / 10)
+                        edge_factor = min(1.0, edge_density / (10 * scale))
                         
                         # Combined confidence score
                         confidence = (area_factor * 0.4 + shape_factor * 0.3 + edge_factor * 0.3)
@@ -345,12 +627,101 @@ class CameraManager:
             self.logger.error(f"Error in board detection: {e}")
             return None
     
+    def _detection_scale(self, frame: np.ndarray) -> float:
+        """Linear size of a frame relative to the last camera frame (1.0 if none was read)."""
+        if self._sensor_size is None:
+            return 1.0
+        h, w = frame.shape[:2]
+        sensor_h, sensor_w = self._sensor_size
+        return min(1.0, float(np.sqrt((h * w) / (sensor_h * sensor_w))))
+    
+    @staticmethod
+    def get_board_quad(board_info: Dict) -> Optional[np.ndarray]:
+        """
+        Get the four corners of a detected board.
+
+        Args:
+            board_info: Result of detect_board
+
+        Returns:
+            4x2 float32 corners in clockwise order starting nearest the top-left,
+            with the board's long edge running from the first corner to the second,
+            or None if the outline does not give a proper quadrilateral
+        """
+        contour = board_info["contour"]
+        epsilon = 0.02 * cv2.arcLength(contour, True)
+        approx = cv2.approxPolyDP(contour, epsilon, True).reshape(-1, 2)
+        if len(approx) == 4:
+            corners = approx.astype(np.float32)
+        else:
+            # 5-6 vertex outlines (chamfered corners) fall back to the minimum-area rectangle
+            corners = cv2.boxPoints(cv2.minAreaRect(contour)).astype(np.float32)
+
+        # Clockwise by angle around the centroid (image y points down), which stays
+        # well defined at any rotation, then start from the corner nearest the top-left
+        center = corners.mean(axis=0)
+        angles = np.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0])
+        quad = corners[np.argsort(angles)]
+        quad = np.roll(quad, -int(np.argmin(quad.sum(axis=1))), axis=0)
+
+        if not cv2.isContourConvex(quad.reshape(-1, 1, 2)) or cv2.contourArea(quad) < 1.0:
+            return None
+
+        # Boards standing upright are turned so the canonical crop is always landscape
+        width = np.linalg.norm(quad[1] - quad[0]) + np.linalg.norm(quad[2] - quad[3])
+        height = np.linalg.norm(quad[3] - quad[0]) + np.linalg.norm(quad[2] - quad[1])
+        if height > width:
+            quad = np.roll(quad, -1, axis=0)
+        return quad
+
+    def rectify_board(self,
+                      frame: np.ndarray,
+                      board_info: Optional[Dict] = None,
+                      output_size: Optional[Tuple[int, int]] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Warp the detected board to a fronto-parallel crop without the background.
+
+        Args:
+            frame: Camera frame containing the board
+            board_info: Result of detect_board for this frame (detected if not given)
+            output_size: Canonical (width, height) of the crop; defaults to the board's
+                size in the frame
+
+        Returns:
+            Tuple of (rectified_image, homography from frame to crop coordinates),
+            or None if no board was found
+        """
+        if board_info is None:
+            board_info = self.detect_board(frame)
+            if board_info is None:
+                return None
+
+        try:
+            quad = self.get_board_quad(board_info)
+            if quad is None:
+                self.logger.warning("Board outline is not a usable quadrilateral, skipping rectification")
+                return None
+            if output_size is None:
+                width = (np.linalg.norm(quad[1] - quad[0]) + np.linalg.norm(quad[2] - quad[3])) / 2
+                height = (np.linalg.norm(quad[3] - quad[0]) + np.linalg.norm(quad[2] - quad[1])) / 2
+                output_size = (int(round(width)), int(round(height)))
+
+            out_w, out_h = int(output_size[0]), int(output_size[1])
+            target = np.array([[0, 0], [out_w - 1, 0], [out_w - 1, out_h - 1], [0, out_h - 1]], dtype=np.float32)
+            homography = cv2.getPerspectiveTransform(quad, target)
+            rectified = cv2.warpPerspective(frame, homography, (out_w, out_h), flags=cv2.INTER_LINEAR)
+            return rectified, homography
+
+        except Exception as e:
+            self.logger.error(f"Error in board rectification: {e}")
+            return None
+
     def auto_zoom_to_board(self, frame: np.ndarray) -> Optional[np.ndarray]:
         """
         Automatically zoom to fit the detected board in the frame.
         
         Returns:
-            Zoomed frame or None if no board detected
+            Zoomed view of the frame or None if no board detected
         """
         board_info = self.detect_board(frame)
         if not board_info:
@@ -369,8 +740,8 @@ class CameraManager:
             # Apply zoom
             self.set_zoom(target_zoom)
             
-            # Return zoomed frame
-            return self._apply_zoom(frame)
+            # Return the zoomed view of the frame
+            return self.get_zoom_view(frame)[0]
             
         except Exception as e:
             self.logger.error(f"Error in auto zoom: {e}")
@@ -378,9 +749,13 @@ class CameraManager:
     
     def capture_snapshot(self, save_path: Optional[str] = None) -> Optional[np.ndarray]:
         """Capture a high-quality snapshot for PCB inspection."""
-        frame = self.get_frame()
+        # A frame taken after the request, so zoom/focus changes just made are in it
+        frame = self._read_raw_frame(fresh=True)
         if frame is None:
             return None
+        
+        # The one place the zoomed region is resampled to full resolution
+        frame = self._apply_zoom(frame)
             
         # Apply image enhancement for better PCB inspection
         enhanced_frame = self._enhance_image(frame)
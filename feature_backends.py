@@ -0,0 +1,123 @@
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# (rotation degrees, shift x, shift y) used to evaluate alignment on a reference image
+SYNTHETIC_TRANSFORMS = [
+    (0.0, 0, 0),
+    (0.5, 12, -8),
+    (-1.5, -25, 15),
+    (3.0, 40, 30),
+    (-5.0, -60, -45),
+]
+
+
+class FeatureBackend:
+    """A feature detector/descriptor and the distance used to match its descriptors."""
+
+    def __init__(self, name: str, factory: Callable, binary: bool):
+        self.name = name
+        self.factory = factory
+        self.binary = binary
+
+    @property
+    def norm(self) -> int:
+        """OpenCV norm for brute-force matching (Hamming for binary descriptors)."""
+        return cv2.NORM_HAMMING if self.binary else cv2.NORM_L2
+
+    def create_detector(self):
+        """Create a new detector/descriptor instance."""
+        return self.factory()
+
+    def create_matcher(self) -> cv2.BFMatcher:
+        """Create a brute-force matcher using this backend's norm."""
+        return cv2.BFMatcher(self.norm)
+
+
+FEATURE_BACKENDS: Dict[str, FeatureBackend] = {
+    "sift": FeatureBackend("sift", cv2.SIFT_create, binary=False),
+    # ORB defaults to 500 features, far too few for a full-resolution board
+    "orb": FeatureBackend("orb", lambda: cv2.ORB_create(nfeatures=5000), binary=True),
+    "akaze": FeatureBackend("akaze", cv2.AKAZE_create, binary=True),
+}
+
+
+def get_feature_backend(name: str) -> FeatureBackend:
+    """Look up a feature backend by name."""
+    try:
+        return FEATURE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown feature backend: {name}") from None
+
+
+def synthetic_transform(shape: Tuple[int, int], angle: float, dx: float, dy: float) -> np.ndarray:
+    """Return the 3x3 matrix mapping reference coordinates into a synthetic test image."""
+    h, w = shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    M[0, 2] += dx
+    M[1, 2] += dy
+    return np.vstack([M, [0, 0, 1]])
+
+
+def registration_error(estimated_H, ground_truth: np.ndarray, shape: Tuple[int, int]) -> float:
+    """Mean corner error after mapping reference -> test (ground truth) -> reference (estimate)."""
+    if estimated_H is None:
+        return float("inf")
+    h, w = shape[:2]
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    in_test = cv2.perspectiveTransform(corners, ground_truth)
+    recovered = cv2.perspectiveTransform(in_test, np.asarray(estimated_H, dtype=np.float64))
+    return float(np.mean(np.linalg.norm(recovered - corners, axis=2)))
+
+
+def evaluate_alignment(inspector,
+                       reference_img: np.ndarray,
+                       reference_path: Optional[str] = None,
+                       transforms: Optional[List[Tuple[float, float, float]]] = None,
+                       repeats: int = 1) -> Dict[str, List[float]]:
+    """
+    Align synthetic rotations/shifts of a reference image and record timing and error.
+
+    Args:
+        inspector: PCBInspector configured with the backend/modes to evaluate
+        reference_img: Reference (QA) image
+        reference_path: Path of the reference image (enables the feature store)
+        transforms: (angle, dx, dy) tuples, defaults to SYNTHETIC_TRANSFORMS
+        repeats: Alignments per transform
+
+    Returns:
+        Dictionary of per-alignment samples: align_ms, match_ms, error_px, plus failures
+    """
+    h, w = reference_img.shape[:2]
+    samples = {"align_ms": [], "match_ms": [], "error_px": [], "failures": 0}
+
+    for angle, dx, dy in transforms or SYNTHETIC_TRANSFORMS:
+        G = synthetic_transform(reference_img.shape, angle, dx, dy)
+        test_img = cv2.warpPerspective(reference_img, G, (w, h))
+
+        for _ in range(repeats):
+            start = time.perf_counter()
+            _, info = inspector.align_images(reference_img, test_img, reference_path=reference_path)
+            samples["align_ms"].append((time.perf_counter() - start) * 1000)
+
+            if not info.get("success"):
+                samples["failures"] += 1
+                continue
+            samples["match_ms"].append(info.get("match_time_ms", 0.0))
+            samples["error_px"].append(registration_error(info["homography_matrix"], G, reference_img.shape))
+
+    return samples
+
+
+def summarize_alignment(samples: Dict[str, List[float]]) -> Dict[str, float]:
+    """Reduce evaluate_alignment samples to means and worst-case error."""
+    errors = samples["error_px"]
+    return {
+        "match_ms": float(np.mean(samples["match_ms"])) if samples["match_ms"] else float("nan"),
+        "align_ms": float(np.mean(samples["align_ms"])) if samples["align_ms"] else float("nan"),
+        "error_px": float(np.mean(errors)) if errors else float("inf"),
+        "max_error_px": float(np.max(errors)) if errors else float("inf"),
+        "failures": samples["failures"],
+    }
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class FeatureStore:
+    """Persists keypoints and descriptors of QA sample images so they are computed once."""
+
+    FILE_SUFFIX = ".features.npz"
+
+    def __init__(self, backend_name: str = "sift"):
+        self.backend_name = backend_name
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # (resolved path, backend) -> (mtime_ns, size, content_hash, keypoints, descriptors)
+        self._resident: Dict[Tuple[str, str], Tuple] = {}
+
+    @staticmethod
+    def hash_file(image_path: str) -> str:
+        """Return the SHA-256 hex digest of a file's contents."""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def store_path(self, image_path: str, backend_name: Optional[str] = None) -> Path:
+        """Location of the feature file stored next to an image."""
+        image_path = Path(image_path)
+        backend = backend_name or self.backend_name
+        return image_path.with_name(f"{image_path.stem}.{backend}{self.FILE_SUFFIX}")
+
+    def get_features(self,
+                     image_path: str,
+                     detector,
+                     gray: Optional[np.ndarray] = None,
+                     backend_name: Optional[str] = None) -> Tuple[List[cv2.KeyPoint], Optional[np.ndarray], str]:
+        """
+        Get keypoints and descriptors for an image, computing them only when needed.
+
+        Args:
+            image_path: Path to the reference image on disk
+            detector: OpenCV feature detector used when features must be computed
+            gray: Already decoded grayscale image (optional, avoids a re-read)
+            backend_name: Name of the detector backend (defaults to the store's backend)
+
+        Returns:
+            Tuple of (keypoints, descriptors, content_hash)
+        """
+        backend = backend_name or self.backend_name
+        path = Path(image_path)
+        stat = path.stat()
+        resident_key = (str(path.resolve()), backend)
+
+        with self._lock:
+            entry = self._resident.get(resident_key)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[3], entry[4], entry[2]
+
+        content_hash = self.hash_file(str(path))
+        loaded = self._load(path, backend, content_hash)
+        if loaded is not None:
+            keypoints, descriptors = loaded
+        else:
+            if gray is None:
+                gray = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+                if gray is None:
+                    raise ValueError(f"Could not read image: {image_path}")
+            keypoints, descriptors = detector.detectAndCompute(gray, None)
+            self._save(path, backend, content_hash, keypoints, descriptors)
+
+        with self._lock:
+            self._resident[resident_key] = (stat.st_mtime_ns, stat.st_size, content_hash,
+                                            keypoints, descriptors)
+        return keypoints, descriptors, content_hash
+
+    def invalidate(self, image_path: str):
+        """Drop cached features for an image, both in memory and on disk."""
+        path = Path(image_path)
+        resolved = str(path.resolve())
+        with self._lock:
+            for key in [k for k in self._resident if k[0] == resolved]:
+                del self._resident[key]
+        for feature_file in path.parent.glob(f"{path.stem}.*{self.FILE_SUFFIX}"):
+            try:
+                feature_file.unlink()
+            except OSError as e:
+                self.logger.warning(f"Could not remove feature file {feature_file}: {e}")
+
+    def _load(self, path: Path, backend: str,
+              content_hash: str) -> Optional[Tuple[List[cv2.KeyPoint], Optional[np.ndarray]]]:
+        """Load stored features if they were computed from the same image content."""
+        feature_path = self.store_path(str(path), backend)
+        if not feature_path.exists():
+            return None
+
+        try:
+            with np.load(feature_path, allow_pickle=False) as data:
+                if str(data["content_hash"]) != content_hash:
+                    self.logger.info(f"Stale features for {path}, recomputing")
+                    return None
+                keypoint_data = data["keypoints"]
+                descriptors = data["descriptors"] if data["has_descriptors"] else None
+                descriptor_dtype = str(data["descriptor_dtype"])
+
+            if descriptors is not None:
+                descriptors = descriptors.astype(descriptor_dtype)
+
+            keypoints = [
+                cv2.KeyPoint(x=float(x), y=float(y), size=float(size), angle=float(angle),
+                             response=float(response), octave=int(octave), class_id=int(class_id))
+                for x, y, size, angle, response, octave, class_id in keypoint_data
+            ]
+            return keypoints, descriptors
+
+        except Exception as e:
+            self.logger.warning(f"Failed to load feature file {feature_path}: {e}")
+            return None
+
+    def _save(self, path: Path, backend: str, content_hash: str,
+              keypoints: List[cv2.KeyPoint], descriptors: Optional[np.ndarray]):
+        """Write features next to the image in a compact binary form."""
+        feature_path = self.store_path(str(path), backend)
+        keypoint_data = np.array(
+            [(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id)
+             for kp in keypoints],
+            dtype=np.float32
+        ).reshape(-1, 7)
+
+        has_descriptors = descriptors is not None
+        descriptor_dtype = str(descriptors.dtype) if has_descriptors else "float32"
+        stored_descriptors = descriptors if has_descriptors else np.empty((0, 0), np.uint8)
+        # SIFT descriptors are integer valued in [0, 255]; store them as bytes when lossless
+        if has_descriptors and descriptors.dtype == np.float32:
+            as_bytes = descriptors.astype(np.uint8)
+            if np.array_equal(as_bytes, descriptors):
+                stored_descriptors = as_bytes
+
+        try:
+            tmp_path = feature_path.with_name(feature_path.name + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                np.savez(f,
+                         content_hash=np.array(content_hash),
+                         keypoints=keypoint_data,
+                         descriptors=stored_descriptors,
+                         has_descriptors=np.array(has_descriptors),
+                         descriptor_dtype=np.array(descriptor_dtype))
+            tmp_path.replace(feature_path)
+        except OSError as e:
+            self.logger.warning(f"Could not persist features to {feature_path}: {e}")
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class ImageCache:
+    """
+    Byte-bounded LRU cache of decoded images and their grayscale versions.
+
+    Entries are keyed by path and validated against the file's mtime and size on
+    every lookup, so a replaced file is decoded again. Cached arrays are returned
+    read-only because they are shared between callers; copy one before drawing on it.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # (path, variant) -> (mtime_ns, size, image)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, int, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: str) -> Optional[np.ndarray]:
+        """
+        Get a decoded BGR image.
+
+        Args:
+            path: Image file path
+
+        Returns:
+            Read-only BGR image, or None if the file cannot be read
+        """
+        return self._get(path, "color")
+
+    def get_gray(self, path: str) -> Optional[np.ndarray]:
+        """
+        Get the grayscale version of an image (derived from a cached color decode if present).
+
+        Args:
+            path: Image file path
+
+        Returns:
+            Read-only grayscale image, or None if the file cannot be read
+        """
+        return self._get(path, "gray")
+
+    def _get(self, path: str, variant: str) -> Optional[np.ndarray]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        key = (os.path.abspath(path), variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        image = None
+        if variant == "gray":
+            with self._lock:
+                color = self._entries.get((key[0], "color"))
+            if color is not None and color[0] == stat.st_mtime_ns and color[1] == stat.st_size:
+                image = cv2.cvtColor(color[2], cv2.COLOR_BGR2GRAY)
+            else:
+                image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        else:
+            image = cv2.imread(path)
+        if image is None:
+            return None
+
+        image.flags.writeable = False
+        self._put(key, (stat.st_mtime_ns, stat.st_size, image))
+        return image
+
+    def _put(self, key: Tuple[str, str], entry: Tuple[int, int, np.ndarray]):
+        size = entry[2].nbytes
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2].nbytes
+            self._entries[key] = entry
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted[2].nbytes
+                self.evictions += 1
+
+    def invalidate(self, path: Optional[str] = None):
+        """Drop one file's cached images, or everything."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            path = os.path.abspath(path)
+            for variant in ("color", "gray"):
+                entry = self._entries.pop((path, variant), None)
+                if entry is not None:
+                    self._bytes -= entry[2].nbytes
+
+    def get_stats(self) -> Dict:
+        """Hit rate and memory use of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def reset_stats(self):
+        """Reset the hit/miss counters."""
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+
+# Process-wide cache shared by the GUI, inspection workers and QAManager
+shared_image_cache = ImageCache()
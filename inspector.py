@@ -4,76 +4,205 @@ from typing import Dict, List, Optional, Tuple, Any
 import logging
 from pathlib import Path
 import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from feature_store import FeatureStore
+from alignment_cache import AlignmentCache
+from ssim import region_ssim_map, structural_similarity as ssim, structural_similarity_tiled
+from feature_backends import FEATURE_BACKENDS, FeatureBackend, evaluate_alignment, get_feature_backend, summarize_alignment
+
+# FLANN index algorithms (see flann/defines.h)
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
 
 class PCBInspector:
     """Performs automated visual inspection of PCBs using computer vision."""
     
-    def __init__(self):
+    MATCHING_MODES = ("bruteforce", "flann")
+    ALIGNMENT_MODES = ("feature", "pyramid", "phase", "fiducial")
+    COMPARISON_MODES = ("full", "screened")
+    
+    # Local refinement must beat the coarse homography by this much (held-out RMS, pixels)
+    REFINE_MIN_GAIN_PX = 0.05
+    # Largest rotation a phase-correlation estimate may be corrected by in refinement; the
+    # search windows are a few pixels wide, so anything larger is a false match
+    PHASE_MAX_CORRECTION_DEGREES = 1.0
+    # Beyond this rotation the unrefined phase estimate is off by more than half a pixel
+    # at the board edges, so feature alignment is used when refinement does not succeed
+    PHASE_MAX_UNREFINED_DEGREES = 10.0
+    
+    def __init__(self,
+                 feature_store: Optional[FeatureStore] = None,
+                 matching_mode: str = "bruteforce",
+                 max_resident_indices: int = 8,
+                 alignment_mode: str = "feature",
+                 pyramid_max_dim: int = 640,
+                 feature_backend: str = "sift",
+                 phase_max_dim: int = 512,
+                 phase_min_confidence: float = 0.3,
+                 fiducial_search_radius: int = 40,
+                 fiducial_min_score: float = 0.6,
+                 reuse_alignment: bool = False,
+                 alignment_cache: Optional[AlignmentCache] = None,
+                 ssim_workers: Optional[int] = 1,
+                 ssim_tile_size: Tuple[int, int] = (512, 512),
+                 comparison_mode: str = "full",
+                 screen_scale: int = 4,
+                 screen_tile_size: int = 64,
+                 screen_sample_step: int = 2,
+                 min_region_area: int = 100,
+                 region_merge_kernel: int = 0,
+                 region_nms_iou: Optional[float] = None):
+        if matching_mode not in self.MATCHING_MODES:
+            raise ValueError(f"Unknown matching mode: {matching_mode}")
+        if alignment_mode not in self.ALIGNMENT_MODES:
+            raise ValueError(f"Unknown alignment mode: {alignment_mode}")
+        if comparison_mode not in self.COMPARISON_MODES:
+            raise ValueError(f"Unknown comparison mode: {comparison_mode}")
+        
         self.logger = logging.getLogger(__name__)
-        self.feature_detector = cv2.SIFT_create()
-        self.matcher = cv2.BFMatcher()
+        
+        # Pluggable detector/descriptor; boards may be assigned their own backend
+        self.feature_backend = get_feature_backend(feature_backend)
+        self.board_backends: Dict[str, str] = {}
+        self._backend_tools: Dict[str, Tuple[Any, cv2.BFMatcher]] = {}
+        self.feature_detector, self.matcher = self._get_backend_tools(self.feature_backend)
+        self.feature_store = feature_store or FeatureStore(backend_name=self.feature_backend.name)
+        
+        # Prebuilt matcher indices per reference, keyed by reference content hash
+        self.matching_mode = matching_mode
+        self.max_resident_indices = max_resident_indices
+        self._match_indices: "OrderedDict[str, cv2.FlannBasedMatcher]" = OrderedDict()
+        self._index_lock = threading.Lock()
+        
+        # Coarse-to-fine alignment settings
+        self.alignment_mode = alignment_mode
+        self.pyramid_max_dim = pyramid_max_dim
+        
+        # Phase correlation registration settings
+        self.phase_max_dim = phase_max_dim
+        self.phase_min_confidence = phase_min_confidence
+        
+        # Fiducial registration settings
+        self.fiducial_search_radius = fiducial_search_radius
+        self.fiducial_min_score = fiducial_min_score
+        
+        # Last good homography per board, reused while it still verifies
+        self.reuse_alignment = reuse_alignment
+        self.alignment_cache = alignment_cache or AlignmentCache()
+        
+        # Full-frame SSIM runs tiled in a thread pool unless ssim_workers is 1
+        # (None uses every core)
+        self.ssim_workers = ssim_workers if ssim_workers is not None else (os.cpu_count() or 1)
+        self.ssim_tile_size = ssim_tile_size
+        self._ssim_executor = (ThreadPoolExecutor(max_workers=self.ssim_workers, thread_name_prefix="ssim")
+                               if self.ssim_workers > 1 else None)
+        
+        # Two-pass comparison: a coarse pass picks the tiles analysed at full resolution
+        self.comparison_mode = comparison_mode
+        self.screen_scale = screen_scale
+        self.screen_tile_size = screen_tile_size
+        # Every screen_sample_step-th tile (in each direction) that passes screening is still
+        # compared at full resolution, to estimate the full-resolution score of the rest
+        self.screen_sample_step = screen_sample_step
+        
+        # Difference region extraction: noise floor, optional closing to merge nearby
+        # blobs, and optional suppression of overlapping boxes
+        self.min_region_area = min_region_area
+        self.region_merge_kernel = region_merge_kernel
+        self.region_nms_iou = region_nms_iou
         
     def align_images(self, 
                     reference_img: np.ndarray, 
-                    test_img: np.ndarray) -> Tuple[np.ndarray, Dict]:
+                    test_img: np.ndarray,
+                    reference_path: Optional[str] = None,
+                    mode: Optional[str] = None,
+                    fiducials: Optional[List[Dict]] = None,
+                    board_key: Optional[str] = None,
+                    reference_pyramid: Optional[List[np.ndarray]] = None) -> Tuple[np.ndarray, Dict]:
         """
         Align test image with reference image using feature matching.
         
         Args:
             reference_img: Reference (QA) image
             test_img: Test image to align
+            reference_path: Path the reference was loaded from (optional). When given,
+                reference features are loaded from the feature store instead of recomputed.
+            mode: Alignment mode overriding the inspector default
+                ("feature", "pyramid", "phase" or "fiducial")
+            fiducials: Fiducial locations on the reference, as stored by
+                QAManager.set_fiducials (required for "fiducial" mode)
+            board_key: Key for homography reuse across inspections (defaults to
+                reference_path). Only used when reuse_alignment is enabled.
+            reference_pyramid: Precomputed grayscale pyramid of the reference, full
+                resolution first (the "pyramid" of QAManager.load_compiled_assets).
+                Saves the grayscale conversion and the downscaling of the reference.
             
         Returns:
             Tuple of (aligned_image, alignment_info)
         """
+        mode = mode or self.alignment_mode
         try:
-            # Convert images to grayscale for feature detection
-            ref_gray = cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
-            test_gray = cv2.cvtColor(test_img, cv2.COLOR_BGR2GRAY)
+            if mode not in self.ALIGNMENT_MODES:
+                raise ValueError(f"Unknown alignment mode: {mode}")
             
-            # Detect keypoints and descriptors
-            ref_kp, ref_des = self.feature_detector.detectAndCompute(ref_gray, None)
-            test_kp, test_des = self.feature_detector.detectAndCompute(test_gray, None)
-            
-            if ref_des is None or test_des is None:
-                self.logger.warning("No features detected in one or both images")
-                return test_img, {"error": "No features detected"}
-            
-            # Match features
-            matches = self.matcher.knnMatch(ref_des, test_des, k=2)
-            
-            # Apply ratio test to filter good matches
-            good_matches = []
-            for match_pair in matches:
-                if len(match_pair) == 2:
-                    m, n = match_pair
-                    if m.distance < 0.75 * n.distance:
-                        good_matches.append(m)
+            test_gray = cv2.cvtColor(test_img, cv2.COLOR_BGR2GRAY)
+            backend = self._backend_for(reference_path)
+            h, w = reference_img.shape[:2]
+            if reference_pyramid and reference_pyramid[0].shape != (h, w):
+                self.logger.warning("Reference pyramid does not match the reference image, ignoring it")
+                reference_pyramid = None
             
-            if len(good_matches) < 4:
-                self.logger.warning("Insufficient good matches for alignment")
-                return test_img, {"error": "Insufficient matches"}
+            # Reported on every path, so results look the same whether or not the cache hit
+            summary = {
+                "alignment_mode": mode,
+                "matching_mode": self.matching_mode,
+                "feature_backend": backend.name
+            }
             
-            # Extract matched keypoints
-            ref_pts = np.float32([ref_kp[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-            test_pts = np.float32([test_kp[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+            # Consecutive boards on one fixture: reuse the last homography if it still holds
+            cache_key = (board_key or reference_path) if self.reuse_alignment else None
+            if cache_key:
+                ref_gray = self._reference_gray(reference_img, reference_pyramid)
+                H = self.alignment_cache.lookup(cache_key, ref_gray, test_gray)
+                if H is not None:
+                    aligned_img = cv2.warpPerspective(test_img, H, (w, h))
+                    return aligned_img, dict(summary,
+                                             homography_matrix=H.tolist(),
+                                             alignment_cache="hit",
+                                             success=True)
             
-            # Find homography matrix
-            H, mask = cv2.findHomography(test_pts, ref_pts, cv2.RANSAC, 5.0)
+            if mode == "pyramid":
+                H, alignment_info = self._estimate_pyramid_homography(reference_img, test_gray, reference_path,
+                                                                      backend, reference_pyramid)
+            elif mode == "phase":
+                H, alignment_info = self._estimate_phase_homography(reference_img, test_gray, reference_path,
+                                                                    backend, reference_pyramid)
+            elif mode == "fiducial":
+                H, alignment_info = self._estimate_fiducial_homography(
+                    reference_img, test_gray, fiducials or [], reference_path, backend
+                )
+            else:
+                H, alignment_info = self._estimate_feature_homography(reference_img, test_gray, reference_path, backend)
             
             if H is None:
-                self.logger.warning("Could not compute homography")
-                return test_img, {"error": "Homography computation failed"}
+                return test_img, alignment_info
+            
+            if cache_key:
+                self.alignment_cache.store(cache_key, ref_gray, H)
+                alignment_info["alignment_cache"] = "miss"
             
             # Warp test image to align with reference
-            h, w = ref_gray.shape
             aligned_img = cv2.warpPerspective(test_img, H, (w, h))
             
-            alignment_info = {
-                "matches_count": len(good_matches),
+            alignment_info.update(summary)
+            alignment_info.update({
                 "homography_matrix": H.tolist(),
                 "success": True
-            }
+            })
             
             return aligned_img, alignment_info
             
@@ -81,10 +210,659 @@ class PCBInspector:
             self.logger.error(f"Error during image alignment: {e}")
             return test_img, {"error": str(e)}
     
+    def _estimate_feature_homography(self,
+                                     reference_img: np.ndarray,
+                                     test_gray: np.ndarray,
+                                     reference_path: Optional[str] = None,
+                                     backend: Optional[FeatureBackend] = None) -> Tuple[Optional[np.ndarray], Dict]:
+        """Estimate the test->reference homography from full-resolution feature matches."""
+        backend = backend or self.feature_backend
+        detector, _ = self._get_backend_tools(backend)
+        
+        # Detect keypoints and descriptors
+        ref_kp, ref_des, ref_key = self._get_reference_features(reference_img, reference_path, backend)
+        test_kp, test_des = detector.detectAndCompute(test_gray, None)
+        
+        if ref_des is None or test_des is None:
+            self.logger.warning("No features detected in one or both images")
+            return None, {"error": "No features detected"}
+        
+        # Match features and apply ratio test, as (reference index, test index) pairs
+        match_start = time.perf_counter()
+        good_matches = self._match_descriptors(ref_des, test_des, ref_key, backend)
+        match_time_ms = (time.perf_counter() - match_start) * 1000
+        
+        if len(good_matches) < 4:
+            self.logger.warning("Insufficient good matches for alignment")
+            return None, {"error": "Insufficient matches"}
+        
+        # Extract matched keypoints
+        ref_pts = np.float32([ref_kp[r].pt for r, _ in good_matches]).reshape(-1, 1, 2)
+        test_pts = np.float32([test_kp[t].pt for _, t in good_matches]).reshape(-1, 1, 2)
+        
+        # Find homography matrix
+        H, mask = cv2.findHomography(test_pts, ref_pts, cv2.RANSAC, 5.0)
+        
+        if H is None:
+            self.logger.warning("Could not compute homography")
+            return None, {"error": "Homography computation failed"}
+        
+        return H, {"matches_count": len(good_matches), "match_time_ms": match_time_ms}
+    
+    def _estimate_pyramid_homography(self,
+                                     reference_img: np.ndarray,
+                                     test_gray: np.ndarray,
+                                     reference_path: Optional[str] = None,
+                                     backend: Optional[FeatureBackend] = None,
+                                     reference_pyramid: Optional[List[np.ndarray]] = None) -> Tuple[Optional[np.ndarray], Dict]:
+        """
+        Estimate the homography coarse-to-fine.
+        
+        Features are matched on a downscaled pair to get a coarse homography, which is
+        then refined at full resolution by template matching small reference patches
+        against the test image warped into the reference frame around them. The
+        refinement is only used where it measurably beats the coarse homography.
+        """
+        # The reference scale depends on the reference alone, so its cached coarse
+        # features stay valid whatever resolution the test image comes in at
+        scale = self.pyramid_max_dim / max(reference_img.shape[:2])
+        test_scale = min(1.0, self.pyramid_max_dim / max(test_gray.shape[:2]))
+        if scale >= 1.0:
+            # Already small enough - the coarse level is the full resolution
+            return self._estimate_feature_homography(reference_img, test_gray, reference_path, backend)
+        
+        backend = backend or self.feature_backend
+        detector, _ = self._get_backend_tools(backend)
+        
+        ref_gray = self._reference_gray(reference_img, reference_pyramid)
+        ref_small = self._downscale_reference(ref_gray, reference_pyramid, scale)
+        test_small = cv2.resize(test_gray, None, fx=test_scale, fy=test_scale, interpolation=cv2.INTER_AREA)
+        
+        # Coarse level: reference features are cached under their own backend name
+        ref_key = None
+        if reference_path and Path(reference_path).exists():
+            try:
+                coarse_name = f"{backend.name}_coarse{self.pyramid_max_dim}"
+                ref_kp, ref_des, ref_hash = self.feature_store.get_features(
+                    reference_path, detector, gray=ref_small, backend_name=coarse_name
+                )
+                ref_key = f"{ref_hash}:{coarse_name}"
+            except Exception as e:
+                self.logger.warning(f"Feature store unavailable for {reference_path}: {e}")
+                ref_kp, ref_des = detector.detectAndCompute(ref_small, None)
+        else:
+            ref_kp, ref_des = detector.detectAndCompute(ref_small, None)
+        test_kp, test_des = detector.detectAndCompute(test_small, None)
+        
+        if ref_des is None or test_des is None:
+            self.logger.warning("No features detected in one or both images")
+            return None, {"error": "No features detected"}
+        
+        match_start = time.perf_counter()
+        good_matches = self._match_descriptors(ref_des, test_des, ref_key, backend)
+        match_time_ms = (time.perf_counter() - match_start) * 1000
+        
+        if len(good_matches) < 4:
+            self.logger.warning("Insufficient good matches for coarse alignment")
+            return None, {"error": "Insufficient matches"}
+        
+        ref_pts = np.float32([ref_kp[r].pt for r, _ in good_matches]).reshape(-1, 1, 2)
+        test_pts = np.float32([test_kp[t].pt for _, t in good_matches]).reshape(-1, 1, 2)
+        H_small, _ = cv2.findHomography(test_pts, ref_pts, cv2.RANSAC, 5.0 * scale)
+        
+        if H_small is None:
+            self.logger.warning("Could not compute coarse homography")
+            return None, {"error": "Homography computation failed"}
+        
+        # Lift the coarse homography to full resolution: H = S_ref^-1 * H_small * S_test
+        S_ref = np.diag([scale, scale, 1.0])
+        S_test = np.diag([test_scale, test_scale, 1.0])
+        H_coarse = np.linalg.inv(S_ref) @ H_small @ S_test
+        
+        # Anchor points: strongest coarse reference keypoints, spread over a grid
+        anchors = self._select_anchor_points(ref_kp, ref_small.shape, grid=(8, 6))
+        anchors = anchors / scale
+        
+        H_refined, refined_points = self._refine_homography_locally(ref_gray, test_gray, H_coarse, anchors)
+        
+        alignment_info = {
+            "matches_count": len(good_matches),
+            "match_time_ms": match_time_ms,
+            "pyramid_scale": scale,
+            "pyramid_test_scale": test_scale,
+            "refined_points": refined_points,
+            "refined": H_refined is not None
+        }
+        return (H_refined if H_refined is not None else H_coarse), alignment_info
+    
+    def _estimate_phase_homography(self,
+                                   reference_img: np.ndarray,
+                                   test_gray: np.ndarray,
+                                   reference_path: Optional[str] = None,
+                                   backend: Optional[FeatureBackend] = None,
+                                   reference_pyramid: Optional[List[np.ndarray]] = None) -> Tuple[Optional[np.ndarray], Dict]:
+        """
+        Estimate a rotation + translation with FFT phase correlation on downsampled images.
+        
+        Rotation comes from phase correlation of the log-polar magnitude spectra, then
+        translation from phase correlation of the de-rotated images. The transform is
+        refined locally at full resolution; the refinement is kept only if it lowers the
+        error on the matched anchors and stays within PHASE_MAX_CORRECTION_DEGREES of
+        the phase estimate. When the correlation peak is weak (e.g. a large or
+        perspective offset), or the board is turned by more than
+        PHASE_MAX_UNREFINED_DEGREES and could not be refined, the full
+        feature/homography path is used instead.
+        """
+        ref_gray = self._reference_gray(reference_img, reference_pyramid)
+        rh, rw = ref_gray.shape[:2]
+        th, tw = test_gray.shape[:2]
+        
+        # Phase correlation recovers rotation + translation only, so the test image is
+        # resampled onto the downsampled reference grid. A different aspect ratio means
+        # a different field of view, which that cannot model.
+        if abs((tw / th) / (rw / rh) - 1.0) > 0.02:
+            self.logger.info("Reference and test aspect ratios differ, using feature alignment")
+            H, alignment_info = self._estimate_feature_homography(reference_img, test_gray, reference_path, backend)
+            alignment_info.update({"phase_fallback": True})
+            return H, alignment_info
+        
+        scale = min(1.0, self.phase_max_dim / max(rh, rw))
+        ref_small = self._downscale_reference(ref_gray, reference_pyramid, scale).astype(np.float32)
+        sh, sw = ref_small.shape[:2]
+        test_small = cv2.resize(test_gray, (sw, sh), interpolation=cv2.INTER_AREA).astype(np.float32)
+        # Each image gets its own (possibly non-uniform) scale to the common grid
+        S_ref = np.diag([sw / rw, sh / rh, 1.0])
+        S_test = np.diag([sw / tw, sh / th, 1.0])
+        
+        # Rotation: a rotation of the image is a vertical shift of its log-polar spectrum
+        angle_steps = 720
+        (_, shift_y), _ = cv2.phaseCorrelate(self._log_polar_spectrum(ref_small, angle_steps),
+                                             self._log_polar_spectrum(test_small, angle_steps))
+        angle = -shift_y * 360.0 / angle_steps
+        
+        # Translation: undo the rotation and correlate again
+        R = np.vstack([cv2.getRotationMatrix2D((sw / 2, sh / 2), -angle, 1.0), [0, 0, 1]])
+        derotated = cv2.warpAffine(test_small, R[:2], (sw, sh))
+        window = cv2.createHanningWindow((sw, sh), cv2.CV_32F)
+        (tx, ty), confidence = cv2.phaseCorrelate(ref_small, derotated, window)
+        
+        # cv2.phaseCorrelate reports responses above 1 for degenerate (e.g. flat) inputs
+        if confidence < self.phase_min_confidence or confidence > 1.0:
+            self.logger.info(f"Phase correlation confidence {confidence:.2f} unusable, using feature alignment")
+            H, alignment_info = self._estimate_feature_homography(reference_img, test_gray, reference_path, backend)
+            alignment_info.update({"phase_confidence": float(confidence), "phase_fallback": True})
+            return H, alignment_info
+        
+        # Test -> reference in downsampled coordinates, lifted to full resolution
+        H_small = np.array([[1.0, 0.0, -tx], [0.0, 1.0, -ty], [0.0, 0.0, 1.0]]) @ R
+        H_phase = np.linalg.inv(S_ref) @ H_small @ S_test
+        
+        corners = cv2.goodFeaturesToTrack(ref_small, maxCorners=64, qualityLevel=0.01,
+                                          minDistance=max(sw, sh) / 12)
+        anchors = (corners.reshape(-1, 2) / [S_ref[0, 0], S_ref[1, 1]] if corners is not None
+                   else np.empty((0, 2), np.float32))
+        H_refined, refined_points = self._refine_homography_locally(ref_gray, test_gray, H_phase, anchors)
+        if H_refined is not None:
+            correction = H_refined @ np.linalg.inv(H_phase)
+            correction_deg = np.degrees(np.arctan2(correction[1, 0], correction[0, 0]))
+            if abs(correction_deg) > self.PHASE_MAX_CORRECTION_DEGREES:
+                self.logger.info(f"Refinement rotated the phase estimate by {correction_deg:.1f} deg, discarding it")
+                H_refined = None
+        
+        rotation = (angle + 180.0) % 360.0 - 180.0
+        if H_refined is None and abs(rotation) > self.PHASE_MAX_UNREFINED_DEGREES:
+            self.logger.info(f"Phase estimate at {rotation:.1f} deg could not be refined, using feature alignment")
+            H, alignment_info = self._estimate_feature_homography(reference_img, test_gray, reference_path, backend)
+            alignment_info.update({"phase_confidence": float(confidence), "phase_fallback": True,
+                                   "rotation_degrees": float(rotation)})
+            return H, alignment_info
+        
+        alignment_info = {
+            "phase_confidence": float(confidence),
+            "phase_fallback": False,
+            "rotation_degrees": float(rotation),
+            "translation": [float(tx / S_ref[0, 0]), float(ty / S_ref[1, 1])],
+            "refined_points": refined_points,
+            "refined": H_refined is not None
+        }
+        return (H_refined if H_refined is not None else H_phase), alignment_info
+    
+    @staticmethod
+    def _reference_gray(reference_img: np.ndarray,
+                        reference_pyramid: Optional[List[np.ndarray]] = None) -> np.ndarray:
+        """Full-resolution grayscale reference, taken from the compiled pyramid when given."""
+        if reference_pyramid:
+            return reference_pyramid[0]
+        return cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
+    
+    @staticmethod
+    def _downscale_reference(ref_gray: np.ndarray,
+                             reference_pyramid: Optional[List[np.ndarray]],
+                             scale: float) -> np.ndarray:
+        """Reference scaled by scale, resized from the smallest compiled level that is still larger."""
+        h, w = ref_gray.shape[:2]
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        source = ref_gray
+        for level in reference_pyramid or []:
+            if level.shape[1] >= size[0] and level.shape[0] >= size[1]:
+                source = level
+        if source.shape[1] == size[0] and source.shape[0] == size[1]:
+            return source
+        return cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+    
+    def _estimate_fiducial_homography(self,
+                                      reference_img: np.ndarray,
+                                      test_gray: np.ndarray,
+                                      fiducials: List[Dict],
+                                      reference_path: Optional[str] = None,
+                                      backend: Optional[FeatureBackend] = None) -> Tuple[Optional[np.ndarray], Dict]:
+        """
+        Estimate the transform from fiducial marks found by template matching.
+        
+        Each fiducial's reference patch is searched for in a small window around the same
+        position in the test image (boards sit in a fixture). Six or more located
+        fiducials give a homography, two to five a rotation/translation/scale. With
+        fewer, the full feature/homography path is used instead.
+        """
+        ref_gray = cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
+        h, w = ref_gray.shape[:2]
+        th, tw = test_gray.shape[:2]
+        s = self.fiducial_search_radius
+        
+        ref_pts, test_pts, scores = [], [], []
+        for fiducial in fiducials:
+            cx, cy = (int(round(v)) for v in fiducial["center"])
+            r = int(fiducial.get("size", 48)) // 2
+            if not (r <= cx < w - r and r <= cy < h - r):
+                continue
+            
+            template = ref_gray[cy - r:cy + r + 1, cx - r:cx + r + 1]
+            x0, y0 = max(cx - r - s, 0), max(cy - r - s, 0)
+            x1, y1 = min(cx + r + s + 1, tw), min(cy + r + s + 1, th)
+            window = test_gray[y0:y1, x0:x1]
+            if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+                continue
+            
+            result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (mx, my) = cv2.minMaxLoc(result)
+            if score < self.fiducial_min_score:
+                continue
+            
+            dx, dy = self._subpixel_peak(result, mx, my)
+            ref_pts.append((cx, cy))
+            test_pts.append((x0 + mx + dx + r, y0 + my + dy + r))
+            scores.append(float(score))
+        
+        H, inliers = None, 0
+        if len(ref_pts) >= 6:
+            H, mask = cv2.findHomography(np.float32(test_pts).reshape(-1, 1, 2),
+                                         np.float32(ref_pts).reshape(-1, 1, 2), cv2.RANSAC, 3.0)
+            inliers = int(mask.sum()) if mask is not None else 0
+        elif len(ref_pts) >= 2:
+            # Too few points to reject an outlier with a full homography
+            A, mask = cv2.estimateAffinePartial2D(np.float32(test_pts), np.float32(ref_pts),
+                                                  method=cv2.RANSAC, ransacReprojThreshold=3.0)
+            if A is not None:
+                H = np.vstack([A, [0, 0, 1]])
+                inliers = int(mask.sum()) if mask is not None else 0
+        
+        if H is not None and inliers < 2:
+            H = None
+        
+        if H is None:
+            self.logger.info(f"Located {len(ref_pts)}/{len(fiducials)} fiducials, using feature alignment")
+            H, alignment_info = self._estimate_feature_homography(reference_img, test_gray, reference_path, backend)
+            alignment_info.update({"fiducials_found": len(ref_pts), "fiducial_fallback": True})
+            return H, alignment_info
+        
+        return H, {
+            "fiducials_found": len(ref_pts),
+            "fiducials_total": len(fiducials),
+            "fiducial_inliers": inliers,
+            "fiducial_scores": scores,
+            "fiducial_fallback": False
+        }
+    
+    @staticmethod
+    def _log_polar_spectrum(gray: np.ndarray, angle_steps: int) -> np.ndarray:
+        """High-pass filtered log-polar magnitude spectrum of the centred square crop."""
+        h, w = gray.shape[:2]
+        size = min(h, w)
+        y0, x0 = (h - size) // 2, (w - size) // 2
+        square = gray[y0:y0 + size, x0:x0 + size]
+        
+        window = cv2.createHanningWindow((size, size), cv2.CV_32F)
+        magnitude = np.abs(np.fft.fftshift(np.fft.fft2(square * window)))
+        
+        # Suppress the low frequencies that dominate the spectrum but carry no rotation cue
+        yy, xx = np.mgrid[-1:1:size * 1j, -1:1:size * 1j]
+        high_pass = 1.0 - np.cos(np.pi * np.clip(np.hypot(xx, yy), 0.0, 1.0))
+        spectrum = (np.log1p(magnitude) * high_pass).astype(np.float32)
+        
+        centre = (size / 2, size / 2)
+        return cv2.warpPolar(spectrum, (size // 2, angle_steps), centre, size / 2,
+                             cv2.WARP_POLAR_LOG + cv2.INTER_LINEAR)
+    
+    @staticmethod
+    def _select_anchor_points(keypoints: List, shape: Tuple[int, int],
+                              grid: Tuple[int, int] = (8, 6)) -> np.ndarray:
+        """Pick the strongest keypoint in each grid cell so anchors cover the whole board."""
+        h, w = shape[:2]
+        cols, rows = grid
+        best: Dict[Tuple[int, int], Any] = {}
+        for kp in keypoints:
+            x, y = kp.pt
+            cell = (min(int(x * cols / w), cols - 1), min(int(y * rows / h), rows - 1))
+            if cell not in best or kp.response > best[cell].response:
+                best[cell] = kp
+        return np.float32([kp.pt for kp in best.values()]).reshape(-1, 2)
+    
+    def _refine_homography_locally(self,
+                                   ref_gray: np.ndarray,
+                                   test_gray: np.ndarray,
+                                   H_coarse: np.ndarray,
+                                   anchors: np.ndarray,
+                                   patch_radius: int = 16,
+                                   search_radius: int = 6,
+                                   min_score: float = 0.7,
+                                   folds: int = 4) -> Tuple[Optional[np.ndarray], int]:
+        """
+        Refine a coarse homography with full-resolution template matches around anchors.
+        
+        The test image around each anchor is first warped into the reference frame with
+        H_coarse, so the reference patch and the search window line up at any rotation
+        and the match only measures the coarse estimate's residual offset. The refined
+        homography is kept only if its cross-validated error on the matched anchors is
+        measurably lower than the coarse one's; otherwise None is returned and the
+        caller keeps H_coarse.
+        
+        Returns:
+            Tuple of (refined homography or None, number of accepted correspondences)
+        """
+        if len(anchors) == 0:
+            return None, 0
+        
+        h, w = ref_gray.shape[:2]
+        r, s = patch_radius, search_radius
+        size = 2 * (r + s) + 1
+        H_inv = np.linalg.inv(H_coarse)
+        
+        ref_pts, offsets = [], []
+        for ax, ay in anchors:
+            ax, ay = int(round(ax)), int(round(ay))
+            if not (r <= ax < w - r and r <= ay < h - r):
+                continue
+            
+            template = ref_gray[ay - r:ay + r + 1, ax - r:ax + r + 1]
+            if template.std() < 5.0:
+                continue  # Flat patch, no reliable match
+            
+            # Search window in reference coordinates, sampled from the test image
+            shift = np.array([[1.0, 0.0, r + s - ax], [0.0, 1.0, r + s - ay], [0.0, 0.0, 1.0]])
+            window = cv2.warpPerspective(test_gray, shift @ H_coarse, (size, size),
+                                         flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+            
+            scores = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, max_score, _, (mx, my) = cv2.minMaxLoc(scores)
+            if max_score < min_score:
+                continue
+            
+            dx, dy = self._subpixel_peak(scores, mx, my)
+            ref_pts.append((ax, ay))
+            offsets.append((mx + dx - s, my + dy - s))
+        
+        if len(ref_pts) < 8:
+            return None, len(ref_pts)
+        
+        # The test point matching an anchor is where H_coarse sends the offset anchor
+        ref_pts = np.float32(ref_pts)
+        test_pts = cv2.perspectiveTransform((ref_pts + np.float32(offsets)).reshape(-1, 1, 2),
+                                            H_inv).reshape(-1, 2)
+        
+        H, mask = cv2.findHomography(test_pts.reshape(-1, 1, 2), ref_pts.reshape(-1, 1, 2), cv2.RANSAC, 3.0)
+        if H is None or mask is None:
+            return None, 0
+        inliers = mask.ravel().astype(bool)
+        if inliers.sum() < 8:
+            return None, int(inliers.sum())
+        ref_pts, test_pts = ref_pts[inliers], test_pts[inliers]
+        
+        coarse_error = self._reprojection_rms(H_coarse, test_pts, ref_pts)
+        refined_error = self._cross_validated_rms(test_pts, ref_pts, folds)
+        if refined_error > min(0.9 * coarse_error, coarse_error - self.REFINE_MIN_GAIN_PX):
+            self.logger.debug(f"Local refinement rejected: {refined_error:.3f}px vs coarse {coarse_error:.3f}px")
+            return None, int(inliers.sum())
+        return H, int(inliers.sum())
+    
+    @staticmethod
+    def _reprojection_rms(H: np.ndarray, test_pts: np.ndarray, ref_pts: np.ndarray) -> float:
+        """RMS distance between H(test_pts) and ref_pts."""
+        mapped = cv2.perspectiveTransform(test_pts.reshape(-1, 1, 2).astype(np.float64), H).reshape(-1, 2)
+        return float(np.sqrt(np.mean(np.sum((mapped - ref_pts) ** 2, axis=1))))
+    
+    @classmethod
+    def _cross_validated_rms(cls, test_pts: np.ndarray, ref_pts: np.ndarray, folds: int) -> float:
+        """
+        Held-out RMS error of homographies fitted to the other folds of the points.
+        
+        A fit always matches its own points at least as well as any other homography,
+        so comparing in-sample errors would always favour it.
+        """
+        errors = []
+        for fold in range(folds):
+            held_out = np.arange(len(ref_pts)) % folds == fold
+            if (~held_out).sum() < 4 or not held_out.any():
+                continue
+            H, _ = cv2.findHomography(test_pts[~held_out].reshape(-1, 1, 2), ref_pts[~held_out].reshape(-1, 1, 2), 0)
+            if H is None:
+                return float("inf")
+            mapped = cv2.perspectiveTransform(test_pts[held_out].reshape(-1, 1, 2).astype(np.float64), H).reshape(-1, 2)
+            errors.append(np.sum((mapped - ref_pts[held_out]) ** 2, axis=1))
+        if not errors:
+            return float("inf")
+        return float(np.sqrt(np.mean(np.concatenate(errors))))
+    
+    @staticmethod
+    def _subpixel_peak(scores: np.ndarray, x: int, y: int) -> Tuple[float, float]:
+        """Parabolic sub-pixel offset of a correlation peak."""
+        dx = dy = 0.0
+        if 0 < x < scores.shape[1] - 1:
+            left, centre, right = scores[y, x - 1], scores[y, x], scores[y, x + 1]
+            denom = left - 2 * centre + right
+            if denom != 0:
+                dx = float(0.5 * (left - right) / denom)
+        if 0 < y < scores.shape[0] - 1:
+            up, centre, down = scores[y - 1, x], scores[y, x], scores[y + 1, x]
+            denom = up - 2 * centre + down
+            if denom != 0:
+                dy = float(0.5 * (up - down) / denom)
+        return dx, dy
+    
+    def _get_backend_tools(self, backend: FeatureBackend) -> Tuple[Any, cv2.BFMatcher]:
+        """Get the (detector, brute-force matcher) pair for a backend, creating it once."""
+        tools = self._backend_tools.get(backend.name)
+        if tools is None:
+            tools = (backend.create_detector(), backend.create_matcher())
+            self._backend_tools[backend.name] = tools
+        return tools
+    
+    def _backend_for(self, reference_path: Optional[str] = None) -> FeatureBackend:
+        """Backend assigned to a reference board, falling back to the inspector default."""
+        name = self.board_backends.get(reference_path) if reference_path else None
+        return get_feature_backend(name) if name else self.feature_backend
+    
+    def set_board_backend(self, board_key: str, backend_name: str):
+        """Assign a feature backend to a reference board (keyed by reference image path)."""
+        get_feature_backend(backend_name)
+        self.board_backends[board_key] = backend_name
+    
+    def select_feature_backend(self,
+                               reference_img: np.ndarray,
+                               reference_path: Optional[str] = None,
+                               accuracy_target_px: float = 1.0,
+                               board_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Pick the fastest feature backend that meets an accuracy target for a board.
+        
+        Each backend aligns synthetic rotations/shifts of the reference image; the
+        fastest one whose worst-case corner error is within the target is assigned
+        to the board.
+        
+        Args:
+            reference_img: Reference (QA) image of the board
+            reference_path: Path of the reference image (enables the feature store)
+            accuracy_target_px: Maximum acceptable registration error in pixels
+            board_key: Key the selection is stored under (defaults to reference_path)
+            
+        Returns:
+            Dictionary with the selected backend name (or None) and per-backend results
+        """
+        results = {}
+        for name in FEATURE_BACKENDS:
+            candidate = PCBInspector(feature_store=self.feature_store,
+                                     matching_mode=self.matching_mode,
+                                     alignment_mode=self.alignment_mode,
+                                     pyramid_max_dim=self.pyramid_max_dim,
+                                     feature_backend=name)
+            # Untimed first pass populates the feature store and matcher index
+            candidate.align_images(reference_img, reference_img, reference_path=reference_path)
+            results[name] = summarize_alignment(
+                evaluate_alignment(candidate, reference_img, reference_path=reference_path)
+            )
+        
+        eligible = [name for name, r in results.items()
+                    if r["failures"] == 0 and r["max_error_px"] <= accuracy_target_px]
+        selected = min(eligible, key=lambda name: results[name]["align_ms"]) if eligible else None
+        
+        board_key = board_key or reference_path
+        if selected and board_key:
+            self.board_backends[board_key] = selected
+        
+        if selected:
+            self.logger.info(f"Selected feature backend '{selected}' for {board_key}")
+        else:
+            self.logger.warning(f"No feature backend met {accuracy_target_px}px for {board_key}")
+        
+        return {"selected": selected, "accuracy_target_px": accuracy_target_px, "results": results}
+    
+    def _get_reference_features(self,
+                                reference_img: np.ndarray,
+                                reference_path: Optional[str] = None,
+                                backend: Optional[FeatureBackend] = None) -> Tuple[List, Optional[np.ndarray], Optional[str]]:
+        """
+        Get reference keypoints/descriptors, from the feature store when the path is known.
+        
+        Returns:
+            Tuple of (keypoints, descriptors, index_key). The key identifies the reference
+            content and backend, and is None when features were computed from the
+            in-memory image.
+        """
+        backend = backend or self.feature_backend
+        detector, _ = self._get_backend_tools(backend)
+        
+        if reference_path and Path(reference_path).exists():
+            try:
+                keypoints, descriptors, content_hash = self.feature_store.get_features(
+                    reference_path, detector, backend_name=backend.name
+                )
+                return keypoints, descriptors, f"{content_hash}:{backend.name}"
+            except Exception as e:
+                self.logger.warning(f"Feature store unavailable for {reference_path}: {e}")
+        
+        ref_gray = cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
+        keypoints, descriptors = detector.detectAndCompute(ref_gray, None)
+        return keypoints, descriptors, None
+    
+    def _match_descriptors(self,
+                           ref_des: np.ndarray,
+                           test_des: np.ndarray,
+                           ref_key: Optional[str] = None,
+                           backend: Optional[FeatureBackend] = None,
+                           ratio: float = 0.75) -> List[Tuple[int, int]]:
+        """
+        Match descriptors with the configured matcher and apply Lowe's ratio test.
+        
+        Returns:
+            List of (reference_index, test_index) pairs
+        """
+        backend = backend or self.feature_backend
+        good_matches = []
+        
+        if self.matching_mode == "flann":
+            # The index holds the reference descriptors, so query with the test set
+            index = self._get_match_index(ref_des, ref_key, backend.binary)
+            query = test_des if backend.binary else self._flann_descriptors(test_des)
+            for match_pair in index.knnMatch(query, k=2):
+                if len(match_pair) == 2:
+                    m, n = match_pair
+                    if m.distance < ratio * n.distance:
+                        good_matches.append((m.trainIdx, m.queryIdx))
+        else:
+            _, matcher = self._get_backend_tools(backend)
+            for match_pair in matcher.knnMatch(ref_des, test_des, k=2):
+                if len(match_pair) == 2:
+                    m, n = match_pair
+                    if m.distance < ratio * n.distance:
+                        good_matches.append((m.queryIdx, m.trainIdx))
+        
+        return good_matches
+    
+    def _get_match_index(self,
+                         ref_des: np.ndarray,
+                         ref_key: Optional[str] = None,
+                         binary: bool = False) -> cv2.FlannBasedMatcher:
+        """Get the resident FLANN index for a reference, building it on first use."""
+        if ref_key is not None:
+            with self._index_lock:
+                index = self._match_indices.get(ref_key)
+                if index is not None:
+                    self._match_indices.move_to_end(ref_key)
+                    return index
+        
+        index = self._build_match_index(ref_des, binary)
+        
+        if ref_key is not None:
+            with self._index_lock:
+                self._match_indices[ref_key] = index
+                while len(self._match_indices) > self.max_resident_indices:
+                    self._match_indices.popitem(last=False)
+        
+        return index
+    
+    def _build_match_index(self, ref_des: np.ndarray, binary: bool = False) -> cv2.FlannBasedMatcher:
+        """Build a FLANN index over reference descriptors (KD-tree for float, LSH for binary)."""
+        if binary:
+            index_params = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+        else:
+            index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+        
+        index = cv2.FlannBasedMatcher(index_params, dict(checks=50))
+        index.add([ref_des if binary else self._flann_descriptors(ref_des)])
+        index.train()
+        return index
+    
+    @staticmethod
+    def _flann_descriptors(descriptors: np.ndarray) -> np.ndarray:
+        """FLANN's KD-tree needs float32 input."""
+        return descriptors.astype(np.float32, copy=False)
+    
+    def get_alignment_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the homography reuse cache."""
+        stats = self.alignment_cache.get_stats()
+        stats["enabled"] = self.reuse_alignment
+        return stats
+    
+    def clear_match_indices(self):
+        """Release all resident matcher indices."""
+        with self._index_lock:
+            self._match_indices.clear()
+    
     def compare_images(self, 
                       reference_img: np.ndarray, 
                       test_img: np.ndarray,
-                      threshold: float = 0.95) -> Dict[str, Any]:
+                      threshold: float = 0.95,
+                      mode: Optional[str] = None,
+                      mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """
         Compare test image with reference image to detect differences.
         
@@ -92,65 +870,419 @@ class PCBInspector:
             reference_img: Reference (QA) image
             test_img: Test image to compare
             threshold: Similarity threshold (0-1)
+            mode: "full" or "screened" (defaults to the inspector's comparison mode)
+            mask: Optional inspection mask in reference image coordinates (non-zero pixels
+                are inspected). Only its bounding box is processed.
             
         Returns:
             Dictionary containing comparison results
         """
         try:
+            mode = mode or self.comparison_mode
+            if mode not in self.COMPARISON_MODES:
+                raise ValueError(f"Unknown comparison mode: {mode}")
+            
             # Ensure images are the same size
             if reference_img.shape != test_img.shape:
                 test_img = cv2.resize(test_img, (reference_img.shape[1], reference_img.shape[0]))
             
+            # Restrict the work to the inspection mask's bounding box (plus the SSIM
+            # window halo so values inside the box match a full-frame computation)
+            full_shape = reference_img.shape[:2]
+            origin = (0, 0)
+            if mask is not None:
+                mask = self._fit_mask(mask, full_shape)
+                x0, y0, x1, y1 = self._mask_bounds(mask, margin=3)
+                reference_img = reference_img[y0:y1, x0:x1]
+                test_img = test_img[y0:y1, x0:x1]
+                mask = mask[y0:y1, x0:x1]
+                origin = (x0, y0)
+            
             # Convert to grayscale for comparison
             ref_gray = cv2.cvtColor(reference_img, cv2.COLOR_BGR2GRAY)
             test_gray = cv2.cvtColor(test_img, cv2.COLOR_BGR2GRAY)
             
-            # Calculate structural similarity index
-            from skimage.metrics import structural_similarity as ssim
-            similarity_score, diff_image = ssim(ref_gray, test_gray, full=True)
-            
-            # Create difference mask
-            diff_mask = (diff_image < threshold).astype(np.uint8) * 255
-            
-            # Find contours of differences
-            contours, _ = cv2.findContours(diff_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Filter contours by area (remove noise)
-            min_area = 100  # Minimum area for significant differences
-            significant_contours = [c for c in contours if cv2.contourArea(c) > min_area]
-            
-            # Create regions of interest for detailed analysis
-            regions_of_interest = []
-            for i, contour in enumerate(significant_contours):
-                x, y, w, h = cv2.boundingRect(contour)
-                region = {
-                    "id": i,
-                    "bbox": [x, y, w, h],
-                    "area": cv2.contourArea(contour),
-                    "center": [x + w//2, y + h//2]
-                }
-                regions_of_interest.append(region)
-            
-            # Calculate overall statistics
-            total_pixels = ref_gray.shape[0] * ref_gray.shape[1]
-            diff_pixels = np.sum(diff_mask > 0)
-            diff_percentage = (diff_pixels / total_pixels) * 100
-            
-            result = {
-                "similarity_score": float(similarity_score),
-                "difference_percentage": float(diff_percentage),
-                "regions_of_interest": regions_of_interest,
-                "total_regions": len(regions_of_interest),
-                "threshold": threshold,
-                "passed": similarity_score >= threshold
-            }
+            if mode == "screened":
+                result = self._compare_screened(ref_gray, test_gray, threshold, mask)
+            else:
+                result = self._compare_full(ref_gray, test_gray, threshold, mask)
+            return self._place_result(result, origin, full_shape)
             
+        except Exception as e:
+            self.logger.error(f"Error during image comparison: {e}")
+            return {"error": str(e)}
+    
+    def compare_with_model(self,
+                           model: Dict[str, Any],
+                           test_img: np.ndarray,
+                           z_threshold: float = 4.0,
+                           threshold: float = 0.95,
+                           min_std: float = 2.0,
+                           mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Compare an aligned test image against a per-pixel statistical reference model.
+        
+        Pixels further than z_threshold standard deviations from the golden-set mean
+        are marked as different. The similarity score is the fraction of pixels within
+        tolerance.
+        
+        Args:
+            model: Model from QAManager.load_reference_model() (float16 mean and variance)
+            test_img: Test image aligned to the reference
+            z_threshold: Deviation, in standard deviations, that marks a pixel as different
+            threshold: Minimum fraction of in-tolerance pixels to pass
+            min_std: Floor on the standard deviation (grey levels) for pixels that barely
+                varied across the golden set
+            mask: Optional inspection mask in reference image coordinates
+            
+        Returns:
+            Dictionary containing comparison results (same keys as compare_images)
+        """
+        try:
+            # float32 working copies are derived once per model and kept on it
+            prepared = model.get("_prepared")
+            if prepared is None or prepared[0] != min_std:
+                std = np.sqrt(np.maximum(model["variance"].astype(np.float32), min_std * min_std))
+                prepared = (min_std, model["mean"].astype(np.float32), (1.0 / std).astype(np.float32))
+                model["_prepared"] = prepared
+            _, mean, inv_std = prepared
+            
+            h, w = mean.shape
+            if test_img.shape[:2] != (h, w):
+                test_img = cv2.resize(test_img, (w, h))
+            
+            x0, y0, x1, y1 = 0, 0, w, h
+            if mask is not None:
+                mask = self._fit_mask(mask, (h, w))
+                x0, y0, x1, y1 = self._mask_bounds(mask)
+                mask = mask[y0:y1, x0:x1]
+            test_gray = cv2.cvtColor(test_img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+            
+            # z = |test - mean| / std, thresholded in place
+            z = cv2.absdiff(test_gray.astype(np.float32), mean[y0:y1, x0:x1])
+            z *= inv_std[y0:y1, x0:x1]
+            diff_mask = (z > z_threshold).astype(np.uint8) * 255
+            if mask is not None:
+                cv2.bitwise_and(diff_mask, mask, dst=diff_mask)
+            
+            regions_of_interest = self._extract_regions(diff_mask, offset=(x0, y0))
+            
+            total_pixels = cv2.countNonZero(mask) if mask is not None else h * w
+            diff_pixels = int(np.count_nonzero(diff_mask))
+            similarity_score = 1.0 - diff_pixels / total_pixels
+            
+            result = self._comparison_result(similarity_score, diff_pixels, total_pixels,
+                                             regions_of_interest, threshold,
+                                             (x1 - x0) * (y1 - y0), "model", None)
+            result["z_threshold"] = z_threshold
             return result
             
         except Exception as e:
-            self.logger.error(f"Error during image comparison: {e}")
+            self.logger.error(f"Error during model comparison: {e}")
             return {"error": str(e)}
     
+    def _compare_full(self,
+                      ref_gray: np.ndarray,
+                      test_gray: np.ndarray,
+                      threshold: float,
+                      mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Single-pass comparison at full resolution (see compare_images)."""
+        # Calculate structural similarity index
+        similarity_score, diff_image = self._full_frame_ssim(ref_gray, test_gray)
+        
+        # Create difference mask
+        diff_mask = (diff_image < threshold).astype(np.uint8) * 255
+        
+        # Calculate overall statistics over the inspected pixels
+        processed_pixels = ref_gray.shape[0] * ref_gray.shape[1]
+        total_pixels = processed_pixels
+        if mask is not None:
+            cv2.bitwise_and(diff_mask, mask, dst=diff_mask)
+            similarity_score = cv2.mean(diff_image, mask)[0]
+            total_pixels = cv2.countNonZero(mask)
+        diff_pixels = np.sum(diff_mask > 0)
+        
+        # Find connected regions of differences
+        regions_of_interest = self._extract_regions(diff_mask)
+        
+        return self._comparison_result(similarity_score, diff_pixels, total_pixels,
+                                       regions_of_interest, threshold, processed_pixels, "full",
+                                       diff_image)
+    
+    def _compare_screened(self,
+                          ref_gray: np.ndarray,
+                          test_gray: np.ndarray,
+                          threshold: float,
+                          mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Two-pass comparison: quarter-resolution SSIM flags suspect tiles, and full-resolution
+        SSIM and region extraction run only on those.
+        
+        The similarity score, and so pass/fail, uses full-resolution SSIM only, on the same
+        scale as full mode: suspect tiles contribute their exact values, and the tiles that
+        passed screening are counted at the mean of a regular sample of them
+        (screen_sample_step) that is also compared at full resolution. Coarse values, which
+        are inflated because downsampling averages away noise and small defects, only fill
+        the unsampled tiles of the returned SSIM map.
+        
+        Args:
+            ref_gray: Grayscale reference image
+            test_gray: Grayscale test image of the same size
+            threshold: Similarity threshold (0-1)
+            mask: Optional inspection mask of the same size
+            
+        Returns:
+            Dictionary containing comparison results
+        """
+        h, w = ref_gray.shape
+        scale = self.screen_scale
+        small_size = (max(w // scale, 1), max(h // scale, 1))
+        if min(small_size) < 7:
+            # Too small to screen - compare at full resolution
+            return self._compare_full(ref_gray, test_gray, threshold, mask)
+        
+        # Pass 1: coarse SSIM map, reduced to the minimum per tile
+        ref_small = cv2.resize(ref_gray, small_size, interpolation=cv2.INTER_AREA)
+        test_small = cv2.resize(test_gray, small_size, interpolation=cv2.INTER_AREA)
+        _, coarse_map = ssim(ref_small, test_small, full=True)
+        
+        cell = max(self.screen_tile_size // scale, 1)
+        grid_h, grid_w = -(-small_size[1] // cell), -(-small_size[0] // cell)
+        padded = np.ones((grid_h * cell, grid_w * cell), np.float32)
+        padded[:small_size[1], :small_size[0]] = coarse_map
+        
+        inspected = None
+        if mask is not None:
+            # Pixels outside the mask never make a tile suspect
+            mask_small = cv2.resize(mask, small_size, interpolation=cv2.INTER_AREA) > 0
+            padded[:small_size[1], :small_size[0]][~mask_small] = 1.0
+            covered = np.zeros(padded.shape, bool)
+            covered[:small_size[1], :small_size[0]] = mask_small
+            inspected = covered.reshape(grid_h, cell, grid_w, cell).any(axis=(1, 3))
+        tile_min = padded.reshape(grid_h, cell, grid_w, cell).min(axis=(1, 3))
+        
+        # Neighbouring tiles are included so defects on tile borders are seen whole
+        suspect = (tile_min < threshold).astype(np.uint8)
+        suspect = cv2.dilate(suspect, np.ones((3, 3), np.uint8))
+        if inspected is not None:
+            suspect[~inspected] = 0
+        
+        # Pass 2: full resolution over each group of adjacent suspect tiles
+        ssim_image = cv2.resize(coarse_map, (w, h), interpolation=cv2.INTER_LINEAR)
+        diff_pixels = 0
+        regions_of_interest = []
+        pixels_processed = small_size[0] * small_size[1]
+        # Pixels whose full-resolution SSIM is known: suspect tiles (1) and samples (2)
+        exact = np.zeros((h, w), np.uint8)
+        
+        count, _, stats, _ = cv2.connectedComponentsWithStats(suspect, connectivity=8)
+        tile_px = cell * scale
+        for gx, gy, gw, gh, _ in stats[1:count].tolist():
+            x0, y0 = gx * tile_px, gy * tile_px
+            x1, y1 = min((gx + gw) * tile_px, w), min((gy + gh) * tile_px, h)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            
+            region_map = region_ssim_map(ref_gray, test_gray, (x0, y0, x1 - x0, y1 - y0))
+            ssim_image[y0:y1, x0:x1] = region_map
+            exact[y0:y1, x0:x1] = 1
+            pixels_processed += (x1 - x0) * (y1 - y0)
+            
+            diff_mask = (region_map < threshold).astype(np.uint8) * 255
+            if mask is not None:
+                cv2.bitwise_and(diff_mask, mask[y0:y1, x0:x1], dst=diff_mask)
+            diff_pixels += int(np.count_nonzero(diff_mask))
+            regions_of_interest.extend(self._extract_regions(diff_mask, offset=(x0, y0)))
+        
+        for i, region in enumerate(regions_of_interest):
+            region["id"] = i
+        
+        # Sample of the tiles that passed screening, for their full-resolution score
+        step = max(self.screen_sample_step, 1)
+        sampled = np.zeros((grid_h, grid_w), bool)
+        sampled[::step, ::step] = True
+        sampled &= suspect == 0
+        if inspected is not None:
+            sampled &= inspected
+        for ty, tx in zip(*np.nonzero(sampled)):
+            x0, y0 = int(tx) * tile_px, int(ty) * tile_px
+            x1, y1 = min(x0 + tile_px, w), min(y0 + tile_px, h)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            ssim_image[y0:y1, x0:x1] = region_ssim_map(ref_gray, test_gray, (x0, y0, x1 - x0, y1 - y0))
+            exact[y0:y1, x0:x1] = 2
+            pixels_processed += (x1 - x0) * (y1 - y0)
+        
+        if mask is not None:
+            scored = mask > 0
+            total_pixels = cv2.countNonZero(mask)
+        else:
+            # Mean over the map excluding the border, as structural_similarity does
+            pad = 3
+            scored = np.zeros((h, w), bool)
+            scored[pad:h - pad, pad:w - pad] = True
+            total_pixels = h * w
+        similarity_score = self._screened_score(ssim_image, exact, scored)
+        
+        return self._comparison_result(similarity_score, diff_pixels, total_pixels,
+                                       regions_of_interest, threshold, pixels_processed, "screened",
+                                       ssim_image)
+    
+    @staticmethod
+    def _screened_score(ssim_image: np.ndarray, exact: np.ndarray, scored: np.ndarray) -> float:
+        """
+        Full-resolution mean SSIM of the scored pixels of a screened comparison.
+        
+        Pixels not compared at full resolution are counted at the mean of the sampled
+        ones (exact == 2); without samples their coarse values are used.
+        """
+        known = (exact > 0) & scored
+        samples = (exact == 2) & scored
+        unknown = int(np.count_nonzero(scored)) - int(np.count_nonzero(known))
+        if unknown == 0 or not samples.any():
+            return float(ssim_image[scored].mean(dtype=np.float64))
+        
+        known_sum = float(ssim_image[known].sum(dtype=np.float64))
+        sample_mean = float(ssim_image[samples].mean(dtype=np.float64))
+        return (known_sum + sample_mean * unknown) / (np.count_nonzero(known) + unknown)
+    
+    @staticmethod
+    def _fit_mask(mask: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+        """Inspection mask as uint8 (0/255) of the given image shape."""
+        if mask.ndim == 3:
+            mask = mask[:, :, 0]
+        if mask.dtype != np.uint8:
+            mask = (mask > 0).astype(np.uint8) * 255
+        if mask.shape != shape:
+            mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+        return mask
+    
+    @staticmethod
+    def _mask_bounds(mask: np.ndarray, margin: int = 0) -> Tuple[int, int, int, int]:
+        """(x0, y0, x1, y1) bounding box of a mask's non-zero pixels, grown by a margin."""
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            raise ValueError("Inspection mask is empty")
+        return (max(x - margin, 0), max(y - margin, 0),
+                min(x + w + margin, mask.shape[1]), min(y + h + margin, mask.shape[0]))
+    
+    @staticmethod
+    def _place_result(result: Dict[str, Any],
+                      origin: Tuple[int, int],
+                      full_shape: Tuple[int, int]) -> Dict[str, Any]:
+        """Move a comparison of a cropped area back into full image coordinates."""
+        ox, oy = origin
+        if result.get("ssim_map") is not None and result["ssim_map"].shape != full_shape:
+            # Uninspected pixels read as identical
+            ssim_map = np.ones(full_shape, np.float32)
+            h, w = result["ssim_map"].shape
+            ssim_map[oy:oy + h, ox:ox + w] = result["ssim_map"]
+            result["ssim_map"] = ssim_map
+        if ox or oy:
+            for region in result["regions_of_interest"]:
+                region["bbox"][0] += ox
+                region["bbox"][1] += oy
+                region["center"][0] += ox
+                region["center"][1] += oy
+        return result
+    
+    def _extract_regions(self,
+                         diff_mask: np.ndarray,
+                         offset: Tuple[int, int] = (0, 0)) -> List[Dict]:
+        """
+        Bounding regions of significant differences in a binary mask.
+        
+        Args:
+            diff_mask: uint8 mask, non-zero where images differ
+            offset: (x, y) added to region coordinates when the mask is a crop
+            
+        Returns:
+            List of regions with id, bbox, area (pixels) and center
+        """
+        if self.region_merge_kernel > 1:
+            # Closing joins fragments of one defect into a single component
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE,
+                                               (self.region_merge_kernel, self.region_merge_kernel))
+            diff_mask = cv2.morphologyEx(diff_mask, cv2.MORPH_CLOSE, kernel)
+        
+        # Label 0 is the background
+        _, _, stats, _ = cv2.connectedComponentsWithStats(diff_mask, connectivity=8)
+        stats = stats[1:]
+        
+        # Filter components by area (remove noise)
+        stats = stats[stats[:, cv2.CC_STAT_AREA] > self.min_region_area]
+        
+        if self.region_nms_iou is not None and len(stats) > 1:
+            stats = stats[self._suppress_overlaps(stats, self.region_nms_iou)]
+        
+        # Create regions of interest for detailed analysis
+        regions_of_interest = []
+        for i, (x, y, w, h, area) in enumerate(stats.tolist()):
+            x, y = x + offset[0], y + offset[1]
+            region = {
+                "id": i,
+                "bbox": [x, y, w, h],
+                "area": area,
+                "center": [x + w//2, y + h//2]
+            }
+            regions_of_interest.append(region)
+        
+        return regions_of_interest
+    
+    @staticmethod
+    def _suppress_overlaps(stats: np.ndarray, iou_threshold: float) -> np.ndarray:
+        """Indices (in input order) of the regions kept by non-maximum suppression on area."""
+        x0 = stats[:, cv2.CC_STAT_LEFT].astype(np.float64)
+        y0 = stats[:, cv2.CC_STAT_TOP].astype(np.float64)
+        x1 = x0 + stats[:, cv2.CC_STAT_WIDTH]
+        y1 = y0 + stats[:, cv2.CC_STAT_HEIGHT]
+        box_area = (x1 - x0) * (y1 - y0)
+        
+        order = np.argsort(-stats[:, cv2.CC_STAT_AREA], kind="stable")
+        keep = []
+        while order.size:
+            i, rest = order[0], order[1:]
+            keep.append(i)
+            iw = np.clip(np.minimum(x1[i], x1[rest]) - np.maximum(x0[i], x0[rest]), 0, None)
+            ih = np.clip(np.minimum(y1[i], y1[rest]) - np.maximum(y0[i], y0[rest]), 0, None)
+            inter = iw * ih
+            iou = inter / (box_area[i] + box_area[rest] - inter)
+            order = rest[iou <= iou_threshold]
+        
+        return np.sort(keep)
+    
+    @staticmethod
+    def _comparison_result(similarity_score: float,
+                           diff_pixels: int,
+                           total_pixels: int,
+                           regions_of_interest: List[Dict],
+                           threshold: float,
+                           pixels_processed: int,
+                           mode: str,
+                           ssim_map: Optional[np.ndarray]) -> Dict[str, Any]:
+        """Assemble the compare_images result dictionary."""
+        diff_percentage = (diff_pixels / total_pixels) * 100
+        return {
+            "similarity_score": float(similarity_score),
+            "difference_percentage": float(diff_percentage),
+            "regions_of_interest": regions_of_interest,
+            "total_regions": len(regions_of_interest),
+            "threshold": threshold,
+            "passed": similarity_score >= threshold,
+            "comparison_mode": mode,
+            "pixels_processed": int(pixels_processed),
+            # Per-pixel SSIM, reused by analyze_defects for region similarity
+            "ssim_map": ssim_map
+        }
+    
+    def _full_frame_ssim(self, ref_gray: np.ndarray, test_gray: np.ndarray) -> Tuple[float, np.ndarray]:
+        """SSIM score and map of a full frame, tiled across the thread pool when enabled."""
+        if self._ssim_executor is None:
+            return ssim(ref_gray, test_gray, full=True)
+        return structural_similarity_tiled(ref_gray, test_gray, full=True,
+                                           tile_size=self.ssim_tile_size,
+                                           executor=self._ssim_executor)
+    
     def detect_components(self, image: np.ndarray) -> List[Dict]:
         """
         Detect potential PCB components in the image.
@@ -221,6 +1353,11 @@ class PCBInspector:
         try:
             defects = []
             
+            # Region similarity is read from the comparison's SSIM map when it covers the image
+            ssim_map = comparison_result.get("ssim_map")
+            if ssim_map is not None and ssim_map.shape != reference_img.shape[:2]:
+                ssim_map = None
+            
             # Analyze each region of interest
             for region in comparison_result.get("regions_of_interest", []):
                 x, y, w, h = region["bbox"]
@@ -230,7 +1367,10 @@ class PCBInspector:
                 test_region = test_img[y:y+h, x:x+w]
                 
                 # Analyze the region
-                defect_info = self._analyze_region(ref_region, test_region, region)
+                similarity = None
+                if ssim_map is not None:
+                    similarity = float(ssim_map[y:y+h, x:x+w].mean(dtype=np.float64))
+                defect_info = self._analyze_region(ref_region, test_region, region, similarity)
                 if defect_info:
                     defects.append(defect_info)
             
@@ -247,15 +1387,16 @@ class PCBInspector:
     def _analyze_region(self, 
                        ref_region: np.ndarray, 
                        test_region: np.ndarray,
-                       region_info: Dict) -> Optional[Dict]:
-        """Analyze a specific region for defects."""
+                       region_info: Dict,
+                       similarity: Optional[float] = None) -> Optional[Dict]:
+        """Analyze a specific region for defects (similarity is computed unless supplied)."""
         try:
             # Calculate region similarity
-            ref_gray = cv2.cvtColor(ref_region, cv2.COLOR_BGR2GRAY)
-            test_gray = cv2.cvtColor(test_region, cv2.COLOR_BGR2GRAY)
-            
-            from skimage.metrics import structural_similarity as ssim
-            similarity, _ = ssim(ref_gray, test_gray, full=True)
+            if similarity is None:
+                ref_gray = cv2.cvtColor(ref_region, cv2.COLOR_BGR2GRAY)
+                test_gray = cv2.cvtColor(test_region, cv2.COLOR_BGR2GRAY)
+                
+                similarity = ssim(ref_gray, test_gray)
             
             # Determine defect type based on similarity and region characteristics
             defect_type = "unknown"
@@ -30,14 +30,20 @@ from PySide6.QtGui import QPixmap, QImage, QPainter, QPen, QColor, QAction
 from camera import CameraManager
 from qa_manager import QAManager
 from inspector import PCBInspector
+from board_verifier import BoardVerifier
+from image_cache import shared_image_cache
 from openai_api import OpenAIAnalyzer
 import json
 from pathlib import Path
 import time
+import threading
 import logging
 
 CONFIG_PATH = Path.home() / ".pcb_inspector_config.json"
 
+# Number of board-index candidates verified by full alignment during identification
+IDENTIFICATION_CANDIDATES = 5
+
 def load_api_key():
     if CONFIG_PATH.exists():
         try:
@@ -85,16 +91,36 @@ class InspectionWorker(QThread):
             
             # Load images for OpenCV analysis
             current_img = cv2.imread(self.current_image_path)
-            reference_img = cv2.imread(front_path)  # Assume front for now
+            reference_img = shared_image_cache.get(front_path)  # Assume front for now
             
             if current_img is None or reference_img is None:
                 self.inspection_error.emit("Failed to load images for analysis")
                 return
             
-            # Perform OpenCV alignment and comparison
-            aligned_img, alignment_info = self.inspector.align_images(reference_img, current_img)
-            comparison_result = self.inspector.compare_images(reference_img, aligned_img)
+            # Perform OpenCV alignment and comparison (fiducials, when recorded, are fastest);
+            # the compiled pyramid saves re-deriving the grayscale reference levels
+            fiducials = sample.get("fiducials", {}).get("front", [])
+            feature_backend = sample.get("feature_backends", {}).get("front")
+            if feature_backend:
+                self.inspector.set_board_backend(front_path, feature_backend)
+            compiled = self.qa_manager.load_compiled_assets(self.qa_sample_id, "front")
+            aligned_img, alignment_info = self.inspector.align_images(
+                reference_img, current_img, reference_path=front_path,
+                mode="fiducial" if fiducials else None, fiducials=fiducials,
+                reference_pyramid=compiled["pyramid"] if compiled else None
+            )
+            # A golden-set model, when one has been built, replaces the single-image SSIM;
+            # either comparison is limited to the sample's inspection zones
+            inspection_mask = self.qa_manager.get_inspection_mask(self.qa_sample_id, "front")
+            reference_model = self.qa_manager.load_reference_model(self.qa_sample_id, "front")
+            if reference_model is not None:
+                comparison_result = self.inspector.compare_with_model(reference_model, aligned_img,
+                                                                      mask=inspection_mask)
+            else:
+                comparison_result = self.inspector.compare_images(reference_img, aligned_img,
+                                                                  mask=inspection_mask)
             defect_analysis = self.inspector.analyze_defects(reference_img, aligned_img, comparison_result)
+            comparison_result.pop("ssim_map", None)  # Full-frame array, not needed in the report
             
             self.progress_updated.emit("Performing AI analysis...")
             
@@ -108,7 +134,9 @@ class InspectionWorker(QThread):
                 "opencv_analysis": {
                     "alignment": alignment_info,
                     "comparison": comparison_result,
-                    "defects": defect_analysis
+                    "defects": defect_analysis,
+                    "alignment_cache": self.inspector.get_alignment_cache_stats(),
+                    "image_cache": shared_image_cache.get_stats()
                 },
                 "ai_analysis": ai_result,
                 "timestamp": datetime.now().isoformat(),
@@ -121,6 +149,56 @@ class InspectionWorker(QThread):
         except Exception as e:
             self.inspection_error.emit(f"Inspection failed: {str(e)}")
 
+class IdentificationWorker(QThread):
+    """Background worker that identifies which known board is in a captured frame."""
+    
+    progress_updated = Signal(str)
+    identification_complete = Signal(dict)
+    identification_error = Signal(str)
+    
+    def __init__(self, inspection_frame, board_info, qa_manager, verifier, rectifier):
+        super().__init__()
+        self.inspection_frame = inspection_frame
+        self.board_info = board_info
+        self.qa_manager = qa_manager
+        self.verifier = verifier
+        self.rectifier = rectifier
+        self.cancel_event = threading.Event()
+    
+    def run(self):
+        """Shortlist candidates from the board index, then verify them in parallel."""
+        try:
+            self.progress_updated.emit("Identifying board...")
+            
+            candidates = []
+            bbox = self.board_info["bbox"] if self.board_info else None
+            quad = CameraManager.get_board_quad(self.board_info) if self.board_info else None
+            for candidate in self.qa_manager.identify_board_candidates(
+                    self.inspection_frame, k=IDENTIFICATION_CANDIDATES, bbox=bbox, quad=quad):
+                sample = self.qa_manager.get_qa_sample(candidate["sample_id"])
+                if not sample:
+                    continue
+                candidate = dict(candidate, reference_path=sample["image_paths"]["front"],
+                                 feature_backend=sample.get("feature_backends", {}).get("front"))
+                
+                # Rectified references are compared with the board rectified to the same size
+                if sample.get("canonical_size") and self.board_info:
+                    rectified = self.rectifier(self.inspection_frame, self.board_info, tuple(sample["canonical_size"]))
+                    if rectified is not None:
+                        candidate["test_image"] = rectified[0]
+                candidates.append(candidate)
+            
+            self.progress_updated.emit(f"Verifying {len(candidates)} candidate board(s)...")
+            result = self.verifier.verify(self.inspection_frame, candidates, cancel_event=self.cancel_event)
+            self.identification_complete.emit(result)
+            
+        except Exception as e:
+            self.identification_error.emit(f"Board identification failed: {str(e)}")
+    
+    def cancel(self):
+        """Ask the worker to stop verifying further candidates."""
+        self.cancel_event.set()
+
 class MainWindow(QMainWindow):
     """
     Main application window for the PCB Inspector.
@@ -144,7 +222,22 @@ class MainWindow(QMainWindow):
         # Initialize core system components
         self.camera = CameraManager()          # Handles webcam capture
         self.qa_manager = QAManager()          # Manages QA sample database
-        self.inspector = PCBInspector()        # Performs image analysis
+        self.inspector = PCBInspector(matching_mode="flann",  # Performs image analysis
+                                      alignment_mode="phase",
+                                      reuse_alignment=True,
+                                      ssim_workers=None)
+        
+        # Verifies board-identification candidates in parallel, one inspector per
+        # worker thread sharing the main inspector's feature and alignment caches
+        self.board_verifier = BoardVerifier(
+            inspector_factory=lambda: PCBInspector(feature_store=self.inspector.feature_store,
+                                                   matching_mode="flann",
+                                                   alignment_mode="phase",
+                                                   reuse_alignment=True,
+                                                   alignment_cache=self.inspector.alignment_cache),
+            min_similarity=0.85,  # 85% similarity threshold
+            confidence_margin=0.1
+        )
         
         # Get API key from environment and initialize AI analyzer
         api_key = load_api_key()
@@ -158,12 +251,18 @@ class MainWindow(QMainWindow):
         self.ai_analyzer = OpenAIAnalyzer(api_key=api_key)    # AI-powered analysis
         
         self.camera_connected = self.camera.connect()  # Connect to webcam
+        if self.camera_connected:
+            # Frames are read on a background thread, so the preview never blocks on the camera
+            self.camera.start_capture()
+        self.preview_sequence = 0              # Sequence number of the frame last previewed
         
         # Track current board state
         self.current_board_name = ""           # Name of currently selected board
         self.front_captured = False            # Whether front image is captured
         self.back_captured = False             # Whether back image is captured
+        self.canonical_size = None             # Rectified (width, height) of the captured front
         self.inspection_worker = None          # Background inspection worker
+        self.identification_worker = None      # Background board identification worker
         
         # Setup the user interface
         self.setup_ui()
@@ -711,7 +810,8 @@ class MainWindow(QMainWindow):
     
     def load_existing_boards(self):
         """Load all existing boards from the QA database into the dropdown."""
-        samples = self.qa_manager.list_qa_samples()
+        # One entry per board: its active reference version
+        samples = self.qa_manager.find_samples(status="active")
         self.board_combo.clear()
         self.board_combo.addItem("-- Select a board --")
         
@@ -789,18 +889,29 @@ class MainWindow(QMainWindow):
     def update_camera(self):
         """Update the camera preview with the latest frame from webcam."""
         if self.camera_connected:
-            frame = self.camera.get_frame()
+            # Nothing to do until the capture thread has a new frame
+            sequence = self.camera.frame_sequence
+            if self.camera.is_capturing and sequence == self.preview_sequence:
+                return
+            self.preview_sequence = sequence
+            
+            raw = self.camera.get_latest_frame() if self.camera.is_capturing else None
+            frame = self.camera.get_zoom_view(raw[0])[0] if raw is not None else self.camera.get_frame()
             if frame is not None:
                 # Update zoom display
                 self.update_zoom_display()
                 
                 # Detect board in frame (optional visualization)
                 board_info = self.camera.detect_board(frame)
-                display_frame = frame.copy()
+                
+                # Resample the zoomed view straight to the preview size; the overlay is drawn on that
+                label_size = self.camera_label.size()
+                display_frame = self.camera.render_preview(frame, (label_size.width(), label_size.height()))
+                scale = display_frame.shape[1] / frame.shape[1]
                 
                 # Draw board detection overlay if board is detected
                 if board_info:
-                    x, y, w, h = board_info["bbox"]
+                    x, y, w, h = (int(v * scale) for v in board_info["bbox"])
                     confidence = board_info["confidence"]
                     
                     # Draw bounding box
@@ -819,11 +930,7 @@ class MainWindow(QMainWindow):
                 height, width, channel = display_frame.shape
                 bytes_per_line = 3 * width
                 q_image = QImage(display_frame.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-                pixmap = QPixmap.fromImage(q_image)
-                
-                # Scale image to fit preview area while maintaining aspect ratio
-                scaled_pixmap = pixmap.scaled(self.camera_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.camera_label.setPixmap(scaled_pixmap)
+                self.camera_label.setPixmap(QPixmap.fromImage(q_image))
     
     def capture_front(self):
         """Capture front image of the current board with auto-zoom and focus."""
@@ -856,6 +963,8 @@ class MainWindow(QMainWindow):
                 # Capture enhanced image using camera manager
                 frame = self.camera.capture_snapshot("temp_front.jpg")
                 if frame is not None:
+                    # The front crop's size becomes the board's canonical size
+                    self.canonical_size = self._save_rectified(frame, "temp_front.jpg")
                     self.front_captured = True
                     self.update_status()
                     
@@ -911,6 +1020,8 @@ class MainWindow(QMainWindow):
                 # Capture enhanced image using camera manager
                 frame = self.camera.capture_snapshot("temp_back.jpg")
                 if frame is not None:
+                    if self.canonical_size:
+                        self._save_rectified(frame, "temp_back.jpg", output_size=self.canonical_size)
                     self.back_captured = True
                     self.update_status()
                     
@@ -948,8 +1059,12 @@ class MainWindow(QMainWindow):
                     board_name=self.current_board_name,
                     front_image_path="temp_front.jpg",
                     back_image_path="temp_back.jpg",
-                    notes=f"QA sample created for {self.current_board_name}"
+                    notes=f"QA sample created for {self.current_board_name}",
+                    canonical_size=self.canonical_size,
+                    background_compile=True
                 )
+                # Benchmark the feature backends for the new reference once it is compiled
+                self.qa_manager.select_feature_backend_async(sample_id)
                 
                 # Update the board dropdown to include the new sample
                 self.load_existing_boards()
@@ -1006,57 +1121,72 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Capture Failed", "Failed to capture optimized board image for inspection.")
             return
         
-        # Step 6: Try to identify the board type
-        board_name = self._identify_board_type(inspection_frame)
+        # Step 6: Identify the board type in the background (the GUI stays responsive)
+        inspection_board = self.camera.detect_board(inspection_frame)
+        self._identify_board_type(inspection_frame, inspection_board)
+    
+    def _identify_board_type(self, inspection_frame, board_info=None):
+        """Start identifying the board type using computer vision and existing samples."""
+        self.inspect_btn.setEnabled(False)
+        self.inspect_btn.setText("Identifying...")
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)  # Indeterminate progress
         
+        self.identification_worker = IdentificationWorker(
+            inspection_frame,
+            board_info,
+            self.qa_manager,
+            self.board_verifier,
+            self.camera.rectify_board
+        )
+        self.identification_worker.progress_updated.connect(self.update_inspection_progress)
+        self.identification_worker.identification_complete.connect(self.handle_identification_complete)
+        self.identification_worker.identification_error.connect(self.handle_inspection_error)
+        self.identification_worker.start()
+    
+    def handle_identification_complete(self, result):
+        """Continue the inspection workflow once the board type is known (or not)."""
+        self.progress_bar.setVisible(False)
+        self.inspect_btn.setEnabled(True)
+        self.inspect_btn.setText("Inspect Board")
+        
+        board_name = result.get("board_name")
         if board_name:
             # Board is recognized - proceed with inspection
+            self.logger.info(f"Identified board {board_name} (similarity {result['similarity']:.3f}, "
+                             f"{result['verified']} candidate(s) verified)")
+            
+            # Inspect the board crop at the reference's canonical size when it has one
+            sample = self.qa_manager.get_qa_sample(result["sample_id"])
+            if sample and sample.get("canonical_size"):
+                self._save_rectified(self.identification_worker.inspection_frame,
+                                     "current_inspection.jpg",
+                                     self.identification_worker.board_info,
+                                     tuple(sample["canonical_size"]))
             self._perform_inspection(board_name, "current_inspection.jpg")
         else:
             # Board is unknown - prompt for QC sample creation
-            self._prompt_for_qc_sample_creation(inspection_frame)
+            self._prompt_for_qc_sample_creation(self.identification_worker.inspection_frame,
+                                                self.identification_worker.board_info)
     
-    def _identify_board_type(self, inspection_frame):
-        """Try to identify the board type using computer vision and existing samples."""
-        try:
-            # Get all existing QA samples
-            samples = self.qa_manager.list_qa_samples()
-            
-            best_match = None
-            best_score = 0.0
-            
-            for sample in samples:
-                # Load the reference image
-                ref_path = sample["image_paths"]["front"]
-                ref_img = cv2.imread(ref_path)
-                
-                if ref_img is not None:
-                    # Align and compare images
-                    aligned_img, alignment_info = self.inspector.align_images(ref_img, inspection_frame)
-                    if alignment_info.get("success", False):
-                        comparison_result = self.inspector.compare_images(ref_img, aligned_img)
-                        similarity = comparison_result.get("similarity_score", 0.0)
-                        
-                        if similarity > best_score and similarity > 0.85:  # 85% similarity threshold
-                            best_score = similarity
-                            best_match = sample["board_name"]
-            
-            return best_match
-            
-        except Exception as e:
-            self.logger.error(f"Error identifying board type: {e}")
+    def _save_rectified(self, frame, path, board_info=None, output_size=None):
+        """
+        Replace a captured image with its rectified board crop.
+        
+        Returns:
+            (width, height) of the saved crop, or None if no board was found
+            (the image is then left as captured)
+        """
+        rectified = self.camera.rectify_board(frame, board_info, output_size)
+        if rectified is None:
             return None
+        cv2.imwrite(path, rectified[0])
+        return rectified[0].shape[1], rectified[0].shape[0]
     
     def _perform_inspection(self, board_name, image_path):
         """Perform inspection for a known board."""
-        # Find the QA sample for this board
-        samples = self.qa_manager.list_qa_samples()
-        sample_id = None
-        
-        for sample in samples:
-            if sample["board_name"] == board_name:
-                sample_id = sample["sample_id"]
-                break
+        # Find the active QA sample version for this board
+        sample_id = self.qa_manager.get_active_sample(board_name)
         
         if not sample_id:
             QMessageBox.warning(self, "QA Sample Not Found", 
@@ -1103,10 +1233,11 @@ class MainWindow(QMainWindow):
         # Start the inspection
         self.inspection_worker.start()
     
-    def _prompt_for_qc_sample_creation(self, inspection_frame):
+    def _prompt_for_qc_sample_creation(self, inspection_frame, board_info=None):
         """Prompt user to create a QC sample for the unknown board."""
-        # Save the current frame for QC sample creation
+        # Save the current frame (rectified to the board crop, when found) for QC sample creation
         cv2.imwrite("temp_front.jpg", inspection_frame)
+        self.canonical_size = self._save_rectified(inspection_frame, "temp_front.jpg", board_info)
         
         # Ask user if they want to create a QC sample
         reply = QMessageBox.question(
@@ -1331,6 +1462,7 @@ DETAILED DEFECTS:
     def closeEvent(self, event):
         """Handle application shutdown - clean up camera connection."""
         if self.camera_connected:
+            self.logger.info(f"Camera capture stats: {self.camera.get_capture_stats()}")
             self.camera.disconnect()
         
         # Stop any running inspection
@@ -1338,6 +1470,12 @@ DETAILED DEFECTS:
             self.inspection_worker.terminate()
             self.inspection_worker.wait()
         
+        # Let a running identification finish its current candidates, then stop the pool
+        if self.identification_worker and self.identification_worker.isRunning():
+            self.identification_worker.cancel()
+            self.identification_worker.wait()
+        self.board_verifier.shutdown()
+        
         event.accept()
 
     def prompt_api_key(self):
@@ -1,34 +1,166 @@
 import os
 import json
 import shutil
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 import logging
 from pathlib import Path
 
+from blob_store import BlobStore
+from board_index import BoardIndex
+from sample_catalog import SampleCatalog
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers (SOF0-SOF15 except DHT, JPG and DAC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Cameras and editors may append data after the JPEG end-of-image marker; this much
+# of the file's tail is searched for it
+JPEG_TRAILER_SCAN = 4096
+
+
+def image_format(head: bytes) -> Optional[str]:
+    """Format name ("jpeg" or "png") from a file's first bytes, None if neither."""
+    if head[:8] == PNG_SIGNATURE:
+        return "png"
+    if head[:2] == b"\xff\xd8":
+        return "jpeg"
+    return None
+
+
+def read_image_header(path: str) -> Tuple[str, int, int]:
+    """
+    Read the format and dimensions of a JPEG or PNG file without decoding it.
+    
+    Also checks that the file ends with the format's end marker (for JPEG, within
+    its last JPEG_TRAILER_SCAN bytes), which catches truncated copies.
+    
+    Args:
+        path: Image file path
+        
+    Returns:
+        Tuple of (format, width, height)
+        
+    Raises:
+        ValueError: If the file is not a complete JPEG/PNG
+    """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+        fmt = image_format(head)
+        
+        if fmt == "png":
+            length, chunk_type = struct.unpack(">I4s", f.read(8))
+            if chunk_type != b"IHDR" or length != 13:
+                raise ValueError("PNG is missing its IHDR chunk")
+            width, height = struct.unpack(">II", f.read(8))
+            f.seek(-12, os.SEEK_END)
+            if f.read(12)[4:8] != b"IEND":
+                raise ValueError("PNG is truncated")
+        
+        elif fmt == "jpeg":
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    raise ValueError("JPEG has no frame header")
+                if marker[1] == 0xFF:
+                    # Fill byte before a marker
+                    f.seek(-1, os.SEEK_CUR)
+                    continue
+                segment_length = struct.unpack(">H", f.read(2))[0]
+                if marker[1] in JPEG_SOF_MARKERS:
+                    _, height, width = struct.unpack(">BHH", f.read(5))
+                    break
+                f.seek(segment_length - 2, os.SEEK_CUR)
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - JPEG_TRAILER_SCAN, 0))
+            if f.read().rfind(b"\xff\xd9") < 0:
+                raise ValueError("JPEG is truncated")
+        
+        else:
+            raise ValueError("Not a JPEG or PNG file")
+    
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid image size {width}x{height}")
+    return fmt, width, height
+
+
 class QAManager:
     """Manages QA sample creation, storage, and retrieval for PCB inspection."""
     
-    def __init__(self, qa_samples_dir: str = "qa_samples"):
+    def __init__(self, qa_samples_dir: str = "qa_samples", compiler=None, image_cache=None):
         self.qa_samples_dir = Path(qa_samples_dir)
         self.qa_samples_dir.mkdir(exist_ok=True)
         self.logger = logging.getLogger(__name__)
         
+        # Builds derived reference assets (see sample_compiler.py); created on first use.
+        # Compiles are serialised; background work (compiles, backend selection) runs
+        # on a single worker thread.
+        self._compiler = compiler
+        self._compile_lock = threading.Lock()
+        self._background_executor: Optional[ThreadPoolExecutor] = None
+        
+        # Decoded image cache (image_cache.shared_image_cache unless one is given)
+        self._image_cache = image_cache
+        
+        # Indexed copy of every sample's metadata; built from the directories the first time
+        catalog_path = self.qa_samples_dir / "catalog.sqlite"
+        is_new_catalog = not catalog_path.exists()
+        self.catalog = SampleCatalog(catalog_path)
+        
+        # Sample images are stored once per distinct content and hardlinked into samples
+        self.blobs = BlobStore(self.qa_samples_dir / "blobs", catalog_path)
+        
+        # Board registry: board name -> sample_id of its active reference version
+        self._active_samples: Dict[str, str] = {}
+        if is_new_catalog or self.catalog.needs_rebuild:
+            # Samples from before the board registry are versioned once, when the
+            # catalog is (re)built; later openings read the catalog as it is
+            self.migrate_board_versions()
+            self.rebuild_catalog()
+        else:
+            self._active_samples = self.catalog.active_samples()
+        
+        # Decoded inspection masks keyed by path, with the file mtime they were read at
+        self._mask_cache: Dict[str, Tuple[int, object]] = {}
+        
+        # Loaded reference models keyed the same way; the float32 working copies that
+        # PCBInspector.compare_with_model derives are kept on the cached dictionary
+        self._model_cache: Dict[str, Tuple[int, Dict]] = {}
+        
+        # Global signatures of the active references, for ranking boards before alignment
+        self.board_index = BoardIndex(self.qa_samples_dir / "board_index.npz")
+        
     def create_qa_sample(self, 
                         board_name: str,
                         front_image_path: str,
                         back_image_path: str,
                         notes: str = "",
-                        tags: List[str] = None) -> str:
+                        tags: List[str] = None,
+                        activate: bool = True,
+                        canonical_size: Optional[Tuple[int, int]] = None,
+                        background_compile: bool = False) -> str:
         """
         Create a new QA sample with front and back images.
         
+        The sample is registered as the next version of its board.
+        
         Args:
             board_name: Name/identifier for the PCB
             front_image_path: Path to the front image
             back_image_path: Path to the back image
             notes: Additional notes about the board
             tags: List of tags for categorization
+            activate: Make this version the board's active reference (a board without
+                an active version always gets one)
+            canonical_size: (width, height) the images were rectified to, if they are
+                board crops from CameraManager.rectify_board; inspections of this board
+                are rectified to the same size
+            background_compile: Compile the derived assets on a worker thread instead
+                of before returning (e.g. when called from the GUI thread)
             
         Returns:
             Sample ID of the created QA sample
@@ -42,12 +174,16 @@ class QAManager:
             sample_dir = self.qa_samples_dir / sample_id
             sample_dir.mkdir(exist_ok=True)
             
-            # Copy images to sample directory
+            # Link images into the sample directory from the content-addressed store
             front_dest = sample_dir / "front.jpg"
             back_dest = sample_dir / "back.jpg"
             
-            shutil.copy2(front_image_path, front_dest)
-            shutil.copy2(back_image_path, back_dest)
+            image_hashes = {
+                "front": self.blobs.add(front_image_path),
+                "back": self.blobs.add(back_image_path)
+            }
+            self.blobs.link(image_hashes["front"], front_dest)
+            self.blobs.link(image_hashes["back"], back_dest)
             
             # Create metadata
             metadata = {
@@ -60,13 +196,24 @@ class QAManager:
                     "front": str(front_dest),
                     "back": str(back_dest)
                 },
-                "version": "1.0"
+                "image_hashes": image_hashes,
+                "version": "1.0",
+                "board_version": self.catalog.next_board_version(board_name),
+                "board_status": "inactive"
             }
+            if canonical_size is not None:
+                metadata["canonical_size"] = [int(canonical_size[0]), int(canonical_size[1])]
             
             # Save metadata
-            metadata_path = sample_dir / "metadata.json"
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            self._save_metadata(metadata)
+            if activate or board_name not in self._active_samples:
+                self.promote_sample(sample_id)
+            
+            # Precompute derived assets now rather than on the first inspection
+            if background_compile:
+                self.compile_sample_async(sample_id)
+            else:
+                self.compile_sample(sample_id)
             
             self.logger.info(f"Created QA sample: {sample_id}")
             return sample_id
@@ -117,24 +264,140 @@ class QAManager:
         Returns:
             List of sample metadata dictionaries
         """
+        return self.find_samples()
+    
+    def find_samples(self,
+                     board_name: Optional[str] = None,
+                     tag: Optional[str] = None,
+                     created_after: Optional[Union[str, datetime]] = None,
+                     created_before: Optional[Union[str, datetime]] = None,
+                     status: Optional[str] = None,
+                     limit: Optional[int] = None) -> List[Dict]:
+        """
+        Look up QA samples in the catalog, newest first.
+        
+        Args:
+            board_name: Exact board name (optional)
+            tag: Tag the sample must carry (optional)
+            created_after: Only samples created at or after this time (optional)
+            created_before: Only samples created before this time (optional)
+            status: Board version status - "active", "inactive" or "retired" (optional)
+            limit: Maximum number of samples (optional)
+            
+        Returns:
+            List of sample metadata dictionaries
+        """
+        try:
+            return self.catalog.find(board_name=board_name, tag=tag, created_after=created_after,
+                                     created_before=created_before, status=status, limit=limit)
+        except Exception as e:
+            self.logger.error(f"Failed to query QA samples: {e}")
+            return []
+    
+    def rebuild_catalog(self) -> int:
+        """
+        Re-index every sample directory (for samples added or edited outside QAManager).
+        
+        Returns:
+            Number of samples indexed
+        """
+        try:
+            samples = self._read_all_metadata()
+            count = self.catalog.rebuild(samples)
+            
+            references: Dict[str, int] = {}
+            for metadata in samples:
+                for content_hash in metadata.get("image_hashes", {}).values():
+                    references[content_hash] = references.get(content_hash, 0) + 1
+            self.blobs.reset_refcounts(references)
+            self._active_samples = self.catalog.active_samples()
+            self.logger.info(f"Indexed {count} QA samples")
+            return count
+            
+        except Exception as e:
+            self.logger.error(f"Failed to rebuild QA sample catalog: {e}")
+            return 0
+    
+    def _read_all_metadata(self) -> List[Dict]:
+        """Read the metadata.json of every sample directory."""
         samples = []
+        for sample_dir in self.qa_samples_dir.iterdir():
+            if sample_dir.is_dir():
+                metadata_path = sample_dir / "metadata.json"
+                if metadata_path.exists():
+                    with open(metadata_path, 'r') as f:
+                        samples.append(json.load(f))
+        return samples
+    
+    def migrate_board_versions(self) -> int:
+        """
+        Give samples created before the board registry a version and status.
+        
+        Unversioned samples become the next versions of their board, and a board
+        without an active version gets its newest usable one promoted. Runs
+        automatically when the catalog is created or its schema changes; call
+        rebuild_catalog afterwards when running it by hand.
         
+        Returns:
+            Number of samples whose metadata was rewritten
+        """
         try:
-            for sample_dir in self.qa_samples_dir.iterdir():
-                if sample_dir.is_dir():
-                    metadata_path = sample_dir / "metadata.json"
-                    if metadata_path.exists():
-                        with open(metadata_path, 'r') as f:
-                            metadata = json.load(f)
-                        samples.append(metadata)
+            samples = self._read_all_metadata()
+            before = {m["sample_id"]: (m.get("board_version"), m.get("board_status")) for m in samples}
+            self._register_unversioned(samples)
+            
+            changed = [m for m in samples
+                       if (m.get("board_version"), m.get("board_status")) != before[m["sample_id"]]]
+            for metadata in changed:
+                metadata_path = self.qa_samples_dir / metadata["sample_id"] / "metadata.json"
+                with open(metadata_path, 'w') as f:
+                    json.dump(metadata, f, indent=2)
             
-            # Sort by creation date (newest first)
-            samples.sort(key=lambda x: x["created_date"], reverse=True)
+            if changed:
+                self.logger.info(f"Assigned board versions to {len(changed)} QA samples")
+            return len(changed)
             
         except Exception as e:
-            self.logger.error(f"Failed to list QA samples: {e}")
+            self.logger.error(f"Failed to migrate QA sample versions: {e}")
+            return 0
+    
+    def _register_unversioned(self, samples: List[Dict]):
+        """Assign versions and statuses in place (see migrate_board_versions)."""
+        boards: Dict[str, List[Dict]] = {}
+        for metadata in sorted(samples, key=lambda m: m["created_date"]):
+            boards.setdefault(metadata["board_name"], []).append(metadata)
         
-        return samples
+        for versions in boards.values():
+            unversioned = [m for m in versions if m.get("board_version") is None]
+            if not unversioned:
+                continue
+            
+            next_version = max((m["board_version"] for m in versions if m.get("board_version")), default=0) + 1
+            for metadata in unversioned:
+                metadata["board_version"] = next_version
+                metadata["board_status"] = "inactive"
+                next_version += 1
+            
+            # The newest usable version becomes the reference when the board has none
+            if not any(m.get("board_status") == "active" for m in versions):
+                usable = [m for m in versions if m.get("board_status") != "retired"]
+                if usable:
+                    usable[-1]["board_status"] = "active"
+    
+    def _read_metadata(self, sample_id: str) -> Optional[Dict]:
+        """Read a sample's metadata.json without checking its images."""
+        metadata_path = self.qa_samples_dir / sample_id / "metadata.json"
+        if not metadata_path.exists():
+            return None
+        with open(metadata_path, 'r') as f:
+            return json.load(f)
+    
+    def _save_metadata(self, metadata: Dict):
+        """Write a sample's metadata.json and update its catalog entry."""
+        metadata_path = self.qa_samples_dir / metadata["sample_id"] / "metadata.json"
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        self.catalog.upsert(metadata)
     
     def delete_qa_sample(self, sample_id: str) -> bool:
         """
@@ -153,7 +416,14 @@ class QAManager:
                 self.logger.warning(f"QA sample not found for deletion: {sample_id}")
                 return False
             
+            metadata = self._read_metadata(sample_id)
+            
             shutil.rmtree(sample_dir)
+            self.catalog.remove(sample_id)
+            for content_hash in (metadata or {}).get("image_hashes", {}).values():
+                self.blobs.release(content_hash)
+            if metadata and self._active_samples.get(metadata["board_name"]) == sample_id:
+                self._activate_fallback(metadata["board_name"])
             self.logger.info(f"Deleted QA sample: {sample_id}")
             return True
             
@@ -184,8 +454,14 @@ class QAManager:
                 return False
             
             # Update fields if provided
-            if board_name is not None:
+            old_board = metadata["board_name"]
+            renamed = board_name is not None and board_name != old_board
+            if renamed:
+                # The sample becomes the newest version of the other board
                 metadata["board_name"] = board_name
+                metadata["board_version"] = self.catalog.next_board_version(board_name)
+                if metadata.get("board_status") != "retired":
+                    metadata["board_status"] = "inactive"
             if notes is not None:
                 metadata["notes"] = notes
             if tags is not None:
@@ -194,11 +470,13 @@ class QAManager:
             metadata["last_modified"] = datetime.now().isoformat()
             
             # Save updated metadata
-            sample_dir = self.qa_samples_dir / sample_id
-            metadata_path = sample_dir / "metadata.json"
+            self._save_metadata(metadata)
             
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            if renamed:
+                if self._active_samples.get(old_board) == sample_id:
+                    self._activate_fallback(old_board)
+                if metadata["board_status"] != "retired" and board_name not in self._active_samples:
+                    self.promote_sample(sample_id)
             
             self.logger.info(f"Updated QA sample: {sample_id}")
             return True
@@ -207,6 +485,671 @@ class QAManager:
             self.logger.error(f"Failed to update QA sample {sample_id}: {e}")
             return False
     
+    def get_active_sample(self, board_name: str) -> Optional[str]:
+        """
+        Get the sample used as the reference for a board.
+        
+        Args:
+            board_name: Name of the board
+            
+        Returns:
+            sample_id of the board's active version, or None
+        """
+        return self._active_samples.get(board_name)
+    
+    def list_board_versions(self, board_name: str) -> List[Dict]:
+        """
+        List every registered version of a board.
+        
+        Args:
+            board_name: Name of the board
+            
+        Returns:
+            List of {"sample_id", "version", "status", "created_date"} in version order
+        """
+        try:
+            return self.catalog.board_versions(board_name)
+        except Exception as e:
+            self.logger.error(f"Failed to list versions of board {board_name}: {e}")
+            return []
+    
+    def promote_sample(self, sample_id: str) -> bool:
+        """
+        Make a sample the active reference of its board (un-retiring it if needed).
+        
+        Args:
+            sample_id: ID of the QA sample
+            
+        Returns:
+            True if the sample is now active
+        """
+        try:
+            metadata = self._read_metadata(sample_id)
+            if not metadata:
+                self.logger.warning(f"QA sample not found: {sample_id}")
+                return False
+            
+            board_name = metadata["board_name"]
+            previous = self._active_samples.get(board_name)
+            if previous and previous != sample_id:
+                self._set_board_status(previous, "inactive")
+            
+            self._set_board_status(sample_id, "active", metadata)
+            self._active_samples[board_name] = sample_id
+            self.logger.info(f"Promoted QA sample {sample_id} to active reference of {board_name}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Failed to promote QA sample {sample_id}: {e}")
+            return False
+    
+    def retire_sample(self, sample_id: str) -> bool:
+        """
+        Retire a sample version. If it was active, the newest remaining version takes over.
+        
+        Args:
+            sample_id: ID of the QA sample
+            
+        Returns:
+            True if the sample was retired
+        """
+        try:
+            metadata = self._read_metadata(sample_id)
+            if not metadata:
+                self.logger.warning(f"QA sample not found: {sample_id}")
+                return False
+            
+            self._set_board_status(sample_id, "retired", metadata)
+            if self._active_samples.get(metadata["board_name"]) == sample_id:
+                self._activate_fallback(metadata["board_name"])
+            
+            self.logger.info(f"Retired QA sample: {sample_id}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Failed to retire QA sample {sample_id}: {e}")
+            return False
+    
+    def _set_board_status(self, sample_id: str, status: str, metadata: Optional[Dict] = None):
+        metadata = metadata or self._read_metadata(sample_id)
+        if metadata is None:
+            return
+        metadata["board_status"] = status
+        metadata["last_modified"] = datetime.now().isoformat()
+        self._save_metadata(metadata)
+    
+    def _activate_fallback(self, board_name: str):
+        """Activate the newest non-retired version of a board after losing its active one."""
+        self._active_samples.pop(board_name, None)
+        candidates = [v for v in self.catalog.board_versions(board_name) if v["status"] != "retired"]
+        if candidates:
+            self.promote_sample(candidates[-1]["sample_id"])
+    
+    def set_fiducials(self,
+                      sample_id: str,
+                      fiducials: List[Dict],
+                      side: str = "front") -> bool:
+        """
+        Record fiducial mark locations for one side of a QA sample.
+        
+        Args:
+            sample_id: ID of the QA sample
+            fiducials: List of {"center": [x, y], "size": template_size} in reference
+                image pixels. The size is the side length of the square template.
+            side: Image side the fiducials belong to ("front" or "back")
+            
+        Returns:
+            True if the fiducials were saved
+        """
+        try:
+            if side not in ("front", "back"):
+                raise ValueError(f"Invalid side: {side}")
+            
+            cleaned = []
+            for fiducial in fiducials:
+                x, y = fiducial["center"]
+                size = int(fiducial.get("size", 48))
+                if size <= 0:
+                    raise ValueError(f"Invalid fiducial size: {size}")
+                cleaned.append({"center": [float(x), float(y)], "size": size})
+            
+            metadata = self.get_qa_sample(sample_id)
+            if not metadata:
+                return False
+            
+            metadata.setdefault("fiducials", {})[side] = cleaned
+            metadata["last_modified"] = datetime.now().isoformat()
+            
+            self._save_metadata(metadata)
+            
+            self.logger.info(f"Saved {len(cleaned)} {side} fiducials for QA sample: {sample_id}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Failed to save fiducials for QA sample {sample_id}: {e}")
+            return False
+    
+    def get_fiducials(self, sample_id: str, side: str = "front") -> List[Dict]:
+        """
+        Get the recorded fiducial locations for one side of a QA sample.
+        
+        Args:
+            sample_id: ID of the QA sample
+            side: Image side ("front" or "back")
+            
+        Returns:
+            List of fiducial dictionaries (empty if none are recorded)
+        """
+        metadata = self.get_qa_sample(sample_id)
+        if not metadata:
+            return []
+        return metadata.get("fiducials", {}).get(side, [])
+    
+    def set_inspection_zones(self,
+                             sample_id: str,
+                             polygons: Optional[List[List[List[float]]]] = None,
+                             side: str = "front",
+                             mask=None) -> bool:
+        """
+        Define the area of one side of a QA sample that inspections compare.
+        
+        Zones are given either as polygons or as a ready-made mask image. They are
+        rasterised once at the reference image size and saved as a PNG next to it.
+        Passing neither clears the zones so the whole image is inspected.
+        
+        Args:
+            sample_id: ID of the QA sample
+            polygons: List of polygons, each a list of [x, y] reference image points
+            side: Image side ("front" or "back")
+            mask: Mask array (non-zero = inspect), used instead of polygons
+            
+        Returns:
+            True if the zones were saved
+        """
+        import cv2
+        import numpy as np
+        
+        try:
+            if side not in ("front", "back"):
+                raise ValueError(f"Invalid side: {side}")
+            
+            metadata = self.get_qa_sample(sample_id)
+            if not metadata:
+                return False
+            
+            mask_path = self.qa_samples_dir / sample_id / f"inspection_mask_{side}.png"
+            zones = metadata.setdefault("inspection_zones", {})
+            
+            if not polygons and mask is None:
+                zones.pop(side, None)
+                mask_path.unlink(missing_ok=True)
+            else:
+                reference_img = cv2.imread(metadata["image_paths"][side], cv2.IMREAD_GRAYSCALE)
+                if reference_img is None:
+                    raise ValueError(f"Cannot read {side} reference image")
+                h, w = reference_img.shape
+                
+                cleaned = None
+                if mask is None:
+                    cleaned = [[[float(x), float(y)] for x, y in polygon] for polygon in polygons]
+                    if any(len(polygon) < 3 for polygon in cleaned):
+                        raise ValueError("Polygons need at least 3 points")
+                    raster = np.zeros((h, w), np.uint8)
+                    cv2.fillPoly(raster, [np.round(np.array(p)).astype(np.int32) for p in cleaned], 255)
+                else:
+                    raster = (np.asarray(mask) > 0).astype(np.uint8) * 255
+                    if raster.ndim == 3:
+                        raster = raster[:, :, 0]
+                    if raster.shape != (h, w):
+                        raster = cv2.resize(raster, (w, h), interpolation=cv2.INTER_NEAREST)
+                
+                if not raster.any():
+                    raise ValueError("Inspection zones cover no pixels")
+                if not cv2.imwrite(str(mask_path), raster):
+                    raise IOError(f"Failed to write {mask_path}")
+                
+                zones[side] = {"polygons": cleaned, "mask_path": str(mask_path)}
+            
+            metadata["last_modified"] = datetime.now().isoformat()
+            self._save_metadata(metadata)
+            
+            self._mask_cache.pop(str(mask_path), None)
+            self.compile_sample(sample_id)
+            self.logger.info(f"Saved {side} inspection zones for QA sample: {sample_id}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Failed to save inspection zones for QA sample {sample_id}: {e}")
+            return False
+    
+    def get_inspection_mask(self, sample_id: str, side: str = "front"):
+        """
+        Get the rasterised inspection mask of one side of a QA sample.
+        
+        Args:
+            sample_id: ID of the QA sample
+            side: Image side ("front" or "back")
+            
+        Returns:
+            uint8 mask (255 = inspect) at reference image size, or None if the whole
+            image is inspected
+        """
+        import cv2
+        
+        metadata = self.get_qa_sample(sample_id)
+        if not metadata:
+            return None
+        
+        zone = metadata.get("inspection_zones", {}).get(side)
+        if not zone:
+            return None
+        
+        try:
+            mask_path = zone["mask_path"]
+            mtime = os.stat(mask_path).st_mtime_ns
+            cached = self._mask_cache.get(mask_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            
+            mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                raise ValueError(f"Cannot read {mask_path}")
+            self._mask_cache[mask_path] = (mtime, mask)
+            return mask
+            
+        except Exception as e:
+            self.logger.error(f"Failed to load inspection mask for QA sample {sample_id}: {e}")
+            return None
+    
+    def build_reference_model(self,
+                              sample_id: str,
+                              capture_paths: List[str],
+                              side: str = "front",
+                              aligner: Optional[Callable] = None,
+                              include_reference: bool = True) -> bool:
+        """
+        Build a per-pixel statistical model of a board from known-good captures.
+        
+        The grayscale mean and variance of the captures are stored as float16
+        arrays next to the sample images and recorded in the metadata.
+        
+        Args:
+            sample_id: ID of the QA sample
+            capture_paths: Paths of known-good captures of the same board
+            side: Image side the captures show ("front" or "back")
+            aligner: Optional callable (reference_img, capture_img) -> aligned image or None,
+                e.g. wrapping PCBInspector.align_images. Captures are only resized without it.
+            include_reference: Also use the sample's own reference image
+            
+        Returns:
+            True if the model was built and saved
+        """
+        import cv2
+        import numpy as np
+        
+        try:
+            if side not in ("front", "back"):
+                raise ValueError(f"Invalid side: {side}")
+            
+            metadata = self.get_qa_sample(sample_id)
+            if not metadata:
+                return False
+            
+            reference_img = cv2.imread(metadata["image_paths"][side])
+            if reference_img is None:
+                raise ValueError(f"Cannot read {side} reference image")
+            h, w = reference_img.shape[:2]
+            
+            # Running sums in float64 so the variance does not lose precision
+            total = np.zeros((h, w), np.float64)
+            total_sq = np.zeros((h, w), np.float64)
+            count = 0
+            
+            captures = [reference_img] if include_reference else []
+            captures += list(capture_paths)
+            for capture in captures:
+                img = cv2.imread(str(capture)) if isinstance(capture, (str, Path)) else capture
+                if img is None:
+                    self.logger.warning(f"Skipping unreadable capture: {capture}")
+                    continue
+                if aligner is not None and img is not reference_img:
+                    img = aligner(reference_img, img)
+                    if img is None:
+                        self.logger.warning(f"Skipping capture that failed to align: {capture}")
+                        continue
+                if img.shape[:2] != (h, w):
+                    img = cv2.resize(img, (w, h))
+                
+                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY).astype(np.float64)
+                total += gray
+                total_sq += gray * gray
+                count += 1
+            
+            if count < 2:
+                raise ValueError("At least two usable captures are required")
+            
+            mean = total / count
+            variance = np.maximum(total_sq - count * mean * mean, 0) / (count - 1)
+            
+            model_path = self.qa_samples_dir / sample_id / f"reference_model_{side}.npz"
+            np.savez(model_path,
+                     mean=mean.astype(np.float16),
+                     variance=variance.astype(np.float16),
+                     count=count)
+            
+            metadata.setdefault("reference_models", {})[side] = {
+                "path": str(model_path),
+                "captures": count,
+                "created_date": datetime.now().isoformat()
+            }
+            metadata["last_modified"] = datetime.now().isoformat()
+            
+            self._save_metadata(metadata)
+            
+            self.logger.info(f"Built {side} reference model from {count} captures for QA sample: {sample_id}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Failed to build reference model for QA sample {sample_id}: {e}")
+            return False
+    
+    def select_feature_backend(self,
+                               sample_id: str,
+                               side: str = "front",
+                               accuracy_target_px: float = 1.0,
+                               inspector=None) -> Optional[str]:
+        """
+        Pick and record the fastest feature backend that aligns a QA sample accurately.
+        
+        See PCBInspector.select_feature_backend. The choice is stored in the metadata,
+        and get_feature_backend returns it for inspections of the sample.
+        
+        Args:
+            sample_id: ID of the QA sample
+            side: Image side ("front" or "back")
+            accuracy_target_px: Maximum acceptable registration error in pixels
+            inspector: PCBInspector to benchmark with (a default one if not given)
+            
+        Returns:
+            Name of the selected backend, or None if none met the target
+        """
+        try:
+            metadata = self.get_qa_sample(sample_id)
+            if not metadata:
+                return None
+            
+            reference_path = metadata["image_paths"][side]
+            reference_img = self.image_cache.get(reference_path)
+            if reference_img is None:
+                raise ValueError(f"Cannot read {side} image: {reference_path}")
+            
+            if inspector is None:
+                from inspector import PCBInspector
+                inspector = PCBInspector()
+            selected = inspector.select_feature_backend(reference_img, reference_path=reference_path,
+                                                        accuracy_target_px=accuracy_target_px)["selected"]
+            
+            # Re-read so metadata saved while benchmarking is not overwritten
+            metadata = self.get_qa_sample(sample_id)
+            if not metadata:
+                return None
+            backends = metadata.setdefault("feature_backends", {})
+            if selected:
+                backends[side] = selected
+            else:
+                backends.pop(side, None)
+            metadata["last_modified"] = datetime.now().isoformat()
+            
+            self._save_metadata(metadata)
+            return selected
+            
+        except Exception as e:
+            self.logger.error(f"Failed to select feature backend for QA sample {sample_id}: {e}")
+            return None
+    
+    def select_feature_backend_async(self, sample_id: str, side: str = "front") -> Future:
+        """
+        Run select_feature_backend on the background worker thread.
+        
+        Args:
+            sample_id: ID of the QA sample
+            side: Image side ("front" or "back")
+            
+        Returns:
+            Future resolving to the selected backend name (or None)
+        """
+        return self._submit_background(self.select_feature_backend, sample_id, side)
+    
+    def get_feature_backend(self, sample_id: str, side: str = "front") -> Optional[str]:
+        """
+        Get the feature backend recorded for one side of a QA sample.
+        
+        Args:
+            sample_id: ID of the QA sample
+            side: Image side ("front" or "back")
+            
+        Returns:
+            Backend name, or None to use the inspector default
+        """
+        metadata = self.get_qa_sample(sample_id)
+        if not metadata:
+            return None
+        return metadata.get("feature_backends", {}).get(side)
+    
+    def load_reference_model(self, sample_id: str, side: str = "front") -> Optional[Dict]:
+        """
+        Load the statistical reference model of one side of a QA sample.
+        
+        Args:
+            sample_id: ID of the QA sample
+            side: Image side ("front" or "back")
+            
+        Returns:
+            Dictionary with float16 "mean" and "variance" arrays and the capture "count",
+            or None if no model has been built. The dictionary is shared between calls
+            until the model file changes.
+        """
+        import numpy as np
+        
+        try:
+            metadata = self.get_qa_sample(sample_id)
+            if not metadata:
+                return None
+            
+            model_info = metadata.get("reference_models", {}).get(side)
+            if not model_info:
+                return None
+            
+            model_path = model_info["path"]
+            mtime = os.stat(model_path).st_mtime_ns
+            cached = self._model_cache.get(model_path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            
+            with np.load(model_path) as data:
+                model = {
+                    "mean": data["mean"],
+                    "variance": data["variance"],
+                    "count": int(data["count"])
+                }
+            self._model_cache[model_path] = (mtime, model)
+            return model
+            
+        except Exception as e:
+            self.logger.error(f"Failed to load reference model for QA sample {sample_id}: {e}")
+            return None
+    
+    @property
+    def image_cache(self):
+        """ImageCache used when images have to be decoded."""
+        if self._image_cache is None:
+            from image_cache import shared_image_cache
+            self._image_cache = shared_image_cache
+        return self._image_cache
+    
+    @property
+    def compiler(self):
+        """SampleCompiler used for derived reference assets."""
+        if self._compiler is None:
+            from sample_compiler import SampleCompiler
+            self._compiler = SampleCompiler()
+        return self._compiler
+    
+    def compile_sample(self, sample_id: str, force: bool = False) -> bool:
+        """
+        Build (or refresh) the compiled reference assets of a QA sample.
+        
+        Args:
+            sample_id: ID of the QA sample
+            force: Rebuild even if the assets are current
+            
+        Returns:
+            True if the sample's assets are current after the call
+        """
+        metadata = self.get_qa_sample(sample_id)
+        if not metadata:
+            return False
+        
+        with self._compile_lock:
+            manifest = self.compiler.compile_sample(self.qa_samples_dir / sample_id, metadata, force=force)
+        return manifest is not None
+    
+    def compile_sample_async(self, sample_id: str, force: bool = False) -> Future:
+        """
+        Compile a QA sample on a background thread.
+        
+        Args:
+            sample_id: ID of the QA sample
+            force: Rebuild even if the assets are current
+            
+        Returns:
+            Future resolving to the result of compile_sample
+        """
+        return self._submit_background(self.compile_sample, sample_id, force)
+    
+    def _submit_background(self, fn: Callable, *args) -> Future:
+        """Run a call on the background worker thread."""
+        if self._background_executor is None:
+            self._background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qa-background")
+        return self._background_executor.submit(fn, *args)
+    
+    def compile_all_samples(self, force: bool = False) -> Dict[str, bool]:
+        """
+        Compile every QA sample whose assets are missing or out of date.
+        
+        Args:
+            force: Rebuild all samples
+            
+        Returns:
+            Dictionary mapping sample_id to success
+        """
+        return {sample["sample_id"]: self.compile_sample(sample["sample_id"], force=force)
+                for sample in self.list_qa_samples()}
+    
+    def load_compiled_assets(self, sample_id: str, side: str = "front") -> Optional[Dict]:
+        """
+        Get the compiled assets of one side of a QA sample, recompiling them if stale.
+        
+        Args:
+            sample_id: ID of the QA sample
+            side: Image side ("front" or "back")
+            
+        Returns:
+            Assets dictionary (see SampleCompiler.load_assets) or None
+        """
+        metadata = self.get_qa_sample(sample_id)
+        if not metadata:
+            return None
+        
+        sample_dir = self.qa_samples_dir / sample_id
+        # Waits for a background compile of the sample instead of starting a second one
+        with self._compile_lock:
+            if not self.compiler.is_current(sample_dir, metadata):
+                if self.compiler.compile_sample(sample_dir, metadata) is None:
+                    return None
+        return self.compiler.load_assets(sample_dir, side)
+    
+    def identify_board_candidates(self, image, k: int = 5, bbox=None, quad=None) -> List[Dict]:
+        """
+        Rank the active board references by global similarity to an image.
+        
+        Only the returned candidates need the full alignment check.
+        
+        Args:
+            image: Captured board image (BGR)
+            k: Number of candidates
+            bbox: Board bounding box (x, y, w, h) in the image, as found by board detection (optional)
+            quad: Board corners in the image (CameraManager.get_board_quad, optional); lets
+                boards photographed at any angle match their references
+            
+        Returns:
+            Up to k {"sample_id", "board_name", "score"} dictionaries, best first
+        """
+        try:
+            self.sync_board_index()
+            return self.board_index.query(image, k=k, bbox=bbox, quad=quad)
+        except Exception as e:
+            self.logger.error(f"Failed to query board index: {e}")
+            return []
+    
+    def sync_board_index(self) -> int:
+        """
+        Bring the board index in line with the active samples.
+        
+        Only samples that were activated, renamed or removed since the last call are
+        (re)computed, so this is cheap when nothing changed.
+        
+        Returns:
+            Number of index entries added or removed
+        """
+        active = {m["sample_id"]: m for m in self.find_samples(status="active")}
+        indexed = self.board_index.entries()
+        changes = 0
+        
+        for sample_id in set(indexed) - set(active):
+            self.board_index.remove(sample_id)
+            changes += 1
+        
+        for sample_id, metadata in active.items():
+            key = self._board_index_key(metadata)
+            if key is None or indexed.get(sample_id) == key:
+                continue
+            image = self.image_cache.get(metadata["image_paths"]["front"])
+            if image is None:
+                self.logger.warning(f"Cannot index QA sample {sample_id}: front image unreadable")
+                continue
+            assets = self.load_compiled_assets(sample_id) or {}
+            self.board_index.add(sample_id, metadata["board_name"], image, source_key=key,
+                                 bbox=assets.get("outline_bbox"), quad=self._outline_quad(assets.get("outline")))
+            changes += 1
+        
+        if changes:
+            self.board_index.save()
+            self.logger.info(f"Updated board index ({changes} changes, {len(self.board_index)} boards)")
+        return changes
+    
+    @staticmethod
+    def _outline_quad(outline):
+        """Corners of the minimum-area rectangle around a compiled board outline (None without one)."""
+        import cv2
+        import numpy as np
+        
+        if outline is None or len(outline) < 3:
+            return None
+        return cv2.boxPoints(cv2.minAreaRect(np.asarray(outline, np.float32).reshape(-1, 1, 2)))
+    
+    @staticmethod
+    def _board_index_key(metadata: Dict) -> Optional[str]:
+        """Identifies what a sample's index entry was computed from."""
+        front_path = metadata.get("image_paths", {}).get("front")
+        content = metadata.get("image_hashes", {}).get("front")
+        if content is None:
+            if not front_path or not os.path.exists(front_path):
+                return None
+            stat = os.stat(front_path)
+            content = f"{stat.st_mtime_ns}:{stat.st_size}"
+        return f"{metadata['board_name']}:{content}"
+    
     def get_sample_images(self, sample_id: str) -> Optional[Tuple[str, str]]:
         """
         Get the front and back image paths for a QA sample.
@@ -226,41 +1169,107 @@ class QAManager:
             metadata["image_paths"]["back"]
         )
     
-    def validate_sample(self, sample_id: str) -> bool:
+    def validate_sample(self, sample_id: str, fast: bool = False) -> bool:
         """
         Validate that a QA sample has all required files.
         
         Args:
             sample_id: ID of the QA sample to validate
+            fast: Only check image headers and dimensions instead of decoding the images
             
         Returns:
             True if sample is valid
         """
+        return self._validate_sample_details(sample_id, fast)["valid"]
+    
+    def validate_all(self,
+                     fast: bool = True,
+                     max_workers: Optional[int] = None,
+                     report_path: Optional[str] = None) -> Dict:
+        """
+        Validate every QA sample in parallel and write a JSON report.
+        
+        Args:
+            fast: Header-only validation (see validate_sample)
+            max_workers: Validation threads (defaults to ThreadPoolExecutor's choice)
+            report_path: Report location (defaults to validation_report.json in the samples directory)
+            
+        Returns:
+            Report dictionary: summary counts plus per-sample results
+        """
+        start = time.perf_counter()
+        sample_ids = [sample["sample_id"] for sample in self.list_qa_samples()]
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(lambda sample_id: self._validate_sample_details(sample_id, fast),
+                                    sample_ids))
+        
+        invalid = [result for result in results if not result["valid"]]
+        report = {
+            "checked_date": datetime.now().isoformat(),
+            "mode": "fast" if fast else "full",
+            "total": len(results),
+            "valid": len(results) - len(invalid),
+            "invalid": len(invalid),
+            "elapsed_seconds": round(time.perf_counter() - start, 3),
+            "invalid_samples": [result["sample_id"] for result in invalid],
+            "samples": results
+        }
+        
+        report_path = Path(report_path) if report_path else self.qa_samples_dir / "validation_report.json"
         try:
-            metadata = self.get_qa_sample(sample_id)
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+        except Exception as e:
+            self.logger.error(f"Failed to write validation report {report_path}: {e}")
+        
+        self.logger.info(f"Validated {report['total']} QA samples: {report['invalid']} invalid "
+                         f"({report['elapsed_seconds']}s)")
+        return report
+    
+    def _validate_sample_details(self, sample_id: str, fast: bool) -> Dict:
+        """Validate one sample, collecting the reason for every failure."""
+        result = {"sample_id": sample_id, "valid": False, "errors": [], "images": {}}
+        
+        try:
+            metadata = self._read_metadata(sample_id)
             if not metadata:
-                return False
+                result["errors"].append("metadata.json missing")
+                return result
             
-            # Check if image files exist
-            front_path = Path(metadata["image_paths"]["front"])
-            back_path = Path(metadata["image_paths"]["back"])
-            
-            if not front_path.exists() or not back_path.exists():
-                return False
+            for side in ("front", "back"):
+                path = metadata.get("image_paths", {}).get(side)
+                if not path:
+                    result["errors"].append(f"{side}: no image path")
+                    continue
+                
+                # Opening the file doubles as the existence check
+                try:
+                    if fast:
+                        fmt, width, height = read_image_header(path)
+                    else:
+                        if not os.path.exists(path):
+                            raise FileNotFoundError(path)
+                        # Decoding through the shared cache leaves the images warm for inspection
+                        img = self.image_cache.get(path)
+                        if img is None:
+                            raise ValueError("image cannot be decoded")
+                        with open(path, 'rb') as f:
+                            fmt = image_format(f.read(8)) or Path(path).suffix.lstrip(".").lower()
+                        height, width = img.shape[:2]
+                    result["images"][side] = {"format": fmt, "width": width, "height": height}
+                except FileNotFoundError:
+                    result["errors"].append(f"{side}: file missing ({path})")
+                except (OSError, ValueError, struct.error) as e:
+                    result["errors"].append(f"{side}: {e}")
             
-            # Check if images are readable
-            import cv2
-            front_img = cv2.imread(str(front_path))
-            back_img = cv2.imread(str(back_path))
-            
-            if front_img is None or back_img is None:
-                return False
-            
-            return True
+            result["valid"] = not result["errors"]
             
         except Exception as e:
             self.logger.error(f"Failed to validate QA sample {sample_id}: {e}")
-            return False
+            result["errors"].append(str(e))
+        
+        return result
 
 
 if __name__ == "__main__":
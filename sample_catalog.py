@@ -0,0 +1,192 @@
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+
+class SampleCatalog:
+    """SQLite index of QA sample metadata, queried instead of scanning sample directories."""
+
+    SCHEMA_VERSION = 2
+    BOARD_STATUSES = ("active", "inactive", "retired")
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # Set when an existing catalog had an older schema and was emptied
+        self.needs_rebuild = False
+        self._create_schema()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection for one operation, committed on success and always closed."""
+        # A short-lived connection per operation keeps the catalog usable from worker threads
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        try:
+            conn.execute("PRAGMA foreign_keys = ON")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _create_schema(self):
+        with self._lock, self._connect() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.SCHEMA_VERSION:
+                # The catalog only mirrors metadata.json files, so old layouts are rebuilt
+                self.needs_rebuild = version != 0
+                conn.executescript("DROP TABLE IF EXISTS sample_tags; DROP TABLE IF EXISTS samples;")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    sample_id TEXT PRIMARY KEY,
+                    board_name TEXT NOT NULL,
+                    created_date TEXT NOT NULL,
+                    last_modified TEXT,
+                    board_version INTEGER,
+                    board_status TEXT,
+                    metadata TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sample_tags (
+                    sample_id TEXT NOT NULL REFERENCES samples(sample_id) ON DELETE CASCADE,
+                    tag TEXT NOT NULL,
+                    PRIMARY KEY (sample_id, tag)
+                );
+                CREATE INDEX IF NOT EXISTS idx_samples_board ON samples(board_name, created_date);
+                CREATE INDEX IF NOT EXISTS idx_samples_status ON samples(board_status, board_name);
+                CREATE INDEX IF NOT EXISTS idx_samples_created ON samples(created_date);
+                CREATE INDEX IF NOT EXISTS idx_tags_tag ON sample_tags(tag);
+            """)
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def upsert(self, metadata: Dict):
+        """Add a sample to the catalog or replace its entry."""
+        sample_id = metadata["sample_id"]
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         self._row(metadata))
+            conn.execute("DELETE FROM sample_tags WHERE sample_id = ?", (sample_id,))
+            conn.executemany("INSERT OR IGNORE INTO sample_tags (sample_id, tag) VALUES (?, ?)",
+                             [(sample_id, tag) for tag in metadata.get("tags", [])])
+
+    def remove(self, sample_id: str):
+        """Drop a sample from the catalog."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM samples WHERE sample_id = ?", (sample_id,))
+
+    def rebuild(self, samples: Iterable[Dict]) -> int:
+        """
+        Replace the whole catalog with the given sample metadata.
+
+        Args:
+            samples: Metadata dictionaries of every sample
+
+        Returns:
+            Number of samples indexed
+        """
+        samples = list(samples)
+        rows = [self._row(m) for m in samples]
+        tags = [(m["sample_id"], tag) for m in samples for tag in m.get("tags", [])]
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM samples")
+            conn.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT OR IGNORE INTO sample_tags (sample_id, tag) VALUES (?, ?)", tags)
+        return len(rows)
+
+    def get(self, sample_id: str) -> Optional[Dict]:
+        """Metadata of one sample, or None if it is not catalogued."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT metadata FROM samples WHERE sample_id = ?", (sample_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self,
+             board_name: Optional[str] = None,
+             tag: Optional[str] = None,
+             created_after: Optional[Union[str, datetime]] = None,
+             created_before: Optional[Union[str, datetime]] = None,
+             status: Optional[str] = None,
+             limit: Optional[int] = None) -> List[Dict]:
+        """
+        Query samples, newest first.
+
+        Args:
+            board_name: Exact board name
+            tag: Tag the sample must carry
+            created_after: Only samples created at or after this time
+            created_before: Only samples created before this time
+            status: Board version status ("active", "inactive" or "retired")
+            limit: Maximum number of samples returned
+
+        Returns:
+            List of sample metadata dictionaries
+        """
+        query = "SELECT s.metadata FROM samples s"
+        clauses, params = [], []
+        if tag is not None:
+            query += " JOIN sample_tags t ON t.sample_id = s.sample_id"
+            clauses.append("t.tag = ?")
+            params.append(tag)
+        if board_name is not None:
+            clauses.append("s.board_name = ?")
+            params.append(board_name)
+        if created_after is not None:
+            clauses.append("s.created_date >= ?")
+            params.append(self._date_key(created_after))
+        if created_before is not None:
+            clauses.append("s.created_date < ?")
+            params.append(self._date_key(created_before))
+        if status is not None:
+            clauses.append("s.board_status = ?")
+            params.append(status)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY s.created_date DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def board_versions(self, board_name: str) -> List[Dict]:
+        """Versions of a board in version order: sample_id, version, status, created_date."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT sample_id, board_version, board_status, created_date FROM samples "
+                "WHERE board_name = ? ORDER BY board_version, created_date", (board_name,)
+            ).fetchall()
+        return [{"sample_id": r[0], "version": r[1], "status": r[2], "created_date": r[3]} for r in rows]
+
+    def next_board_version(self, board_name: str) -> int:
+        """Version number for the next sample registered under a board."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(board_version) FROM samples WHERE board_name = ?",
+                               (board_name,)).fetchone()
+        return (row[0] or 0) + 1
+
+    def active_samples(self) -> Dict[str, str]:
+        """Map of board name to its active sample_id."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT board_name, sample_id FROM samples WHERE board_status = 'active'").fetchall()
+        return dict(rows)
+
+    def count(self) -> int:
+        """Number of catalogued samples."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+    @staticmethod
+    def _row(metadata: Dict) -> tuple:
+        return (metadata["sample_id"], metadata["board_name"], metadata["created_date"],
+                metadata.get("last_modified"), metadata.get("board_version"),
+                metadata.get("board_status"), json.dumps(metadata))
+
+    @staticmethod
+    def _date_key(value: Union[str, datetime]) -> str:
+        # created_date is stored as ISO 8601, which sorts chronologically as text
+        return value.isoformat() if isinstance(value, datetime) else str(value)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+QA Sample Compiler
+==================
+
+Precomputes the derived reference assets of QA samples so inspections do not
+rebuild them from the JPEGs every time:
+
+- Decoded grayscale pyramid of each side (full resolution down to ~128 px)
+- Feature keypoints/descriptors (written through FeatureStore)
+- Board outline found by CameraManager.detect_board
+- Rasterised inspection masks
+
+Assets are written to <sample>/compiled/<side>.npz (uncompressed, so loading is
+a plain read) together with a manifest.json that records COMPILER_VERSION and
+the source files they were built from. A sample is recompiled when either
+changes.
+
+Usage:
+    python sample_compiler.py [--samples-dir qa_samples] [--force]
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from feature_backends import get_feature_backend
+from feature_store import FeatureStore
+
+# Bump whenever any compiled asset is produced differently, so existing samples regenerate
+COMPILER_VERSION = 1
+
+SIDES = ("front", "back")
+
+
+class SampleCompiler:
+    """Builds and loads the versioned derived assets of QA samples."""
+
+    COMPILED_DIR = "compiled"
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self,
+                 feature_backends: Optional[List[str]] = None,
+                 min_pyramid_dim: int = 128,
+                 board_detector: Optional[Callable] = None):
+        self.feature_backends = feature_backends or ["sift"]
+        self.min_pyramid_dim = min_pyramid_dim
+        self._board_detector = board_detector
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def board_detector(self) -> Callable:
+        """Board outline detector, CameraManager.detect_board unless one was given."""
+        if self._board_detector is None:
+            from camera import CameraManager
+            self._board_detector = CameraManager().detect_board
+        return self._board_detector
+
+    def settings(self) -> Dict:
+        """Compiler settings recorded in the manifest; a change triggers recompilation."""
+        return {
+            "compiler_version": COMPILER_VERSION,
+            "feature_backends": sorted(self.feature_backends),
+            "min_pyramid_dim": self.min_pyramid_dim
+        }
+
+    def manifest_path(self, sample_dir: Path) -> Path:
+        return Path(sample_dir) / self.COMPILED_DIR / self.MANIFEST_NAME
+
+    def is_current(self, sample_dir: Path, metadata: Dict) -> bool:
+        """
+        Check whether a sample's compiled assets match its sources and this compiler.
+
+        Args:
+            sample_dir: Directory of the QA sample
+            metadata: Sample metadata
+
+        Returns:
+            True if no recompilation is needed
+        """
+        manifest = self._read_manifest(sample_dir)
+        if manifest is None or manifest.get("settings") != self.settings():
+            return False
+
+        for side, sources in self._sources(metadata).items():
+            recorded = manifest.get("sides", {}).get(side)
+            if recorded is None:
+                return False
+            for name, path in sources.items():
+                if not self._source_matches(path, recorded["sources"].get(name)):
+                    return False
+        return True
+
+    def compile_sample(self, sample_dir: Path, metadata: Dict, force: bool = False) -> Optional[Dict]:
+        """
+        Build the derived assets of one QA sample.
+
+        Args:
+            sample_dir: Directory of the QA sample
+            metadata: Sample metadata (image paths, inspection zones)
+            force: Rebuild even if the compiled assets are current
+
+        Returns:
+            The manifest, or None if compilation failed
+        """
+        sample_dir = Path(sample_dir)
+        try:
+            if not force and self.is_current(sample_dir, metadata):
+                return self._read_manifest(sample_dir)
+
+            compiled_dir = sample_dir / self.COMPILED_DIR
+            compiled_dir.mkdir(exist_ok=True)
+
+            manifest = {
+                "settings": self.settings(),
+                "compiled_date": datetime.now().isoformat(),
+                "sides": {}
+            }
+            for side, sources in self._sources(metadata).items():
+                manifest["sides"][side] = self._compile_side(compiled_dir, side, sources)
+
+            # Manifest last: an interrupted compile leaves the sample marked stale
+            tmp_path = compiled_dir / (self.MANIFEST_NAME + ".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            tmp_path.replace(compiled_dir / self.MANIFEST_NAME)
+
+            self.logger.info(f"Compiled QA sample assets: {sample_dir.name}")
+            return manifest
+
+        except Exception as e:
+            self.logger.error(f"Failed to compile QA sample {sample_dir.name}: {e}")
+            return None
+
+    def load_assets(self, sample_dir: Path, side: str = "front") -> Optional[Dict]:
+        """
+        Load the compiled assets of one side of a QA sample.
+
+        Args:
+            sample_dir: Directory of the QA sample
+            side: Image side ("front" or "back")
+
+        Returns:
+            Dictionary with "pyramid" (list of grayscale levels, full resolution first),
+            "outline" (Nx2 board contour or None), "outline_bbox" and "mask" (or None),
+            or None if the side has not been compiled
+        """
+        manifest = self._read_manifest(sample_dir)
+        if manifest is None or side not in manifest.get("sides", {}):
+            return None
+
+        try:
+            entry = manifest["sides"][side]
+            with np.load(Path(sample_dir) / self.COMPILED_DIR / entry["assets"]) as data:
+                pyramid = [data[f"gray_{i}"] for i in range(entry["pyramid_levels"])]
+                outline = data["outline"] if data["outline"].size else None
+                mask = data["mask"] if "mask" in data.files else None
+            return {
+                "pyramid": pyramid,
+                "outline": outline,
+                "outline_bbox": entry.get("outline_bbox"),
+                "mask": mask
+            }
+
+        except Exception as e:
+            self.logger.error(f"Failed to load compiled assets of {Path(sample_dir).name}: {e}")
+            return None
+
+    def _compile_side(self, compiled_dir: Path, side: str, sources: Dict[str, str]) -> Dict:
+        """Build and save the assets of one image side."""
+        image = cv2.imread(sources["image"])
+        if image is None:
+            raise ValueError(f"Cannot read {side} image: {sources['image']}")
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        arrays = {}
+        level = gray
+        levels = 0
+        while True:
+            arrays[f"gray_{levels}"] = level
+            levels += 1
+            if min(level.shape) // 2 < self.min_pyramid_dim:
+                break
+            level = cv2.pyrDown(level)
+
+        board = self.board_detector(image)
+        outline_bbox = None
+        if board is not None:
+            arrays["outline"] = board["contour"].reshape(-1, 2).astype(np.int32)
+            outline_bbox = [int(v) for v in board["bbox"]]
+        else:
+            arrays["outline"] = np.empty((0, 2), np.int32)
+
+        if "mask" in sources:
+            mask = cv2.imread(sources["mask"], cv2.IMREAD_GRAYSCALE)
+            if mask is None:
+                raise ValueError(f"Cannot read {side} inspection mask: {sources['mask']}")
+            arrays["mask"] = mask
+
+        features = {}
+        for backend_name in self.feature_backends:
+            backend = get_feature_backend(backend_name)
+            store = FeatureStore(backend_name=backend.name)
+            keypoints, _, _ = store.get_features(sources["image"], backend.create_detector(), gray=gray)
+            features[backend.name] = {"path": store.store_path(sources["image"]).name,
+                                      "keypoints": len(keypoints)}
+
+        assets_name = f"{side}.npz"
+        tmp_path = compiled_dir / f"{side}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        tmp_path.replace(compiled_dir / assets_name)
+
+        return {
+            "assets": assets_name,
+            "shape": list(gray.shape),
+            "pyramid_levels": levels,
+            "outline_bbox": outline_bbox,
+            "features": features,
+            "sources": {name: self._source_record(path) for name, path in sources.items()}
+        }
+
+    @staticmethod
+    def _sources(metadata: Dict) -> Dict[str, Dict[str, str]]:
+        """Source files the assets of each side are derived from."""
+        sources = {}
+        for side in SIDES:
+            image_path = metadata.get("image_paths", {}).get(side)
+            if not image_path:
+                continue
+            sources[side] = {"image": image_path}
+            zone = metadata.get("inspection_zones", {}).get(side)
+            if zone:
+                sources[side]["mask"] = zone["mask_path"]
+        return sources
+
+    @staticmethod
+    def _source_record(path: str) -> Dict:
+        stat = os.stat(path)
+        return {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "sha256": FeatureStore.hash_file(path)}
+
+    @staticmethod
+    def _source_matches(path: str, record: Optional[Dict]) -> bool:
+        """Compare a source file with its record, hashing only if its stat changed."""
+        if record is None or record.get("path") != path or not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size == record["size"] and stat.st_mtime_ns == record["mtime_ns"]:
+            return True
+        return FeatureStore.hash_file(path) == record["sha256"]
+
+    def _read_manifest(self, sample_dir: Path) -> Optional[Dict]:
+        path = self.manifest_path(sample_dir)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile derived assets of existing QA samples")
+    parser.add_argument("--samples-dir", default="qa_samples", help="QA samples directory")
+    parser.add_argument("--force", action="store_true", help="Recompile samples that are already current")
+    parser.add_argument("--backends", nargs="+", default=["sift"], help="Feature backends to precompute")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from qa_manager import QAManager
+    qa_manager = QAManager(args.samples_dir, compiler=SampleCompiler(feature_backends=args.backends))
+    results = qa_manager.compile_all_samples(force=args.force)
+
+    failed = [sample_id for sample_id, ok in results.items() if not ok]
+    print(f"Compiled {len(results) - len(failed)}/{len(results)} QA samples")
+    for sample_id in failed:
+        print(f"  failed: {sample_id}")
+
+
+if __name__ == "__main__":
+    main()
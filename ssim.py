@@ -0,0 +1,199 @@
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+
+def structural_similarity(im1: np.ndarray,
+                          im2: np.ndarray,
+                          win_size: int = 7,
+                          data_range: Optional[float] = None,
+                          full: bool = False) -> Union[float, Tuple[float, np.ndarray]]:
+    """
+    Compute the mean structural similarity index between two grayscale images.
+
+    Drop-in replacement for skimage.metrics.structural_similarity with its default
+    settings (uniform 7x7 window, sample covariance, K1=0.01, K2=0.03, reflected
+    borders), computed with OpenCV box filters in float32.
+
+    Args:
+        im1: First grayscale image
+        im2: Second grayscale image of the same shape
+        win_size: Side length of the sliding window (odd, >= 3)
+        data_range: Dynamic range of the input (defaults to 255 for uint8, 1.0 for floats)
+        full: Also return the per-pixel SSIM map
+
+    Returns:
+        Mean SSIM, or tuple of (mean SSIM, SSIM map) when full is True
+    """
+    _check_inputs(im1, im2, win_size)
+    S = ssim_map(im1, im2, win_size, _data_range(im1, data_range))
+    return _finish(S, win_size, full)
+
+
+def structural_similarity_tiled(im1: np.ndarray,
+                                im2: np.ndarray,
+                                win_size: int = 7,
+                                data_range: Optional[float] = None,
+                                full: bool = False,
+                                tile_size: Tuple[int, int] = (512, 512),
+                                max_workers: Optional[int] = None,
+                                executor: Optional[Executor] = None) -> Union[float, Tuple[float, np.ndarray]]:
+    """
+    Compute SSIM over overlapping tiles in a thread pool.
+
+    Each tile is filtered together with a halo of (win_size - 1) / 2 pixels so
+    interior values are exact; tiles on the image edge use the same reflected
+    border as the full-frame computation. The stitched map and mean therefore
+    equal structural_similarity's. OpenCV releases the GIL, so tiles run in parallel.
+
+    Args:
+        im1: First grayscale image
+        im2: Second grayscale image of the same shape
+        win_size: Side length of the sliding window (odd, >= 3)
+        data_range: Dynamic range of the input (defaults to 255 for uint8, 1.0 for floats)
+        full: Also return the per-pixel SSIM map
+        tile_size: (width, height) of each tile before the halo is added
+        max_workers: Threads to use when no executor is given (defaults to the core count)
+        executor: Existing thread pool to run tiles on
+
+    Returns:
+        Mean SSIM, or tuple of (mean SSIM, SSIM map) when full is True
+    """
+    _check_inputs(im1, im2, win_size)
+    data_range = _data_range(im1, data_range)
+
+    h, w = im1.shape
+    tile_w, tile_h = tile_size
+    S = np.empty((h, w), np.float32)
+
+    def compute_tile(y0: int, y1: int, x0: int, x1: int):
+        S[y0:y1, x0:x1] = region_ssim_map(im1, im2, (x0, y0, x1 - x0, y1 - y0), win_size, data_range)
+
+    tiles = [(y, min(y + tile_h, h), x, min(x + tile_w, w))
+             for y in range(0, h, tile_h) for x in range(0, w, tile_w)]
+
+    if executor is not None:
+        list(executor.map(lambda t: compute_tile(*t), tiles))
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=min(workers, len(tiles))) as pool:
+            list(pool.map(lambda t: compute_tile(*t), tiles))
+
+    return _finish(S, win_size, full)
+
+
+def region_ssim_map(im1: np.ndarray,
+                    im2: np.ndarray,
+                    bbox: Tuple[int, int, int, int],
+                    win_size: int = 7,
+                    data_range: float = 255.0) -> np.ndarray:
+    """
+    Per-pixel SSIM map of one region, identical to the full-frame map cropped to it.
+
+    Args:
+        im1: First grayscale image
+        im2: Second grayscale image of the same shape
+        bbox: (x, y, width, height) of the region
+        win_size: Side length of the sliding window
+        data_range: Dynamic range of the input
+
+    Returns:
+        float32 SSIM map of shape (height, width)
+    """
+    h, w = im1.shape
+    x0, y0, bw, bh = bbox
+    x1, y1 = x0 + bw, y0 + bh
+    halo = (win_size - 1) // 2
+
+    # Halo is clipped at the image edge, where BORDER_REFLECT matches the full frame
+    py0, py1 = max(y0 - halo, 0), min(y1 + halo, h)
+    px0, px1 = max(x0 - halo, 0), min(x1 + halo, w)
+    S = ssim_map(im1[py0:py1, px0:px1], im2[py0:py1, px0:px1], win_size, data_range)
+    return S[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+
+
+def _check_inputs(im1: np.ndarray, im2: np.ndarray, win_size: int):
+    """Validate image shapes and window size."""
+    if im1.shape != im2.shape:
+        raise ValueError("Input images must have the same dimensions")
+    if im1.ndim != 2:
+        raise ValueError("Input images must be single-channel")
+    if win_size < 3 or win_size % 2 == 0:
+        raise ValueError("win_size must be odd and >= 3")
+    if min(im1.shape) < win_size:
+        raise ValueError("win_size exceeds image extent")
+
+
+def _data_range(image: np.ndarray, data_range: Optional[float]) -> float:
+    """Default dynamic range for an image dtype, as skimage infers it."""
+    if data_range is not None:
+        return float(data_range)
+    if np.issubdtype(image.dtype, np.integer):
+        info = np.iinfo(image.dtype)
+        return float(info.max - info.min) if info.min < 0 else float(info.max)
+    return 1.0
+
+
+def _finish(S: np.ndarray, win_size: int, full: bool) -> Union[float, Tuple[float, np.ndarray]]:
+    """Mean SSIM over the map, excluding the border skimage leaves out."""
+    pad = (win_size - 1) // 2
+    mssim = float(S[pad:S.shape[0] - pad, pad:S.shape[1] - pad].mean(dtype=np.float64))
+    if full:
+        return mssim, S
+    return mssim
+
+
+def ssim_map(im1: np.ndarray,
+             im2: np.ndarray,
+             win_size: int = 7,
+             data_range: float = 255.0) -> np.ndarray:
+    """Per-pixel SSIM map in float32 (see structural_similarity)."""
+    X = im1.astype(np.float32)
+    Y = im2.astype(np.float32)
+
+    window = (win_size, win_size)
+    num_points = win_size * win_size
+    cov_norm = np.float32(num_points / (num_points - 1))  # Sample covariance
+    C1 = np.float32((0.01 * data_range) ** 2)
+    C2 = np.float32((0.03 * data_range) ** 2)
+    border = cv2.BORDER_REFLECT  # Same as scipy.ndimage's "reflect" mode
+
+    ux = cv2.boxFilter(X, cv2.CV_32F, window, normalize=True, borderType=border)
+    uy = cv2.boxFilter(Y, cv2.CV_32F, window, normalize=True, borderType=border)
+    uxx = cv2.sqrBoxFilter(X, cv2.CV_32F, window, normalize=True, borderType=border)
+    uyy = cv2.sqrBoxFilter(Y, cv2.CV_32F, window, normalize=True, borderType=border)
+    uxy = cv2.boxFilter(cv2.multiply(X, Y), cv2.CV_32F, window, normalize=True, borderType=border)
+    del X, Y
+
+    # Everything below works in place on the filtered buffers to keep peak memory down
+    ux_uy = cv2.multiply(ux, uy)
+    cv2.multiply(ux, ux, dst=ux)
+    cv2.multiply(uy, uy, dst=uy)
+    vx = cv2.subtract(uxx, ux, dst=uxx)
+    vy = cv2.subtract(uyy, uy, dst=uyy)
+    vxy = cv2.subtract(uxy, ux_uy, dst=uxy)
+
+    # A1 = 2*ux*uy + C1, A2 = 2*cov_norm*vxy + C2
+    A1 = ux_uy
+    A1 *= 2
+    A1 += C1
+    A2 = vxy
+    A2 *= 2 * cov_norm
+    A2 += C2
+
+    # B1 = ux^2 + uy^2 + C1, B2 = cov_norm*(vx + vy) + C2
+    B1 = ux
+    B1 += uy
+    B1 += C1
+    B2 = vx
+    B2 += vy
+    B2 *= cov_norm
+    B2 += C2
+
+    A1 *= A2
+    B1 *= B2
+    A1 /= B1
+    return A1
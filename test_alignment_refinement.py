@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Alignment Refinement Test
+=========================
+
+This script checks the full-resolution refinement step of coarse-to-fine
+alignment on synthetic boards with a known transform: the refined homography
+must never be less accurate than the coarse one it starts from, and it must
+correct a coarse estimate that is off by about a pixel. Phase alignment is
+checked at several board orientations.
+
+Usage:
+    python test_alignment_refinement.py
+    python -m pytest test_alignment_refinement.py
+"""
+
+import cv2
+import numpy as np
+
+from feature_backends import registration_error, synthetic_transform
+from inspector import PCBInspector
+
+
+def make_board(seed: int = 0, width: int = 1280, height: int = 960) -> np.ndarray:
+    """Draw a synthetic board: pads, traces and vias on a green substrate."""
+    rng = np.random.default_rng(seed)
+    board = np.full((height, width, 3), (40, 110, 40), np.uint8)
+    for _ in range(120):
+        x, y = (int(v) for v in rng.integers(0, [width, height]))
+        w, h = (int(v) for v in rng.integers(8, [90, 60]))
+        cv2.rectangle(board, (x, y), (x + w, y + h), tuple(int(v) for v in rng.integers(0, 255, 3)), -1)
+    for _ in range(80):
+        start = tuple(int(v) for v in rng.integers(0, [width, height]))
+        end = tuple(int(v) for v in rng.integers(0, [width, height]))
+        cv2.line(board, start, end, (180, 160, 60), int(rng.integers(1, 4)))
+    for _ in range(60):
+        centre = tuple(int(v) for v in rng.integers(0, [width, height]))
+        cv2.circle(board, centre, int(rng.integers(3, 14)), (200, 200, 200), -1)
+    return cv2.GaussianBlur(board, (3, 3), 0)
+
+
+def refine(inspector: PCBInspector, reference: np.ndarray, test: np.ndarray, H_coarse: np.ndarray) -> np.ndarray:
+    """Run the refinement step, returning the homography the aligner would use."""
+    ref_gray = cv2.cvtColor(reference, cv2.COLOR_BGR2GRAY)
+    test_gray = cv2.cvtColor(test, cv2.COLOR_BGR2GRAY)
+    anchors = cv2.goodFeaturesToTrack(ref_gray, maxCorners=48, qualityLevel=0.01, minDistance=80).reshape(-1, 2)
+    H_refined, _ = inspector._refine_homography_locally(ref_gray, test_gray, H_coarse, anchors)
+    return H_refined if H_refined is not None else H_coarse
+
+
+def test_refinement_never_worse_than_coarse():
+    """Refining an already accurate or slightly-off homography does not lose accuracy."""
+    inspector = PCBInspector()
+    reference = make_board()
+    h, w = reference.shape[:2]
+    
+    for angle, dx, dy in [(0.3, 12, -8), (1.0, -25, 15), (3.0, 40, 30), (5.0, -60, -45), (30.0, 15, -10)]:
+        G = synthetic_transform(reference.shape, angle, dx, dy)
+        test = cv2.warpPerspective(reference, G, (w, h))
+        exact = np.linalg.inv(G)
+        
+        # Coarse estimates: exact, and off by a sub-degree rotation plus a pixel shift
+        nudge = synthetic_transform(reference.shape, 0.1, 0.8, -0.6)
+        for H_coarse in (exact, nudge @ exact):
+            coarse_error = registration_error(H_coarse, G, reference.shape)
+            refined_error = registration_error(refine(inspector, reference, test, H_coarse), G, reference.shape)
+            assert refined_error <= coarse_error + 1e-6, \
+                f"{angle} deg: refined {refined_error:.3f}px worse than coarse {coarse_error:.3f}px"
+
+
+def test_refinement_corrects_coarse_offset():
+    """A coarse estimate about a pixel off is brought well below a pixel."""
+    inspector = PCBInspector()
+    reference = make_board(seed=1)
+    h, w = reference.shape[:2]
+    G = synthetic_transform(reference.shape, 20.0, 30, -20)
+    test = cv2.warpPerspective(reference, G, (w, h))
+    H_coarse = synthetic_transform(reference.shape, 0.1, 0.8, -0.6) @ np.linalg.inv(G)
+    
+    coarse_error = registration_error(H_coarse, G, reference.shape)
+    refined_error = registration_error(refine(inspector, reference, test, H_coarse), G, reference.shape)
+    assert coarse_error > 0.8
+    assert refined_error < 0.25, f"refined {refined_error:.3f}px (coarse {coarse_error:.3f}px)"
+
+
+def test_phase_alignment_at_any_orientation():
+    """Phase alignment stays sub-pixel for turned boards (refined or via the feature fallback)."""
+    inspector = PCBInspector(alignment_mode="phase")
+    reference = make_board(seed=2)
+    h, w = reference.shape[:2]
+    
+    for angle in (8.0, 20.0, 30.0, 90.0, 150.0):
+        G = synthetic_transform(reference.shape, angle, 15, -10)
+        test = cv2.warpPerspective(reference, G, (w, h))
+        _, info = inspector.align_images(reference, test)
+        assert info.get("success"), f"{angle} deg: alignment failed"
+        error = registration_error(info["homography_matrix"], G, reference.shape)
+        assert error < 1.0, f"{angle} deg: {error:.3f}px"
+
+
+if __name__ == "__main__":
+    test_refinement_never_worse_than_coarse()
+    test_refinement_corrects_coarse_offset()
+    test_phase_alignment_at_any_orientation()
+    print("Alignment refinement tests passed")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Screened Comparison Test
+========================
+
+This script checks that the two-pass "screened" comparison reaches the same
+pass/fail verdict as the full-resolution comparison on synthetic boards with
+scattered small defects and sensor noise, which the quarter-resolution screen
+alone smooths away.
+
+Usage:
+    python test_ssim_screening.py
+    python -m pytest test_ssim_screening.py
+"""
+
+import cv2
+import numpy as np
+
+from inspector import PCBInspector
+from test_alignment_refinement import make_board
+
+
+def make_defective_capture(reference: np.ndarray, seed: int, defects: int, size: int, noise: float) -> np.ndarray:
+    """Copy of a board with small discoloured spots and Gaussian sensor noise."""
+    rng = np.random.default_rng(seed)
+    capture = reference.copy()
+    h, w = capture.shape[:2]
+    for _ in range(defects):
+        x, y = int(rng.integers(20, w - 20)), int(rng.integers(20, h - 20))
+        cv2.rectangle(capture, (x, y), (x + size, y + size), tuple(int(v) for v in rng.integers(0, 255, 3)), -1)
+    noisy = capture.astype(np.float32) + rng.normal(0.0, noise, capture.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def test_screened_and_full_agree_on_pass_fail():
+    """Both modes pass or fail the same boards, and report nearly the same score."""
+    inspector = PCBInspector()
+    cases = [(0, 20, 6, 2.0), (1, 40, 4, 2.0), (2, 10, 10, 4.0), (3, 0, 6, 2.0), (4, 60, 5, 3.0)]
+    
+    for seed, defects, size, noise in cases:
+        reference = make_board(seed)
+        capture = make_defective_capture(reference, seed, defects, size, noise)
+        for threshold in (0.95, 0.97, 0.98, 0.99):
+            full = inspector.compare_images(reference, capture, threshold=threshold, mode="full")
+            screened = inspector.compare_images(reference, capture, threshold=threshold, mode="screened")
+            label = f"{defects} defects of {size}px, noise {noise}, threshold {threshold}"
+            assert screened["passed"] == full["passed"], \
+                f"{label}: full {full['similarity_score']:.4f}, screened {screened['similarity_score']:.4f}"
+            assert abs(screened["similarity_score"] - full["similarity_score"]) < 0.003, label
+
+
+def test_screened_with_mask_matches_full():
+    """The agreement also holds when only an inspection zone is compared."""
+    inspector = PCBInspector()
+    reference = make_board(5)
+    capture = make_defective_capture(reference, 5, 30, 5, 2.0)
+    mask = np.zeros(reference.shape[:2], np.uint8)
+    cv2.rectangle(mask, (200, 150), (1000, 800), 255, -1)
+    
+    full = inspector.compare_images(reference, capture, mask=mask, mode="full")
+    screened = inspector.compare_images(reference, capture, mask=mask, mode="screened")
+    assert screened["passed"] == full["passed"]
+    assert abs(screened["similarity_score"] - full["similarity_score"]) < 0.003
+
+
+if __name__ == "__main__":
+    test_screened_and_full_agree_on_pass_fail()
+    test_screened_with_mask_matches_full()
+    print("Screened comparison tests passed")